@@ -0,0 +1,52 @@
+# Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Frozen modules of the production firmware, built by
+# `make PROFILE=production firmware`.
+#
+# Paths are relative to this file. The modules are frozen from the stripped
+# sources of the production build, in build-production-src. Keep the lists
+# in step with FROZEN in the Makefile.
+
+# The modules of the ESP32 port's boards/manifest.py (MicroPython v1.14),
+# except uasyncio: the firmware uses the fast_io fork in lib/uasyncio, which
+# is frozen below.
+freeze("$(PORT_DIR)/modules")
+freeze("$(MPY_DIR)/tools", ("upip.py", "upip_utarfile.py"))
+freeze("$(MPY_DIR)/ports/esp8266/modules", "ntptime.py")
+freeze("$(MPY_DIR)/drivers/dht", "dht.py")
+freeze("$(MPY_DIR)/drivers/onewire")
+include("$(MPY_DIR)/extmod/webrepl/manifest.py")
+
+# Data recorder packages
+freeze("build-production-src", ("drivers", "services", "util"))
+
+# Libraries, imported by their top-level name
+freeze(
+    "build-production-src/lib",
+    (
+        "aswitch.py",
+        "asyn.py",
+        "collections",
+        "ds1307.py",
+        "logging.py",
+        "pcf8574.py",
+        "threading.py",
+        "tinyweb",
+        "uasyncio",
+        "urequests",
+    ),
+)
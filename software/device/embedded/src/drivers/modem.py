@@ -23,6 +23,8 @@ import json
 import ure
 from machine import UART, Pin
 from util.time import isoformat
+from util.atparser import ATParser
+from util import rtcmem
 
 import logging
 
@@ -42,10 +44,14 @@ MODEM_SET_BAUD_TIMEOUT = 10000  # Setting baud rate time out (ms)
 MODEM_POWER_ON_PULSE_PERIOD = 300  # Low time to trigger power-on (ms)
 MODEM_POWER_OFF_PULSE_PERIOD = 1750  # Low time to trigger graceful power-off (ms)
 MODEM_MQTT_CONNECT_TIMEOUT = 120000  # MQTT connection time out (ms)
+MODEM_POWER_ON_TIMEOUT = 5000  # Greeting text time out after power-on (ms)
 
 # Time constants in seconds
 MODEM_MQTT_PING_PERIOD = 60  # Keep-alive period
 
+# Message size limits
+MODEM_MQTT_MAX_MESSAGE_LENGTH = 1024  # Maximum length of a published message (bytes)
+
 # Suported AT Commands
 # General
 MODEM_COMMAND_AT = "AT"  # AT "Test"
@@ -78,6 +84,7 @@ MODEM_COMMAND_FILE_READ = "+URDFILE"  # Read file
 # Response
 MODEM_RESPONSE_OK = "OK"
 MODEM_RESPONSE_ERROR = "ERROR"
+MODEM_GREETING = "SARA-R410M-02B-01 Operational"
 
 # GPIO config
 MODEM_POWER_PIN = 4
@@ -99,6 +106,18 @@ MATTERMOST_SERVER = "https://mattermost.ecs.vuw.ac.nz"
 
 MATTERMOST_CHANNEL_PATH = "/engr301-2023/channels/group-3-data-recorder"
 
+# Modem session state kept in RTC memory across deep sleep, see Modem.state.
+# None means unknown, e.g. after a power loss.
+MODEM_STATE_KEY = "modem"
+MODEM_STATE_DEFAULTS = {
+    "pwr": None,  # modem left powered-on
+    "ctzu": False,  # automatic time zone update (NVM) confirmed enabled
+    "nv": False,  # MQTT profile restored from NVM and keep-alive set
+    "mqtt": None,  # logged in to the MQTT broker
+    "reg": None,  # last EPS network registration status
+    "baud": None,  # baud rate the modem last responded at
+}
+
 
 class ModemTimeout(Exception):
     """Raised when modem commands time out"""
@@ -108,17 +127,84 @@ class ModemFileError(Exception):
     """Raised when the modem raises a file error"""
 
 
+# Steps yielded by the bring-up procedures, which are generators shared by the
+# synchronous and asynchronous methods. Modem._run() and Modem._run_async()
+# carry out each step and send its result back into the procedure.
+_STEP_CHECK = 0  # (_STEP_CHECK, command, kwargs) -> send_command_check()
+_STEP_READ = 1  # (_STEP_READ, command, kwargs) -> send_command_read()
+_STEP_SLEEP = 2  # (_STEP_SLEEP, ms) -> None
+_STEP_GREETING = 3  # (_STEP_GREETING, timeout) -> greeting text received
+
+
+def _check(command: str, **kwargs) -> tuple:
+    return _STEP_CHECK, command, kwargs
+
+
+def _read(command: str, **kwargs) -> tuple:
+    return _STEP_READ, command, kwargs
+
+
+def _sleep_ms(ms: int) -> tuple:
+    return _STEP_SLEEP, ms
+
+
+def _parse_signal_power(response: str) -> int or None:
+    """
+    Parse the signal power from the response to `+CSQ`, formatted as
+    `AT+CSQ  +CSQ: 10,99  OK`.
+
+    Returns:
+        int: <signal_power>, 0-31 or 99 if not known or not detectable; or
+            None if the response could not be parsed.
+    """
+    try:
+        # response[0] is an echo of command (including `\r`),
+        # response[1] is <text>, often with the command text prefixed,
+        # response[2] is final result code (expect this to be "OK")
+        itr = response.split("  ")[1]
+        # itr[0] is "+CSQ:" i.e. (MODEM_SIGNAL_QUALITY + ":")
+        # itr[1] is <signal_power>,<qual>
+        # <qual> is not supported on the SARA-R410, and is
+        # always set to 99 "Not known or not detectable".
+        return int(itr.split()[1].split(",")[0])
+    except (IndexError, ValueError):
+        log.error("Unexpected +CSQ response: {0}".format(response))
+        return None
+
+
 class Modem:
     def __init__(
         self,
-        baud=MODEM_DEFAULT_BAUD,
+        baud=None,
         tx_pin=MODEM_TX_PIN,
         rx_pin=MODEM_RX_PIN,
     ) -> None:
-        self.serial = UART(1, baud, bits=8, parity=None, stop=1, tx=tx_pin, rx=rx_pin)
+        # Session state from the previous wake, used to skip setup commands
+        # which have already been applied to a modem left powered-on
+        self.state = dict(MODEM_STATE_DEFAULTS)
+        self.state.update(rtcmem.get(MODEM_STATE_KEY, {}))
+        self.baud = baud or self.state["baud"] or MODEM_DEFAULT_BAUD
+        self.serial = UART(
+            1, self.baud, bits=8, parity=None, stop=1, tx=tx_pin, rx=rx_pin
+        )
+        # Streams used by the asynchronous `*_async` methods so that other
+        # tasks can run while waiting for the modem to respond
+        self.sreader = asyncio.StreamReader(self.serial)
+        self.swriter = asyncio.StreamWriter(self.serial, {})
         self.has_serial = False
         self.has_network = False
+        self.mqtt_connected = self.state["mqtt"] is True
+        # Last EPS network registration status reported by +CEREG
+        self.registration_status = self.state["reg"]
+        # (profile_id, http_command) -> http_result reported by +UUHTTPCR
+        self.http_results = {}
         self.signal_power = 99
+        # Parses responses and dispatches Unsolicited Result Codes (URCs)
+        self.parser = ATParser()
+        self.parser.register_urc("+UUMQTTC", self._urc_mqtt_command)
+        self.parser.register_urc("+UUHTTPCR", self._urc_http_command)
+        self.parser.register_urc("+CEREG", self._urc_registration)
+        # Serialises asynchronous commands on the AT channel
         self.lock = asyn.Lock()
 
     def initialise(self):
@@ -132,6 +218,37 @@ class Modem:
         """
         log.debug("Initialising modem")
 
+        return self._run(self._initialise(acquire=False, login=False))
+
+    async def initialise_async(self, login: bool = True):
+        """
+        Asynchronous modem bring-up, intended to run concurrently with the
+        sensor measurements in the regular-mode pipeline.
+
+        Equivalent to initialise() followed by get_signal_power(),
+        acquire_network() and, optionally, mqtt_connect(), but yields to
+        other tasks while waiting for the modem.
+
+        Args:
+            login (bool): log in to the MQTT broker once the network is
+                available.
+
+        Returns:
+            bool: True if the modem is ready to transmit
+        """
+        log.debug("Initialising modem (async)")
+
+        return await self._run_async(self._initialise(acquire=True, login=login))
+
+    def _initialise(self, acquire: bool, login: bool):
+        """
+        Steps of initialise() and initialise_async().
+
+        Args:
+            acquire (bool): get the signal power and wait for an IP address.
+            login (bool): log in to the MQTT broker once the network is
+                available.
+        """
         # Power-on modem
         # If it's desired to attempt power-on more than once, restore the following:
         # boot_attempts = 0
@@ -140,36 +257,102 @@ class Modem:
         #     log.warning("Power-on attempt {0}".format(boot_attempts))
         #     self.has_serial = self.power_on()
         if not self.has_serial:
-            self.has_serial = self.power_on()
+            self.has_serial = yield from self._power_on()
 
-        # Connect to network
-        if self.has_serial:
+        if not self.has_serial:
+            log.error("Unable to establish serial connection to the modem")
+            return False
+
+        if not acquire:
             # Testing indicates that TCP/IP communication is _not_ dependent on
             # the acquisition of an IP address. Try deferring or even omitting
             # the wait-for-IP-address loop.
-            # self.acquire_network()
             self.has_network = True  # !!! May cause problems !!!
 
-            # Network settings
-            if self.has_network:
-                # Enable auto time zone
-                # !!! Parameter stored in NVM - do not need to check this _every time_ !!!
-                # !!! Move this to first-boot configuration check/enforcement !!!
-                response = self.send_command_read("+CTZU?")
-                response = response.split("  ")
-                if MODEM_RESPONSE_OK in response:
-                    # Expecting response to be ['AT+CTZU?', '+CTZU: <on_off>', 'OK']
-                    auto_timezone_update = response[1].split()[1]
-                    if auto_timezone_update is not "1":
-                        self.send_command_check("+CTZU=1")
-
-                # Logout from MQTT in case it is still connected
-                # 2022-11-08: Why is MQTT Logout necessary?
-                self.mqtt_disconnect()
-        else:
-            log.error("Unable to establish serial connection to the modem")
+        # Enable auto time zone
+        # Parameter stored in NVM, checked only until confirmed
+        if not self.state["ctzu"]:
+            response = yield _read("+CTZU?")
+            if self._ctzu_disabled(response) and (yield _check("+CTZU=1")):
+                self._update_state(ctzu=True)
 
-        return self.has_network
+        # Logout from MQTT in case it is still connected
+        # 2022-11-08: Why is MQTT Logout necessary?
+        # Skipped when the session state is known
+        if self.state["mqtt"] is None:
+            yield from self._mqtt_disconnect()
+
+        if acquire:
+            yield from self._get_signal_power()
+            yield from self._acquire_network()
+
+        if login and self.has_network and not self.mqtt_connected:
+            yield from self._mqtt_connect()
+
+        return self.has_network and (self.mqtt_connected or not login)
+
+    def _run(self, steps):
+        """
+        Run the steps of a bring-up procedure, blocking while waiting for the
+        modem.
+
+        Returns:
+            the result of the procedure
+        """
+        result = None
+        while True:
+            try:
+                step = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            if step[0] == _STEP_CHECK:
+                result = self.send_command_check(step[1], **step[2])
+            elif step[0] == _STEP_READ:
+                result = self.send_command_read(step[1], **step[2])
+            elif step[0] == _STEP_SLEEP:
+                result = time.sleep_ms(step[1])
+            else:
+                result = self._wait_greeting(step[1])
+
+    async def _run_async(self, steps):
+        """Awaitable equivalent of _run(), other tasks run during each step."""
+        result = None
+        while True:
+            try:
+                step = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            if step[0] == _STEP_CHECK:
+                result = await self.send_command_check_async(step[1], **step[2])
+            elif step[0] == _STEP_READ:
+                result = await self.send_command_read_async(step[1], **step[2])
+            elif step[0] == _STEP_SLEEP:
+                result = await asyncio.sleep_ms(step[1])
+            else:
+                result = await self._wait_greeting_async(step[1])
+
+    def _update_state(self, **changes):
+        """Update the session state, writing it to RTC memory if it changed."""
+        if any(self.state.get(key) != value for key, value in changes.items()):
+            self.state.update(changes)
+            rtcmem.put(MODEM_STATE_KEY, self.state)
+
+    def _ctzu_disabled(self, response: str) -> bool:
+        """
+        Check the response to `+CTZU?`, recording in the session state when
+        automatic time zone update is confirmed enabled.
+
+        Returns:
+            bool: True if automatic time zone update needs enabling.
+        """
+        response = response.split("  ")
+        if MODEM_RESPONSE_OK not in response:
+            return False
+        # Expecting response to be ['AT+CTZU?', '+CTZU: <on_off>', 'OK']
+        if response[1].split()[1] != "1":
+            return True
+        self._update_state(ctzu=True)
+        return False
 
     def command_at(self):
         """
@@ -197,11 +380,18 @@ class Modem:
         # contain Unsolicited Result Codes (URCs), Section 2.2.5 of the SARA-R4
         # AT Commands Manual.
         #
+        # URCs are passed to their registered callbacks by the parser, and
+        # anything else left on the serial buffer is logged.
         residual = self.serial.read()
-        # Use the following for debugging residual content on the serial buffer,
-        # particularly `\r\n` terminators (#602):
         if residual is not None:
-            log.warning("_send_command() serial.read(): {}".format(repr(residual)))
+            self.parser.begin()
+            self.parser.feed(residual)
+            self.parser.flush()
+            if self.parser.lines():
+                # Use the following for debugging residual content on the
+                # serial buffer, particularly `\r\n` terminators (#602):
+                log.warning("_send_command() serial.read(): {}".format(repr(residual)))
+        self.parser.begin(command if prefix_at else None)
 
         serial_message = "{}{}".format("AT" if prefix_at else "", command)
         # NOTE: by default the modem echoes the command and <S3_character>
@@ -224,7 +414,7 @@ class Modem:
             response += self.serial.read().decode("utf-8")
         except Exception as serial_exc:
             # Nothing available to read via serial?
-            log.debug("read_response(): Exception {0}".format(serial_exc))
+            log.debug("read_response(): Exception %s", serial_exc)
 
         return response
 
@@ -277,7 +467,6 @@ class Modem:
         # Code is read from the modem.
 
         timed_out = False
-        response = ""
         response_str = ""
         loop_count = 0
         time_in = time.ticks_ms()
@@ -304,31 +493,19 @@ class Modem:
                 # !!! been a fragile operation generating tracebacks in the past,
                 # !!! so be cautious about this.
                 try:
-                    read_str = self.serial.read()
-                    response += read_str.decode("utf-8")
-                    # Split the response string into a list
-                    # Assumes modem responses are returned in verbose mode (default).
-                    # - Strips trailing `\r` character from command echo elements
-                    # - Strips additional trailing `\r` characters from `UMQTT` command
-                    #   echo and text string elements
-                    # - Removes empty elements from the list caused by the normal
-                    #   occurrence of `\r\n\r\n\` between text string and response
-                    #   code, as well as the abnormal occurrence of `\r\n\r\r\n` in the
-                    #   trailing (after the response code) response from the `UMQTTC=1`
-                    #   command
-                    response_list = list(
-                        filter(None, (item.strip() for item in response.split("\r\n")))
-                    )
-                    response_str = "  ".join(response_list)
-                    # Look for the Final Result Code in the response list.
-                    # Expect only "OK" or "ERROR".
-                    if MODEM_RESPONSE_OK in response_list:
-                        log.debug(response_str)
-                        break  # Exit the while loop
-                    elif (MODEM_RESPONSE_ERROR in response_list) or any(
-                        item.startswith("+CME ERROR") for item in response_list
-                    ):
-                        log.error(response_str)
+                    # Each chunk is parsed once; only the unterminated tail
+                    # of the previous chunk is carried over.
+                    # Assumes modem responses are returned in verbose mode
+                    # (default).
+                    found = self.parser.feed(self.serial.read())
+                    response_str = self.parser.response()
+                    # Look for the Final Result Code: "OK", "ERROR" or
+                    # "+CME ERROR: <err>".
+                    if found:
+                        if self.parser.final == MODEM_RESPONSE_OK:
+                            log.debug(response_str)
+                        else:
+                            log.error(response_str)
                         break  # Exit the while loop
                 except AttributeError as serial_exc:
                     log.error(
@@ -348,23 +525,161 @@ class Modem:
         #     log.debug("Looped {0} times waiting for final result code".format(loop_count))
 
         if timed_out:
+            # Include any unterminated line in the response
+            self.parser.flush()
+            response_str = self.parser.response()
+        if timed_out and not silent_timeout:
             # raise ModemTimeout("AT{0}  Final result code not received within {1:d} ms".format(command, command_timeout), response_str)
+            self._log_timeout(command, response_str, command_timeout)
+
+        return response_str
+
+    def _log_timeout(self, command: str, response_str: str, command_timeout: int):
+        """Write a timeout message to the log."""
+        if len(response_str) == 0:
+            log.error(
+                "AT{0}  No response received within {1:d} ms".format(
+                    command, command_timeout
+                )
+            )
+        else:
+            log.error(response_str)
+            log.error(
+                'Response "{0}" not received within {1:d} ms'.format(
+                    MODEM_RESPONSE_OK, command_timeout
+                )
+            )
+
+    def register_urc(self, prefix: str, callback):
+        """
+        Register a callback for an Unsolicited Result Code, replacing any
+        existing handler.
+
+        Args:
+            prefix (str): URC name including the `+`, e.g. "+UUMQTTC".
+            callback: called as `callback(prefix, parameters)`.
+        """
+        self.parser.register_urc(prefix, callback)
+
+    def _urc_mqtt_command(self, prefix: str, parameters: str):
+        """
+        `+UUMQTTC: <op_code>,<result>` reports the outcome of an MQTT
+        command, e.g. the broker's acceptance of a login (op_code 1).
+        """
+        log.debug("%s: %s", prefix, parameters)
+        op_code, result = parameters.split(",")[:2]
+        if op_code == "1" and result != "0":
+            log.error("MQTT login rejected by the broker ({0})".format(result))
+            self.mqtt_connected = False
+            self._update_state(mqtt=False)
+        elif op_code == "0":
+            self.mqtt_connected = False
+            self._update_state(mqtt=False, nv=False)
+
+    def _urc_http_command(self, prefix: str, parameters: str):
+        """
+        `+UUHTTPCR: <profile_id>,<http_command>,<http_result>` reports the
+        completion of an HTTP request.
+        """
+        log.debug("%s: %s", prefix, parameters)
+        profile_id, http_command, http_result = parameters.split(",")[:3]
+        self.http_results[(int(profile_id), int(http_command))] = int(http_result)
+
+    def _urc_registration(self, prefix: str, parameters: str):
+        """
+        `+CEREG: <stat>[,...]` reports a change in EPS network registration.
+        Registered is "1" (home network) or "5" (roaming).
+        """
+        log.debug("%s: %s", prefix, parameters)
+        self.registration_status = int(parameters.split(",")[0])
+        self._update_state(reg=self.registration_status)
+        if self.registration_status not in (1, 5):
+            log.warning(
+                "Network registration lost ({0})".format(self.registration_status)
+            )
+            self.has_network = False
+
+    async def _readline_async(self, timeout: int) -> bytes or None:
+        """
+        Wait for a complete line from the modem, yielding to other tasks.
+
+        Arguments:
+            timeout (int): maximum time to wait (ms).
+
+        Returns:
+            bytes: the line including its terminator, or None on timeout.
+        """
+        if timeout <= 0:
+            return None
+        try:
+            return await asyncio.wait_for_ms(self.sreader.readline(), timeout)
+        except asyncio.TimeoutError:
+            # The timeout is thrown into readline() while it waits for the
+            # UART, so readline() does not unregister it. Unregister it here,
+            # or data received later would resume this task wherever it is
+            # then waiting.
+            asyncio.get_event_loop().remove_reader(self.sreader.polls)
+            return None
+
+    async def send_command_check_async(
+        self,
+        command: str,
+        command_timeout: int = MODEM_STANDARD_RESPONSE_TIMEOUT,
+        silent_timeout: bool = False,
+        prefix_at: bool = True,
+    ) -> bool:
+        """
+        Awaitable equivalent of send_command_check().
+        """
+        response = await self.send_command_read_async(
+            command, command_timeout, silent_timeout, prefix_at
+        )
+
+        return MODEM_RESPONSE_OK in response.split("  ")
+
+    async def send_command_read_async(
+        self,
+        command: str,
+        command_timeout: int = MODEM_STANDARD_RESPONSE_TIMEOUT,
+        silent_timeout: bool = False,
+        prefix_at: bool = True,
+    ) -> str:
+        """
+        Awaitable equivalent of send_command_read().
+
+        The response is read line by line from a StreamReader over the UART,
+        so other tasks run while waiting for the Final Result Code instead
+        of the event loop being blocked by a polling loop.
+
+        Arguments:
+            command (str): AT command **without** the `AT` prefix.
+            command_timeout (int): maximum timeout for the command.
+
+        Returns:
+            str: command output
+        """
+        async with self.lock:
+            self._send_command(command, prefix_at)
+
             found = False
-            if not silent_timeout:
-                # Write a timeout message to the log
-                if len(response_str) == 0:
-                    log.error(
-                        "AT{0}  No response received within {1:d} ms".format(
-                            command, command_timeout
-                        )
-                    )
-                else:
-                    log.error(response_str)
-                    log.error(
-                        'Response "{0}" not received within {1:d} ms'.format(
-                            MODEM_RESPONSE_OK, command_timeout
-                        )
-                    )
+            time_in = time.ticks_ms()
+            while not found:
+                line = await self._readline_async(
+                    command_timeout - time.ticks_diff(time.ticks_ms(), time_in)
+                )
+                if line is None:
+                    self.parser.flush()
+                    break
+                found = self.parser.feed(line)
+            response_str = self.parser.response()
+
+        if found:
+            if self.parser.final == MODEM_RESPONSE_OK:
+                log.debug(response_str)
+            else:
+                log.error(response_str)
+        elif not silent_timeout:
+            self._log_timeout(command, response_str, command_timeout)
 
         return response_str
 
@@ -413,9 +728,14 @@ class Modem:
         address will be "0.0.0.0" if there is no network connection.
         Example: '+CGDCONT: 1,"IP","hologram","0.0.0.0",0,0,0,0  OK'
         """
+        return self._run(self._check_network())
+
+    async def check_network_async(self):
+        """Awaitable equivalent of check_network()."""
+        return await self._run_async(self._check_network())
 
-        command = MODEM_MESSAGE_PDP_DEF + "?"
-        response = self.send_command_read(command)
+    def _check_network(self):
+        response = yield _read(MODEM_MESSAGE_PDP_DEF + "?")
 
         self.has_network = '"0.0.0.0"' not in response
 
@@ -427,18 +747,27 @@ class Modem:
         acquired. On timeout, execute a soft reset of the modem and check
         again. Sets modem.has_network to the network status.
         """
+        self._run(self._acquire_network())
 
+    async def acquire_network_async(self):
+        """
+        Awaitable equivalent of acquire_network(). Other tasks run while
+        waiting between network checks and for the modem to reset.
+        """
+        await self._run_async(self._acquire_network())
+
+    def _acquire_network(self):
         # log.info("Verifying network connectivity")
         # The following will set self.has_network
-        self.check_network()
+        yield from self._check_network()
 
         # Check every 2 seconds for an IP address obtained via automatic
         # network registration, timing-out after 10 seconds.
         timed_out = False
         time_in = time.ticks_ms()
         while not self.has_network and not timed_out:
-            time.sleep(2)
-            self.check_network()
+            yield _sleep_ms(2000)
+            yield from self._check_network()
             timed_out = time.ticks_diff(time.ticks_ms(), time_in) > 10000
 
         # If have still not registered automatically and obtained
@@ -446,56 +775,53 @@ class Modem:
         # check for an IP address.
         #
         # Note: If there is no network connectivity (worst-case)
-        # then this process will take 40 seconds to execute. May
-        # want instead to "fail fast" and/or make this an async
-        # check to allow measurements and other processing to take
-        # place while waiting for the modem to register to the
-        # network and obtain an IP address.
+        # then this process will take 40 seconds to execute.
+        # initialise_async() runs it while the sensors measure.
         if not self.has_network:
             log.warning(
                 "Automatic network registration failed, soft resetting the modem"
             )
-            self.send_command_check("+CFUN=15")
+            yield _check("+CFUN=15")
             log.debug("Waiting 15 seconds for automatic registration after soft reset")
-            time.sleep(15)
+            yield _sleep_ms(15000)
             # Try 5 times to see if an an IP address has been
             # obtained, waiting 5 seconds between checks.
-            self.check_network()
+            yield from self._check_network()
             checks = 1
             while not self.has_network and checks < 6:
                 log.error("No IP address after network check {0}".format(checks))
-                time.sleep(5)
-                self.check_network()
+                yield _sleep_ms(5000)
+                yield from self._check_network()
                 checks += 1
 
         if not self.has_network:
             log.error("Unable to obtain an IP address from the LTE network")
 
     def get_signal_power(self):
-        # Retrieve signal power information
-        # - Single-instance problem solution follows.
-        # - Requires generalisation to allow code reuse.
-        # - Predicated on a response string formatted _exactly_ as
-        #   `AT+CSQ  +CSQ: 10,99  OK`
-        # itr: information text response
-        # frc: final result code
+        """
+        Retrieve the signal power with the `+CSQ` command, retrying while it
+        is not known or not detectable. Sets modem.signal_power.
+        """
+        self._run(self._get_signal_power())
+
+    async def get_signal_power_async(self):
+        """Awaitable equivalent of get_signal_power()."""
+        await self._run_async(self._get_signal_power())
+
+    def _get_signal_power(self):
         attempts = 0
-        while self.signal_power is 99 and attempts < 3:
-            response = self.send_command_read(MODEM_SIGNAL_QUALITY)
-            # response[0] is an echo of command (including `\r`),
-            # response[1] is <text>, often with the command text prefixed,
-            # response[2] is final result code (expect this to be "OK")
-            itr = response.split("  ")[1]
-            # itr[0] is "+CSQ:" i.e. (MODEM_SIGNAL_QUALITY + ":")
-            # itr[1] is <signal_power>,<qual>
-            # <signal_power> can take values 0-31, 99
-            # <qual> is not supported on the SARA-R410, and is
-            # always set to 99 "Not known or not detectable".
-            self.signal_power = int(itr.split()[1].split(",")[0])
+        while self.signal_power == 99 and attempts < 3:
+            response = yield _read(MODEM_SIGNAL_QUALITY)
+            signal_power = _parse_signal_power(response)
+            if signal_power is not None:
+                self.signal_power = signal_power
             attempts = attempts + 1
             if self.signal_power == 99 and attempts < 3:
                 log.debug("Retrying +CSQ request in 1 second")
-                time.sleep(1)
+                yield _sleep_ms(1000)
+        self._log_signal_power()
+
+    def _log_signal_power(self):
         if self.signal_power == 0:
             log.warning("Cellular network RSSI <= -113 dBm")
         elif self.signal_power == 99:
@@ -622,98 +948,160 @@ class Modem:
         1. SARA-R4 System Integration Manual
         2. SARA-R4 Data Sheet
         """
+        return self._run(self._power_on())
+
+    async def power_on_async(self):
+        """
+        Awaitable equivalent of power_on(). Other tasks run during the
+        PWR_ON pulse and while waiting for the greeting text.
+        """
+        return await self._run_async(self._power_on())
+
+    def _power_on(self):
         # Should really check first whether the modem is _already_ powered-on.
-        # If it is then this procedure will likely turn it off!
-        responsive = self.send_command_check(
-            "", command_timeout=100, silent_timeout=True
+        # If it is then this procedure will likely turn it off! The check is
+        # skipped when the modem is known to have been powered-off.
+        responsive = self.state["pwr"] is not False and (
+            yield _check("", command_timeout=100, silent_timeout=True)
         )
         if responsive:
             # Modem is responding, therefore on already
-            log.warning("power-on(): modem responded to 'AT'")
-            log.warning("power-on(): skipping low pulse of PWR_ON")
-        else:
-            log.info("Powering-on")
-            modem_PWR_ON = Pin(MODEM_POWER_PIN, Pin.OUT, value=1)
-            modem_PWR_ON.off()
-            time.sleep_ms(MODEM_POWER_ON_PULSE_PERIOD)
-            modem_PWR_ON.on()
-            # Takes just over 4 seconds for SARA-R4 to enter the operational
-            # state after the start-up event. Measurements (ms): 4093, 4028,
-            # 4304, ...
-            #
-            # Give a generous 5 seconds for the SARA-R4 to generate the
-            # greeting text.
-            poweron_timeout = 5000
-            # Note: the `+CSGT` "Set Greeting Text" command is supported by
-            # the SARA-R410M-02B-01 (SARA-R4 AT Commands Manual, Section 5.8).
-            # Poll the modem serial interface for the greeting text.
-            time_in = time.ticks_ms()
-            loop_count = 0
-            responsive = False
-            timed_out = False
-            start_ticks = time.ticks_ms()
-            while not responsive and not timed_out:
-                if self.serial.any() == 0:
-                    time.sleep_ms(75)
-                    loop_count += 1
-                else:
-                    # !!! Should be guaranteed that read_str will be non-empty
-                    # !!! so the decode will succeed without error, but decode has
-                    # !!! been a fragile operation generating tracebacks in the past,
-                    # !!! so be cautious about this.
-                    try:
-                        read_str = self.serial.read().decode("utf-8")
-                        response = "  ".join(
-                            list(
-                                filter(
-                                    None,
-                                    (item.strip() for item in read_str.split("\r\n")),
-                                )
+            self._resume_session()
+            return responsive
+
+        log.info("Powering-on")
+        modem_PWR_ON = Pin(MODEM_POWER_PIN, Pin.OUT, value=1)
+        modem_PWR_ON.off()
+        yield _sleep_ms(MODEM_POWER_ON_PULSE_PERIOD)
+        modem_PWR_ON.on()
+        # Takes just over 4 seconds for SARA-R4 to enter the operational
+        # state after the start-up event. Measurements (ms): 4093, 4028,
+        # 4304, ...
+        #
+        # Give a generous 5 seconds for the SARA-R4 to generate the
+        # greeting text.
+        # Note: the `+CSGT` "Set Greeting Text" command is supported by
+        # the SARA-R410M-02B-01 (SARA-R4 AT Commands Manual, Section 5.8).
+        start_ticks = time.ticks_ms()
+        responsive = yield _STEP_GREETING, MODEM_POWER_ON_TIMEOUT
+        end_ticks = time.ticks_ms()
+
+        if not responsive:
+            log.warning(
+                "Expected greeting text not received within {:d} ms, testing response to the AT command".format(
+                    MODEM_POWER_ON_TIMEOUT
+                )
+            )
+            responsive = yield _check("", command_timeout=100, silent_timeout=True)
+        log.info(
+            "SARA-R410M-02B-01 {0}operational in {1} ms".format(
+                "not " if not responsive else "",
+                time.ticks_diff(end_ticks, start_ticks),
+            )
+        )
+        self._release_power_pin(modem_PWR_ON)
+        self._new_session(responsive)
+
+        return responsive
+
+    def _wait_greeting(self, timeout: int) -> bool:
+        """
+        Poll the modem serial interface for the greeting text.
+
+        Arguments:
+            timeout (int): maximum time to wait (ms).
+
+        Returns:
+            bool: True if the greeting text was received.
+        """
+        time_in = time.ticks_ms()
+        responsive = False
+        timed_out = False
+        while not responsive and not timed_out:
+            if self.serial.any() == 0:
+                time.sleep_ms(75)
+            else:
+                # !!! Should be guaranteed that read_str will be non-empty
+                # !!! so the decode will succeed without error, but decode has
+                # !!! been a fragile operation generating tracebacks in the past,
+                # !!! so be cautious about this.
+                try:
+                    read_str = self.serial.read().decode("utf-8")
+                    response = "  ".join(
+                        list(
+                            filter(
+                                None,
+                                (item.strip() for item in read_str.split("\r\n")),
                             )
                         )
-                        responsive = response == "SARA-R410M-02B-01 Operational"
-                    except AttributeError as serial_exc:
-                        log.error(
-                            "AttributeError in power_on(): {0}".format(serial_exc)
-                        )
-                        time.sleep_ms(100)
-                timed_out = time.ticks_diff(time.ticks_ms(), time_in) > poweron_timeout
-            end_ticks = time.ticks_ms()
-            if timed_out:
-                log.warning(
-                    "Expected greeting text not received within {:d} seconds, testing response to the AT command".format(
-                        poweron_timeout
                     )
+                    responsive = response == MODEM_GREETING
+                except AttributeError as serial_exc:
+                    log.error("AttributeError in power_on(): {0}".format(serial_exc))
+                    time.sleep_ms(100)
+            timed_out = time.ticks_diff(time.ticks_ms(), time_in) > timeout
+
+        return responsive
+
+    async def _wait_greeting_async(self, timeout: int) -> bool:
+        """Awaitable equivalent of _wait_greeting(), reading line by line."""
+        responsive = False
+        async with self.lock:
+            time_in = time.ticks_ms()
+            while not responsive:
+                line = await self._readline_async(
+                    timeout - time.ticks_diff(time.ticks_ms(), time_in)
                 )
-                responsive = self.send_command_check(
-                    "", command_timeout=100, silent_timeout=True
-                )
-            log.info(
-                "SARA-R410M-02B-01 {0}operational in {1} ms".format(
-                    "not " if not responsive else "",
-                    time.ticks_diff(end_ticks, start_ticks),
-                )
-            )
-            # Try setting the pin to a high-impedance input with no pull
-            # resistor, relying on the SARA-R4 PWR_ON pin internal pull-up
-            # resistor to maintain the high logic state. Suggested by
-            # <https://forum.sparkfun.com/viewtopic.php?p=205151#p205151>
-            modem_PWR_ON.init(mode=Pin.IN, pull=None)
-            if modem_PWR_ON.value() == 0:
-                log.error(
-                    "MODEM_POWER_PIN pin at low logic level in high-impedance input mode after power-on"
-                )
-                log.info("Setting MODEM_POWER_PIN pin to output high logic level")
-                modem_PWR_ON.init(mode=Pin.OUT)
-                modem_PWR_ON.on()
-            # else:
-            #     # TRACE-level logging:
-            #     log.debug(
-            #         "MODEM_POWER_PIN pin logic level: {0}".format(modem_PWR_ON.value())
-            #     )
+                if line is None:
+                    break
+                responsive = line.strip() == MODEM_GREETING.encode("utf-8")
 
         return responsive
 
+    def _resume_session(self):
+        """Modem found already powered-on."""
+        if self.state["pwr"]:
+            log.debug("power-on(): modem left on, resuming session")
+        else:
+            # Powered-on unexpectedly, nothing is known about its state
+            log.warning("power-on(): modem responded to 'AT'")
+            log.warning("power-on(): skipping low pulse of PWR_ON")
+            self.mqtt_connected = False
+            self._update_state(nv=False, mqtt=None, reg=None)
+        self._update_state(pwr=True, baud=self.baud)
+
+    def _new_session(self, responsive: bool):
+        """Modem powered-on by the PWR_ON pulse, with no MQTT session."""
+        self.mqtt_connected = False
+        self.registration_status = None
+        self._update_state(
+            pwr=True if responsive else None,
+            nv=False,
+            mqtt=False,
+            reg=None,
+            baud=self.baud if responsive else self.state["baud"],
+        )
+
+    def _release_power_pin(self, modem_PWR_ON):
+        """Return the PWR_ON pin to high impedance after a power-on pulse."""
+        # Try setting the pin to a high-impedance input with no pull
+        # resistor, relying on the SARA-R4 PWR_ON pin internal pull-up
+        # resistor to maintain the high logic state. Suggested by
+        # <https://forum.sparkfun.com/viewtopic.php?p=205151#p205151>
+        modem_PWR_ON.init(mode=Pin.IN, pull=None)
+        if modem_PWR_ON.value() == 0:
+            log.error(
+                "MODEM_POWER_PIN pin at low logic level in high-impedance input mode after power-on"
+            )
+            log.info("Setting MODEM_POWER_PIN pin to output high logic level")
+            modem_PWR_ON.init(mode=Pin.OUT)
+            modem_PWR_ON.on()
+        # else:
+        #     # TRACE-level logging:
+        #     log.debug(
+        #         "MODEM_POWER_PIN pin logic level: {0}".format(modem_PWR_ON.value())
+        #     )
+
     def power_off(self):
         """
         Turn off the SparkFun SARA-R4 modem using the "+PWROFF" AT command.
@@ -801,13 +1189,22 @@ class Modem:
             time.sleep_ms(MODEM_POWER_OFF_PULSE_PERIOD)
             modem_PWR_ON.on()
             # Power-off is immediate, check response to `AT`
-            if self.send_command_check("", command_timeout=0):
+            powered_off = not self.send_command_check("", command_timeout=0)
+            if not powered_off:
                 log.error("Failed to power-off the modem via the PWR-ON pin")
             else:
                 log.info("Power-off confirmed")
         else:
+            powered_off = True
             log.info("Power-off confirmed")
 
+        # The MQTT session and network registration end with power-off
+        self.mqtt_connected = False
+        self.registration_status = None
+        self._update_state(
+            pwr=False if powered_off else None, nv=False, mqtt=False, reg=None
+        )
+
         return responsive
 
     def get_network_time(self):
@@ -914,28 +1311,40 @@ class Modem:
             bool: False for unable to connect
             True for successfully connect
         """
+        return self._run(self._mqtt_connect())
+
+    async def mqtt_connect_async(self):
+        """
+        Awaitable equivalent of mqtt_connect(). Other tasks run while the
+        modem logs in to the broker, which typically takes several seconds.
+        """
+        return await self._run_async(self._mqtt_connect())
+
+    def _mqtt_connect(self):
         # Set MQTT client profile parameters to values stored previously in NVM
         #
         # After logout (AT+UMQTTC=0), MQTT settings need to be re-set
         # individually or restored from the NVM with the AT+UMQTTNV=1 command
-        # to login again.
-        self.send_command_check("+UMQTTNV=1")
+        # to login again. Skipped if already done since the last logout or
+        # power-on.
+        if not self.state["nv"]:
+            restored = yield _check("+UMQTTNV=1")
 
-        # Keep alive pings
-        command = "+UMQTT=10,{}".format(MODEM_MQTT_PING_PERIOD)
-        self.send_command_check(command)
+            # Keep alive pings
+            keep_alive = yield _check("+UMQTT=10,{}".format(MODEM_MQTT_PING_PERIOD))
+            self._update_state(nv=restored and keep_alive)
 
         # 2022-11-11: This command is taking several seconds to
         # complete, check to see if reconnection to the MQTT broker is
         # strictly necessary on each wake, or whether the server
         # can/does cache the connection. See the Eclipse forum and
         # documentation for advice on connection caching.
-        command = "{}={}".format("+UMQTTC", 1)
-        err = self.send_command_check(
-            command, command_timeout=MODEM_MQTT_CONNECT_TIMEOUT
+        self.mqtt_connected = yield _check(
+            "+UMQTTC=1", command_timeout=MODEM_MQTT_CONNECT_TIMEOUT
         )
+        self._update_state(mqtt=self.mqtt_connected)
 
-        return err
+        return self.mqtt_connected
 
     def mqtt_publish(self, topic, message):
         """publish a mqtt message
@@ -983,8 +1392,16 @@ class Modem:
             bool: False for fail to disconnect
             True successfully disconnect
         """
-        command = "+UMQTTC=0"
-        err = self.send_command_check(command)
+        return self._run(self._mqtt_disconnect())
+
+    async def mqtt_disconnect_async(self):
+        """Awaitable equivalent of mqtt_disconnect()."""
+        return await self._run_async(self._mqtt_disconnect())
+
+    def _mqtt_disconnect(self):
+        err = yield _check("+UMQTTC=0")
+        self.mqtt_connected = False
+        self._update_state(mqtt=False, nv=False)
         return err
 
     def http_connect(self, server="data.envirodiy.org"):
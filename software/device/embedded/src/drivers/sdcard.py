@@ -20,10 +20,16 @@ Defines functions for mounting and read-write access to the filesystem on
 a microSD card, as well as functions called from test/test_sd.py.
 """
 import os
+import time
 import logging
 from machine import SDCard
 from micropython import const
 from util import helpers
+from util import hourindex
+from util import logfile
+from util import rtcmem
+from util.datalog import BinaryDatalog
+from util.filequeue import FileQueue
 from util.time import isoformat
 
 import json
@@ -42,6 +48,14 @@ log.setLevel(logging.INFO)
 _SD = None
 _SD_ENABLED = False
 
+# _QUEUE is assigned to the `FileQueue` of failed transmissions awaiting
+# retransmission if setup() succeeds in mounting the microSD card.
+_QUEUE = None
+
+# _DATALOG is assigned to the `BinaryDatalog` of BINARY_FILE if setup()
+# succeeds in mounting the microSD card.
+_DATALOG = None
+
 # Define Rev::4.0 connections from ESP32 GPIO to the microSD card
 # reader, shown on the ESP32_board schematic, as constants
 #
@@ -56,10 +70,42 @@ BACKUP_DIR = "daily/"
 SYSLOG = "system.log"
 FILETYPE = ".csv"
 
+# The system log is archived into BACKUP_DIR when it reaches SYSLOG_MAX_SIZE
+# bytes or on the first wake of a day, see util/logfile.py. The oldest
+# archives are deleted to keep them within SYSLOG_MAX_ARCHIVED bytes.
+SYSLOG_MAX_SIZE = 65536
+SYSLOG_MAX_ARCHIVED = 1048576
+SYSLOG_COMPRESS = True
+
+REQUEUE_DIR = "requeue"
+# Legacy single-file transmission cache, migrated into REQUEUE_DIR by setup()
 REQUEUE_FILE = "failed_transmissions"
+# The legacy file is renamed with MIGRATING_SUFFIX while it is migrated, and
+# the offset of its next line to migrate is kept in a file with POSITION_SUFFIX
+# appended to that name
+MIGRATING_SUFFIX = ".migrating"
+POSITION_SUFFIX = ".pos"
 
 HEADER_STR = "Sensor,Datetime,Data"
 
+# Each daily file has an hourly index of its rows, see util/hourindex.py.
+# The hour last indexed is kept in RTC memory under INDEX_RTCMEM_KEY, so the
+# index is only updated by the first wake of each hour.
+INDEX_RTCMEM_KEY = "idx"
+
+# Telemetry is also saved to a compact binary datalog, see util/datalog.py
+# and tools/datalog_to_csv.py
+BINARY_DATALOG = True
+BINARY_FILE = "datalog.bin"
+
+# The telemetry rows of a wake are formatted into _telemetry_buffer after a
+# copy of the header, and each CSV file written with a single write(). The
+# buffer is grown if the rows do not fit.
+TELEMETRY_BUFFER_SIZE = 1024
+_HEADER_LINE = (HEADER_STR + "\n").encode()
+_telemetry_buffer = bytearray(TELEMETRY_BUFFER_SIZE)
+_telemetry_buffer[: len(_HEADER_LINE)] = _HEADER_LINE
+
 
 def setup(sd_logging=True):
     """Set up the SD card and filesystem.
@@ -75,7 +121,7 @@ def setup(sd_logging=True):
         _SD_ENABLED is set True here if instantiation and mounting of the filesystem succeeds,
         is set False otherwise, and is referenced/tested elsewhere in the module.
     """
-    global _SD_ENABLED, _SD
+    global _SD_ENABLED, _SD, _QUEUE, _DATALOG
     if not _SD_ENABLED:
         _SD = SDCard(slot=2, sck=SD_CLK, miso=SD_DO, mosi=SD_DI, cs=SD_CS)
         try:
@@ -118,19 +164,24 @@ def setup(sd_logging=True):
         helpers.deep_mkdir(backup_directory)
         helpers.deep_mkdir(services_directory)
 
-        # Ensure existence of cache file
-        with open(REQUEUE_FILE + FILETYPE, "a+") as _:
-            pass
+        if _QUEUE is None:
+            _QUEUE = FileQueue(gen_path(REQUEUE_DIR))
+            _migrate_requeue_file(_QUEUE)
+
+        if _DATALOG is None:
+            _DATALOG = BinaryDatalog(gen_path(BINARY_FILE))
 
 
 def teardown():
     """Cleanly disable the SD card. This is only used for testing."""
-    global _SD_ENABLED
+    global _SD_ENABLED, _QUEUE, _DATALOG
     close_log()
     if _SD_ENABLED:
         os.umount(SD_DIR)
         _SD.deinit()
     _SD_ENABLED = False
+    _QUEUE = None
+    _DATALOG = None
 
 
 def gen_path(*path: str) -> str:
@@ -199,14 +250,15 @@ def get_free_space() -> int:
 
 
 def write_failed_transmission(data: str):
-    """Writes out the json data to the failed transmission file.
+    """Appends the json data to the tail of the failed transmission queue.
 
     Args:
         data (str): Data to be stored. Must be in the format used to
             send data to the webserver, as it is parsed and re-sent with the
             same format.
 
-        Each failed transmission is stored within an ordered csv file.
+        Each failed transmission is stored as a single line within a segment of
+        the queue in REQUEUE_DIR.
 
     Returns:
         bool: True if successfully written.
@@ -220,26 +272,17 @@ def write_failed_transmission(data: str):
         )
         return False
 
-    # Construct path for writing to failed dir
-    out_file = REQUEUE_FILE + FILETYPE
-    log.info("Writing failed transmission to {}".format(out_file))
-
-    # Write out json data
-    with open(out_file, "a") as f_ptr:
-        f_ptr.write(data + "\n")
+    log.info("Writing failed transmission to {}".format(REQUEUE_DIR))
+    _QUEUE.enqueue(data)
     return True
 
 
 def read_failed_transmission() -> str or None:
     """
-    Loads a random file to be queued for transmission.
+    Returns the oldest cached transmission without removing it from the queue.
 
-    Transmissions are obtained in the reverse order they were written, as sorting via O(NlogN) gets complex,
-    especially given the processing capacity of the ESP32.
-
-    # TODO: https://gitlab.ecs.vuw.ac.nz/course-work/engr301/2023/group3/data-recorder/-/issues/80
-         \\ This issue will need to be evaluated to ensure that ordering is inconsequential.
-         \\ If ordering is required, this is going to have to be rewritten.
+    Transmissions are obtained in the order they were written. Call
+    delete_failed_transmission() once it has been successfully retransmitted.
 
     Returns:
         str: Json data from failed transmission, or None if there are no remaining failed or the
@@ -250,56 +293,138 @@ def read_failed_transmission() -> str or None:
     if not _SD_ENABLED:
         return None
 
-    # Grabs latest cached transmission
-    in_file = REQUEUE_FILE + FILETYPE
+    return _QUEUE.peek()
+
 
-    # Grabs the last line of the file
-    with open(in_file, "r") as f_ptr:
-        f_ptr.seek(0, 2)  # os.SEEK_END
+def read_failed_transmissions(max_count: int, max_bytes: int) -> list:
+    """
+    Returns the oldest cached transmissions without removing them from the
+    queue. Call delete_failed_transmission() with the number successfully
+    retransmitted.
 
-        # If the file has no lines, there is no last line to grab
-        if not f_ptr.tell():
-            return None
+    Args:
+        max_count (int): maximum number of transmissions to return
+        max_bytes (int): maximum total length of the transmissions; the
+            oldest is returned regardless of its length
 
-        # Seek to the start of the last line of the file
-        index = seek_endl(f_ptr)
+    Returns:
+        list: Json data from failed transmissions, oldest first. Empty if
+        there are none or the SD card is not mounted
+    """
+    if not _SD_ENABLED:
+        return []
 
-        # Return the last line
-        return f_ptr.read(
-            index
-        ).strip()  # FIXME: .strip() is slow, could we guarantee safety with [:-1]?
+    return _QUEUE.peek_many(max_count, max_bytes)
 
 
-def delete_latest_failed_transmission() -> bool:
+def delete_failed_transmission(count: int = 1) -> bool:
     """
-    Attempts to truncate the failed transmission file by the latest transmission.
+    Removes the oldest transmissions, i.e. those last returned by
+    read_failed_transmission() or read_failed_transmissions(), from the queue.
 
     This is used to remove transmissions from the cache which have since been successfully transmitted.
 
+    Args:
+        count (int): number of transmissions to remove
+
     Returns:
         bool: Whether an entry was removed. False if there are no entries present
     """
+    if not _SD_ENABLED:
+        return False
 
-    # load in the list of entries
-    in_file = REQUEUE_FILE + FILETYPE
+    return _QUEUE.ack(count)
 
-    # Deletes the last line of the file
-    with open(in_file, "r") as f_ptr:
-        with open(in_file + ".tmp", "w") as w_ptr:
-            prev_line = None
-            for line in f_ptr:
-                if prev_line is None:
-                    prev_line = line
-                    continue
 
-                w_ptr.write(prev_line)
-                print(prev_line)
-                prev_line = line
+def count_failed_transmissions() -> int:
+    """
+    Returns:
+        int: The number of transmissions waiting in the queue.
+    """
+    return len(_QUEUE) if _SD_ENABLED else 0
 
-    os.remove(in_file)
-    os.rename(in_file + ".tmp", in_file)
 
-    return True
+def get_failed_transmissions_size() -> int:
+    """
+    Returns:
+        int: The number of bytes held by transmissions waiting in the queue.
+    """
+    return _QUEUE.size() if _SD_ENABLED else 0
+
+
+def _migrate_requeue_file(queue: FileQueue, legacy_file: str = None):
+    """Move transmissions from the legacy REQUEUE_FILE, if present, into the queue.
+
+    The legacy file is stored on the flash filesystem in the working directory.
+    It is renamed before its lines are queued, and the offset of the next line
+    is saved after each line is queued, so a migration interrupted by a reset
+    resumes where it stopped: only the line being queued at the time of the
+    reset can be queued twice.
+
+    Args:
+        queue (FileQueue): the queue to move the transmissions into.
+        legacy_file (str): the legacy file. Defaults to REQUEUE_FILE.
+    """
+    if legacy_file is None:
+        legacy_file = REQUEUE_FILE + FILETYPE
+    migrating_file = legacy_file + MIGRATING_SUFFIX
+    position_file = migrating_file + POSITION_SUFFIX
+    try:
+        os.rename(legacy_file, migrating_file)
+        # A new migration, drop the position of an earlier one
+        _remove_file(position_file)
+    except OSError:
+        # No legacy file, or resuming an interrupted migration
+        pass
+
+    try:
+        f_ptr = open(migrating_file, "rb")
+    except OSError:
+        # Nothing to migrate
+        return
+
+    position = _read_migration_position(position_file)
+    migrated = 0
+    with f_ptr:
+        f_ptr.seek(position)
+        for line in f_ptr:
+            position += len(line)
+            line = line.strip()
+            if line:
+                queue.enqueue(line.decode("utf-8"))
+                migrated += 1
+                _save_migration_position(position_file, position)
+
+    log.info(
+        "Migrated {0} failed transmission(s) from {1}".format(migrated, legacy_file)
+    )
+    os.remove(migrating_file)
+    _remove_file(position_file)
+
+
+def _read_migration_position(position_file: str) -> int:
+    try:
+        with open(position_file, "r") as f_in:
+            return int(f_in.read())
+    except OSError:
+        return 0
+    except ValueError:
+        log.error("Corrupt migration position file {0}".format(position_file))
+        return 0
+
+
+def _save_migration_position(position_file: str, position: int):
+    """Atomically replace the migration position file."""
+    with open(position_file + ".tmp", "w") as f_out:
+        f_out.write(str(position))
+    os.rename(position_file + ".tmp", position_file)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
 
 
 def save_telemetry(data: dict):
@@ -341,28 +466,217 @@ def save_telemetry(data: dict):
     # Get the datetime (timestamp) and the date (date_str)
     timestamp = isoformat(integer_time)
 
-    # Put data into a list for appending to a CSV
-    data_list = [
-        _gen_data_string(name, value, timestamp) for name, value in data_copy.items()
-    ]
-
-    # Create a main file and a backup file
-    files = [
-        gen_path(MAIN_FILE + FILETYPE),
-        gen_path(BACKUP_DIR, MAIN_FILE + "_" + timestamp[:10] + FILETYPE),
-    ]
-
-    for fname in files:
-        # If file doesn't exist, add header to new file
-        if not helpers.check_exists(fname):
-            log.info("Generating new log file: {}".format(fname))
-            _append_to_csv(fname, [HEADER_STR])
-        # Append data to file
-        _append_to_csv(fname, data_list)
+    rows = _format_rows(data_copy, timestamp)
+
+    # Append to the main file and a backup file
+    _append_rows(gen_path(MAIN_FILE + FILETYPE), rows)
+    daily_file = _daily_file(timestamp[:10])
+    offset, new = _append_rows(daily_file, rows)
+    _index_rows(daily_file, timestamp, offset, new)
+
+    if BINARY_DATALOG:
+        try:
+            _DATALOG.append(integer_time, data_copy)
+        except (OSError, ValueError) as exc:
+            log.error("Failed to save telemetry to {0}: {1}".format(BINARY_FILE, exc))
 
     return True
 
 
+def _daily_file(date: str) -> str:
+    """
+    Args:
+        date (str): The date, yyyy-mm-dd.
+
+    Returns:
+        str: The path of the backup file of the day's telemetry.
+    """
+    return gen_path(BACKUP_DIR, MAIN_FILE + "_" + date + FILETYPE)
+
+
+def _append_rows(filename: str, rows: memoryview) -> tuple:
+    """Append rows from _format_rows() to a CSV file with a single write.
+
+    Args:
+        filename (str): The file to append to.
+        rows (memoryview): The header line and the rows.
+
+    Returns:
+        tuple: The byte offset of the rows in the file, and whether the
+            file is new.
+    """
+    with open(filename, "ab") as csvfile:
+        # Opened at the end of the file: a new file is empty and starts
+        # with the header
+        offset = csvfile.tell()
+        if offset == 0:
+            log.info("Generating new log file: {}".format(filename))
+            csvfile.write(rows)
+            return len(_HEADER_LINE), True
+        csvfile.write(rows[len(_HEADER_LINE) :])
+        return offset, False
+
+
+def _index_rows(daily_file: str, timestamp: str, offset: int, new: bool):
+    """Record the offset of the first rows of an hour in the index of a daily file.
+
+    Args:
+        daily_file (str): The daily file the rows were appended to.
+        timestamp (str): The time of the rows.
+        offset (int): The byte offset of the rows in the daily file.
+        new (bool): Whether the daily file is new, creating its index.
+    """
+    hour = timestamp[:13]
+    if not new and rtcmem.get(INDEX_RTCMEM_KEY) == hour:
+        return
+    try:
+        hourindex.update(
+            hourindex.index_path(daily_file), int(timestamp[11:13]), offset, new
+        )
+    except OSError as exc:
+        log.error("Failed to index {0}: {1}".format(daily_file, exc))
+        return
+    rtcmem.put(INDEX_RTCMEM_KEY, hour)
+
+
+def query_telemetry(start: int, end: int, reading: str = None):
+    """Generate the telemetry saved between two times, from the daily files.
+
+    Only the part of each daily file holding the hours of the query is read,
+    found with the file's hourly index, and rows are read one at a time, so
+    memory use does not depend on the number of readings.
+
+    Args:
+        start (int): The start time (s since the epoch), inclusive.
+        end (int): The end time (s since the epoch), inclusive.
+        reading (str, optional): Only generate the readings of this name (the
+            Sensor column). Defaults to all readings.
+
+    Yields:
+        tuple: The reading name, the time (yyyy-mm-ddThh:mm:ss) and the
+            value, in the order they were saved.
+    """
+    if not _SD_ENABLED:
+        return
+    first = isoformat(start)
+    last = isoformat(end)
+    for date in daily_dates(first[:10], last[:10]):
+        daily_file = _daily_file(date)
+        try:
+            size = os.stat(daily_file)[6]
+        except OSError:
+            continue
+        begin, stop = hourindex.span(
+            hourindex.read(hourindex.index_path(daily_file)),
+            int(first[11:13]) if date == first[:10] else 0,
+            int(last[11:13]) if date == last[:10] else hourindex.HOURS - 1,
+            size,
+        )
+        for line in _read_lines(daily_file, begin, stop):
+            fields = line.decode().rstrip().split(",")
+            if len(fields) != 3 or not first <= fields[1] <= last:
+                # Also skips the header
+                continue
+            if reading is not None and fields[0] != reading:
+                continue
+            try:
+                value = float(fields[2])
+            except ValueError:
+                value = fields[2]
+            yield fields[0], fields[1], value
+
+
+def daily_dates(first: str, last: str) -> list:
+    """
+    Args:
+        first (str): The first date, yyyy-mm-dd.
+        last (str): The last date, yyyy-mm-dd.
+
+    Returns:
+        list: The dates (yyyy-mm-dd) of the daily files from first to last,
+            inclusive, in order.
+    """
+    prefix = MAIN_FILE + "_"
+    try:
+        names = os.listdir(gen_path(BACKUP_DIR))
+    except OSError:
+        return []
+    return sorted(
+        name[len(prefix) : len(prefix) + 10]
+        for name in names
+        if name.startswith(prefix)
+        and name.endswith(FILETYPE)
+        and first <= name[len(prefix) : len(prefix) + 10] <= last
+    )
+
+
+def read_daily_files(dates: list, buffer_size: int = 512):
+    """Generate the contents of the daily files of some dates as a single CSV.
+
+    The files are read buffer_size bytes at a time, into the same buffer,
+    and the header is only generated once.
+
+    Args:
+        dates (list): The dates (yyyy-mm-dd) of the files, e.g. from
+            daily_dates(). Missing files are skipped.
+        buffer_size (int, optional): The bytes read at a time.
+
+    Yields:
+        memoryview: The next bytes, valid until the next is generated.
+    """
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    header = True
+    for date in dates:
+        try:
+            f_ptr = open(_daily_file(date), "rb")
+        except OSError:
+            continue
+        with f_ptr:
+            # Each file starts with the header
+            if not header:
+                f_ptr.seek(len(_HEADER_LINE))
+            header = False
+            while True:
+                size = f_ptr.readinto(buffer)
+                if not size:
+                    break
+                yield view[:size]
+
+
+def _read_lines(filename: str, begin: int, stop: int):
+    """Generate the lines of a file between two byte offsets."""
+    with open(filename, "rb") as f_ptr:
+        f_ptr.seek(begin)
+        position = begin
+        while position < stop:
+            line = f_ptr.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
+
+
+def _format_rows(data: dict, timestamp: str) -> memoryview:
+    """Format readings as CSV rows into _telemetry_buffer.
+
+    Args:
+        data (dict): The names of the readings and their values.
+        timestamp (str): The time the readings were taken.
+
+    Returns:
+        memoryview: The header line followed by a row for each reading.
+    """
+    end = len(_HEADER_LINE)
+    for name, value in data.items():
+        row = (_gen_data_string(name, value, timestamp) + "\n").encode()
+        if end + len(row) > len(_telemetry_buffer):
+            _telemetry_buffer.extend(bytearray(len(_telemetry_buffer) + len(row)))
+        _telemetry_buffer[end : end + len(row)] = row
+        end += len(row)
+    return memoryview(_telemetry_buffer)[:end]
+
+
 def _gen_data_string(name: str, data: float, time: str) -> str:
     """Convert the provided values to a CSV formatted string.
 
@@ -380,9 +694,42 @@ def _gen_data_string(name: str, data: float, time: str) -> str:
 
 
 def open_log():
-    """Enable logging to the SD card. This will only succeed if the SD card is inserted."""
+    """Enable logging to the SD card. This will only succeed if the SD card is inserted.
+
+    The system log is first archived if it is due for rotation.
+    """
     if _SD_ENABLED:
+        logging._stream.unset_file()
+        try:
+            archive = logfile.rotate(
+                get_log_file(),
+                gen_path(BACKUP_DIR),
+                isoformat(time.localtime())[:10],
+                SYSLOG_MAX_SIZE,
+                SYSLOG_MAX_ARCHIVED,
+                SYSLOG_COMPRESS,
+            )
+        except OSError as exc:
+            archive = exc
         logging._stream.set_file(get_log_file())
+        if isinstance(archive, OSError):
+            log.error("Failed to rotate the system log: {0}".format(archive))
+        elif archive:
+            log.info("Archived the system log to {0}".format(archive))
+
+
+def read_log_tail(nbytes: int) -> str:
+    """Read the end of the system log, e.g. for the webapp or for remote diagnostics.
+
+    Args:
+        nbytes (int): The maximum number of bytes to read.
+
+    Returns:
+        str: The whole lines within the last nbytes of the system log,
+            continued from the newest archive if the log was just rotated.
+    """
+    logging.flush()
+    return logfile.tail(get_log_file(), gen_path(BACKUP_DIR), nbytes)
 
 
 def close_log():
@@ -391,21 +738,6 @@ def close_log():
     logging._stream.unset_file()
 
 
-def _append_to_csv(filename: str, data: list):
-    """Append data to a file and add a newline to the end.
-
-    Args:
-        filename (str): The file to save to.
-        data (str): The data to be added to the file.
-    """
-    # Enable the following debug statement only when troubleshooting
-    # problems writing data to the CSV files:
-    # log.debug("Writing <<{}>> to {}".format(data, filename))
-    with open(filename, "a+") as csvfile:
-        for datum in data:
-            csvfile.write(datum + "\n")
-
-
 def open_file(filename, mode="r", no_sd=False) -> FileIO:
     """Open a file on the SD card.
 
@@ -423,26 +755,6 @@ def open_file(filename, mode="r", no_sd=False) -> FileIO:
         raise RuntimeError("No microSD card present.")
 
 
-def seek_endl(f_ptr):
-    """Seeks to the start of the last line in the file.
-
-    Args:
-        f_ptr: The file pointer of the file to be traversed.
-
-    Returns:
-        int: Index of the file pointer after seeking.
-    """
-    # Skips the last newline
-    index = f_ptr.tell() - 1
-
-    # While we are not pointing at a newline, seek backwards
-    while f_ptr.read(1) != "\n" and index > 0:
-        index -= 1
-        f_ptr.seek(index, 0)  # os.SEEK_SET
-
-    return index
-
-
 def enabled() -> bool:
     """Gets the status of the SD card, to inform user that it has been set up successfully.
 
@@ -29,12 +29,17 @@ try:
 except ImportError:
     import asyncio
 import asyn
+from util import rtcmem
 
 SLEEP = const(0)
 WAKE = const(1)
 RX_DIR = const(1)
 TX_DIR = const(0)
 RX_TIMEOUT = const(500)  # milliseconds
+BREAK_TIME = const(25)  # milliseconds, at least 12 ms
+MARK_TIME = const(9)  # milliseconds, at least 8.33 ms
+BYTE_TIME_US = const(8333)  # microseconds to send one byte at 1200 baud
+UNADDRESSED_TIMEOUT = const(1000)  # milliseconds
 UART_ENCODING = "utf-8"
 
 # Define Rev::4.0 connections from ESP32 GPIO to the SDI-12 module,
@@ -46,6 +51,9 @@ SDI_TX = const(22)  # IO22 (physical pin 36)
 SDI_EN = const(2)  # IO2 (physical pin 24)
 SDI_FOUT = const(25)  # IO25 (physical pin 10)
 
+# RTC memory key of the sensor cache, see _cached_sensor()
+SENSOR_CACHE_KEY = "sdi12"
+
 ADDR_QUERY_CMD = "?!"  # Can be sent with run_unaddressed_command() to query addresses of connected sensors
 
 log = logging.getLogger("sdi12")
@@ -66,23 +74,26 @@ def init_sdi(sensors_on: int) -> dict:
     - dir_: the direction control pin
     - force_out: the pin to force the output high
     - en: the sensor wake pin
+    - sreader: a stream reader over the UART, for awaiting responses
     - lock: an asynchronous lock to prevent concurrent access to the SDI line
 
     Returns:
         dict: The SDI-12 structure.
     """
 
+    uart = UART(
+        2,
+        baudrate=1200,
+        bits=7,
+        parity=0,
+        stop=1,
+        timeout_char=62,
+        tx=SDI_TX,
+        rx=SDI_RX,
+    )
     sdi = {
-        "uart": UART(
-            2,
-            baudrate=1200,
-            bits=7,
-            parity=0,
-            stop=1,
-            timeout_char=62,
-            tx=SDI_TX,
-            rx=SDI_RX,
-        ),
+        "uart": uart,
+        "sreader": asyncio.StreamReader(uart),
         "dir_": Pin(SDI_DIR, mode=Pin.OUT),
         "force_out": Pin(SDI_FOUT, mode=Pin.OUT),
         "en": Pin(SDI_EN, mode=Pin.OUT),
@@ -131,9 +142,14 @@ def turn_off_sensors(sdi: dict):
 
 async def read_sensor(
     sensor: dict, sdi: dict, time_booted: int, crc=False, name: str = None
-) -> dict:
+) -> tuple:
     """
-    Retrieve, parse and return SDI-12 reading as dict
+    Retrieve, parse and return SDI-12 reading as tuple
+
+    Sensors with `concurrent` set in their configuration are read with the
+    concurrent measurement command (aC!), which lets other sensors use the
+    bus while the measurement is being taken. Otherwise the bus is held
+    for the whole measurement (aM!), as the SDI-12 specification requires.
 
     Args:
         sensor (dict): The information for the SDI-12 sensor being started.
@@ -143,7 +159,7 @@ async def read_sensor(
         name (str, optional): The name of the sensor. Defaults to the sensor address if not specified.
 
     Returns:
-        dict: The fully parsed sensor data. This contains ont the data that the user is interested in (based on the contents of the sensor dict).
+        tuple: The fully parsed sensor data, in the order of the readings in the sensor dict, with span and zero adjustments applied. Readings the sensor returned no value for are None.
 
     Raises:
         ValueError: If the returned address is incorrect.
@@ -151,8 +167,9 @@ async def read_sensor(
         TypeError: If the sensor returns no reading. This normally indicates some other unexpected issue.
         RuntimeError: If the sensor doesn't reply (or is unable to reply).
     """
+    concurrent = sensor.get("concurrent", False)
     try:
-        response = await measure(sensor, sdi, time_booted, crc, name)
+        response = await measure(sensor, sdi, time_booted, crc, name, concurrent)
     except RuntimeError as e:
         log.error("RuntimeError: {0}".format(e))
         raise RuntimeError("Unable to take measurement reading")
@@ -160,7 +177,8 @@ async def read_sensor(
     # get the middle 3 digits (time taken to take measurement)
     try:
         measure_time = int(response[1:4])
-        num_values = int(response[4])
+        # atttn for aM!, atttnn for aC!
+        num_values = int(response[4:6] if concurrent else response[4])
     # this shouldn't happen, but do it just to be sure
     except ValueError:
         # log the error and then return None
@@ -174,24 +192,104 @@ async def read_sensor(
         )
         raise TypeError("Sensor returned no reading. Address may be incorrect.")
 
-    # don't allow other SDI-12 sensors to run during this wait time
-    async with sdi["lock"]:
+    addr = str(sensor["address"])
+    entry = _cached_sensor(addr)
+
+    if concurrent:
+        # Other sensors may use the bus while this one measures
         await asyncio.sleep(measure_time)
+    else:
+        # don't allow other SDI-12 sensors to run during this wait time
+        async with sdi["lock"]:
+            await _wait_for_service_request(
+                sdi,
+                addr,
+                measure_time,
+                name,
+                _sensor_model(entry["id"]) if entry is not None else None,
+            )
 
-    # strip the sensor data
-    sensor_index = _readings_to_indices(sensor)
+    if entry is not None and entry.get("n") != num_values:
+        log.info("Sensor {0} now returns {1} values".format(addr, num_values))
+        entry = None
+    pages = list(entry["pages"]) if entry is not None else []
 
+    plan = read_plan(sensor)
     # get the minimum of either the number of values or max reading index
-    max_index = min(num_values, max(sensor_index))
+    max_index = min(num_values, plan["max_index"])
 
-    # get all responses, up to max_index
-    all_responses = await deep_data_reading(sensor, sdi, max_index, time_booted)
+    # read the values up to max_index straight into the reading slots
+    try:
+        try:
+            values = await _read_data(plan, sensor, sdi, max_index, time_booted, pages)
+        except ValueError as e:
+            # The cached pages are stale, read them all again
+            log.warning("{0}. Reading all data pages".format(e))
+            entry = None
+            pages = []
+            values = await _read_data(plan, sensor, sdi, max_index, time_booted, pages)
+    except RuntimeError:
+        _forget_sensor(addr)
+        raise
+
+    if entry is None:
+        # New or changed sensor. Identify it now that the measurement has been
+        # read, as any command would abort it.
+        entry = {"id": await _identify(sensor, sdi, time_booted)}
+    if (
+        entry.get("n") != num_values
+        or entry.get("t") != measure_time
+        or entry.get("pages") != pages
+    ):
+        entry.update({"n": num_values, "t": measure_time, "pages": pages})
+        _cache_sensor(addr, entry)
+    return values
+
+
+async def _wait_for_service_request(
+    sdi: dict, addr: str, measure_time: int, name: str = None, model: str = None
+) -> int:
+    """Wait for a measurement started with aM! to complete.
+
+    A sensor which completes its measurement before the measure time it
+    advertised sends a service request (a<CR><LF>). Listen for it on the bus
+    and return as soon as it arrives, falling back to the full measure time.
 
-    # filter out unneeded responses
-    filtered_responses = _filter_responses(all_responses, sensor_index)
-    # apply span and zero offset adjustments
-    scaled_responses = _apply_adjustments(filtered_responses, sensor)
-    return scaled_responses
+    Args:
+        sdi (dict): The SDI-12 structure. The caller must hold the lock.
+        addr (str): The address of the measuring sensor.
+        measure_time (int): The measure time (ttt) advertised by the sensor, in seconds.
+        name (str, optional): The name of the sensor, for logging.
+        model (str, optional): The vendor and model of the sensor, see _sensor_model(), for logging so that the time saved can be grouped by model.
+
+    Returns:
+        int: The time waited, in milliseconds.
+    """
+    timeout = 1000 * measure_time
+    time_in = time.ticks_ms()
+    while True:
+        line = await _readline(sdi, timeout - time.ticks_diff(time.ticks_ms(), time_in))
+        if line is None:
+            break
+        try:
+            if str(line, UART_ENCODING).strip("\x00\r\n") == str(addr):
+                break
+        except UnicodeError:
+            pass
+        log.debug("Ignoring unexpected data: %s", line)
+    elapsed = time.ticks_diff(time.ticks_ms(), time_in)
+
+    if elapsed < timeout:
+        log.info(
+            "Service request from sensor {0} ({1}) after {2} ms of {3} s measure time, saved {4} ms".format(
+                name if name else addr,
+                model if model else "not identified",
+                elapsed,
+                measure_time,
+                timeout - elapsed,
+            )
+        )
+    return elapsed
 
 
 async def run_command(command: str, sdi: dict, wake_time: int = 0) -> str:
@@ -227,7 +325,7 @@ async def run_command(command: str, sdi: dict, wake_time: int = 0) -> str:
     return await _send_cmd(command, sensor, sdi, wake_time)
 
 
-def run_unaddressed_command(command: str, sdi: dict) -> str:
+async def run_unaddressed_command(command: str, sdi: dict) -> str:
     """
     Run any command, and does not require an address unlike run_command(). Can be used to query addresses of all sensors, which nessecitates no address being sent. Will also turn on all the sensors.
 
@@ -235,27 +333,25 @@ def run_unaddressed_command(command: str, sdi: dict) -> str:
         command (str): the command to be sent/
         sdi (dict): The SDI-12 structure.
     Returns:
-        str: The raw response from the sensor.
+        str: The raw response from the sensor, or None if there was no response.
     """
-    # Wakes all sensors
-    _wake_sensors(sdi)
-    # Sets direction to transmitting
-    sdi["dir_"](TX_DIR)
-    uart = sdi["uart"]
-    # Clears the buffer
-    uart.read()
-    # Sends the command
-    uart.write(command)
-    # Waits for the command to send
-    time.sleep_us(8333 * len(command))
-    # Reads the response
-    sdi["dir_"](RX_DIR)
-    time.sleep_ms(1000)
-    r = uart.read()
-    return r
-
-
-def _wake_sensors(sdi: dict):
+    async with sdi["lock"]:
+        # Wakes all sensors
+        await _wake_sensors(sdi)
+        uart = sdi["uart"]
+        # Clears the buffer
+        uart.read()
+        # Sends the command and waits for it to be sent
+        await _write(sdi, command)
+        # Reads the response
+        sdi["dir_"](RX_DIR)
+        response = await _readline(sdi, UNADDRESSED_TIMEOUT)
+    if response is None:
+        return None
+    return str(response, UART_ENCODING)
+
+
+async def _wake_sensors(sdi: dict):
     """Send a break/mark sequence to wake all connected sensors so they are ready to receive data. This should be used before sending a command.
 
     Args:
@@ -264,10 +360,58 @@ def _wake_sensors(sdi: dict):
     # send break
     sdi["force_out"](0)
     sdi["dir_"](TX_DIR)
-    time.sleep_us(25000)
+    await asyncio.sleep_ms(BREAK_TIME)
     # send mark
     sdi["force_out"](1)
-    time.sleep_us(8333)
+    await asyncio.sleep_ms(MARK_TIME)
+
+
+async def _write(sdi: dict, data: str):
+    """Send data on the bus and wait until it has been transmitted. Returns
+    as soon as the last byte has been sent, without yielding to other tasks
+    while it is.
+
+    Args:
+        sdi (dict): The SDI-12 structure.
+        data (str): The data to send.
+    """
+    uart = sdi["uart"]
+    # Each byte takes ~8.3 ms to send
+    end = time.ticks_add(time.ticks_us(), BYTE_TIME_US * len(data))
+    uart.write(data)
+    # Other tasks run while all but the last byte are sent
+    await asyncio.sleep_ms(BYTE_TIME_US * (len(data) - 1) // 1000)
+    # The rest is waited for without yielding, so that the caller can switch
+    # the bus to receive before the sensor starts its response (~15 ms)
+    remaining = time.ticks_diff(end, time.ticks_us())
+    if remaining > 0:
+        time.sleep_us(remaining)
+    if hasattr(uart, "txdone"):
+        while not uart.txdone():
+            time.sleep_us(100)
+
+
+async def _readline(sdi: dict, timeout: int) -> bytes:
+    """Wait for a line terminated by <CR><LF> from the bus.
+
+    Args:
+        sdi (dict): The SDI-12 structure.
+        timeout (int): The maximum time to wait, in milliseconds.
+
+    Returns:
+        bytes: The line including its terminator, or None if the timeout expired first.
+    """
+    if timeout <= 0:
+        return None
+    try:
+        return await asyncio.wait_for_ms(sdi["sreader"].readline(), timeout)
+    except asyncio.TimeoutError:
+        # The timeout is thrown into readline() while it waits for the UART,
+        # so readline() does not unregister it. Unregister it here, or bus
+        # echo or a late reply would resume this task wherever it is then
+        # waiting.
+        asyncio.get_event_loop().remove_reader(sdi["sreader"].polls)
+        return None
 
 
 def _check_sensor_state(sdi: dict):
@@ -330,31 +474,25 @@ async def _send_cmd(cmd: str, sensor: dict, sdi: dict, wake_time: int) -> str:
         attempts = 0
         while not response and attempts < 3:
             # Wake up all sensors
-            _wake_sensors(sdi)
-            # Send command
-            uart.write(cmd)
-            # Sleep for enough time to fully send command (each byte takes ~8.3 ms)
-            time.sleep_us(8333 * len(cmd))
-            # Switch to receive mode
+            await _wake_sensors(sdi)
+            # Clear the receive buffer before the command, as clearing it
+            # after could discard the start of the response
+            cleared = uart.read()
+            log.debug("Clearing buffer: %s", cleared)
+            # Send command, wait for it to be sent and switch to receive mode
+            # with no await in between
+            await _write(sdi, cmd)
             sdi["dir_"](RX_DIR)
-            # Clear the receive buffer
-            log.debug("Clearing buffer: {}".format(uart.read()))
-
-            # Sensor should wait some period of time, which increases for each attempt
-            timeout_end = time.ticks_ms() + RX_TIMEOUT * (attempts + 1)
-            while not uart.any():
-                # Check timeout
-                if time.ticks_diff(timeout_end, time.ticks_ms()) < 0:
-                    break
-                # Run other tasks every 50ms while waiting
-                await asyncio.sleep_ms(50)
 
-            # If successful response, take reading
-            read_string = uart.read()
+            # Sensor should wait some period of time, which increases for each attempt.
+            # Other tasks run until the <CR><LF> terminating the response arrives.
+            read_string = await _readline(sdi, RX_TIMEOUT * (attempts + 1))
 
             try:
-                if read_string == b"\x00":
-                    raise RuntimeError("No bytes received by sensor")
+                if read_string is not None:
+                    read_string = read_string.lstrip(b"\x00")
+                    if not read_string:
+                        raise RuntimeError("No bytes received by sensor")
                 # Attempt to convert the response to a string
                 response = str(read_string, UART_ENCODING)
             except UnicodeError:
@@ -380,28 +518,6 @@ async def _send_cmd(cmd: str, sensor: dict, sdi: dict, wake_time: int) -> str:
         )
 
 
-def _parse_sensor_data(response: str, crc: bool = False) -> list:
-    """Split the recorded data returned by the sensor.
-
-    This involves removing the address, splitting at (and keeping) plus or minus signs, and removing carriage return and linefeed characters.
-
-    Args:
-        response (str): The response from the sensor that needs to be formatted. Should follow the regex `[0-9A-Za-z]([+-](\d+(\.\d+)?))+`
-        crc (bool, optional): Set to True to enable error checking. Not yet implemented. Defaults to False.
-
-    Returns:
-        list: A list containing the split data.
-    """
-    start_indices = [i for i, x in enumerate(response) if x == "+" or x == "-"]
-    # -2 to remove <CR><LF> (\r\n)
-    start_indices.append(len(response) - 2)
-    response_list = [
-        float(response[start_indices[i] : start_indices[i + 1]])
-        for i in range(len(start_indices) - 1)
-    ]
-    return response_list
-
-
 def _check_addr(response: str, addr: str):
     """Check that the response was from the intended address.
 
@@ -424,145 +540,296 @@ def _check_addr(response: str, addr: str):
     return True
 
 
-def _readings_to_indices(sensor: dict) -> tuple:
-    """Extracts just the indices of the readings for easier parsing.
+def compile_read_plan(sensor: dict) -> dict:
+    """Compile the parts of the sensor configuration used on every read.
 
     Args:
-        readings (dict): The sensor information.
+        sensor (dict): The sensor information.
+
+    The returned dict contains the keys:
+    - sensor: the sensor information the plan was compiled from
+    - address: the sensor address as a string
+    - data_cmds: the data commands aD0! to aD9!
+    - slots: value index (from 1) -> tuple of the reading slots it fills
+    - max_index: the index of the last value any reading uses
+    - multipliers, offsets: the adjustments of each reading slot
 
     Returns:
-        tuple: Stripped sensor information containing just the reading name and its index.
+        dict: The read plan.
     """
+    addr = str(sensor["address"])
     readings = sensor["readings"]
-    return tuple([reading["index"] for reading in readings])
+    slots = {}
+    for slot, reading in enumerate(readings):
+        slots[reading["index"]] = slots.get(reading["index"], ()) + (slot,)
+    return {
+        "sensor": sensor,
+        "address": addr,
+        "data_cmds": tuple("{0}D{1}!".format(addr, page) for page in range(10)),
+        "slots": slots,
+        "max_index": max(slots) if slots else 0,
+        "multipliers": tuple(reading["multiplier"] for reading in readings),
+        "offsets": tuple(reading["offset"] for reading in readings),
+    }
 
 
-def _filter_responses(responses: list, measure_id_index: tuple) -> tuple:
-    """Filter the responses that the user requested and map them to the name of the sensor.
+# Read plans by sensor address, see read_plan()
+_read_plans = {}
+
+
+def read_plan(sensor: dict) -> dict:
+    """Get the read plan of a sensor, compiling it if the sensor is new or
+    its configuration has been reloaded since the plan was compiled.
 
     Args:
-        responses (list): The parsed responses from the sensor
-        measure_id_index (tuple): The stripped sensor information. This must be run through _readings_to_indices first.
+        sensor (dict): The sensor information.
 
     Returns:
-        tuple: The responses that the user requested with the reading name as the key.
+        dict: The read plan, see compile_read_plan().
     """
-    return tuple(
-        [responses[index - 1] for index in measure_id_index if index <= len(responses)]
-    )
+    addr = str(sensor["address"])
+    plan = _read_plans.get(addr)
+    if plan is None or plan["sensor"] is not sensor:
+        plan = compile_read_plan(sensor)
+        _read_plans[addr] = plan
+    return plan
 
 
-def _apply_adjustments(responses: tuple, sensor: dict) -> tuple:
-    """Apply multiplier (span) and offset (zero) adjustments to the received data.
+def _parse_into_slots(response: str, plan: dict, first_index: int, values: list) -> int:
+    """Parse the values of a data response into the reading slots that use them.
 
-    The multiplier is applied first, followed by the offset.
+    Values no reading uses are counted but not converted, and no intermediate
+    list of values is built.
 
     Args:
-        responses (tuple): The responses from the sensor with the name of the reading as the key. They must be filtered beforehand using _filter_responses.
-        sensor (dict): The sensor information.
+        response (str): The response to an aDn! command, including the address and <CR><LF>.
+        plan (dict): The read plan of the sensor.
+        first_index (int): The number of values received in previous responses.
+        values (list): The readings, indexed by slot. Slots filled are updated with the adjusted value.
 
     Returns:
-        tuple: The readings with any adjustments applied. The readings are mapped with the reading name as the key.
+        int: The number of values in the response.
     """
-    readings = sensor["readings"]
-    return tuple(
-        [
-            response * readings[index]["multiplier"] + readings[index]["offset"]
-            for index, response in enumerate(responses)
-        ]
-    )
-
-
-async def measure(sensor: dict, sdi: dict, wake_time: int, crc: bool, name: str) -> str:
-    """Send a measure command (aM!). Optionally, send an error checking measurement command instead (aMC!).
+    slots = plan["slots"]
+    multipliers = plan["multipliers"]
+    offsets = plan["offsets"]
+    # -2 to remove <CR><LF> (\r\n)
+    end = len(response) - 2
+    count = 0
+    start = -1
+    for i in range(1, end + 1):
+        if i < end and response[i] != "+" and response[i] != "-":
+            continue
+        if start >= 0:
+            count += 1
+            targets = slots.get(first_index + count)
+            if targets:
+                value = float(response[start:i])
+                for slot in targets:
+                    values[slot] = value * multipliers[slot] + offsets[slot]
+        start = i
+    return count
+
+
+def _page_needed(plan: dict, first_index: int, count: int) -> bool:
+    """Check if any reading uses one of the values of a data page.
 
     Args:
-        sensor (dict): The sensor information.
-        sdi (dict): The SDI-12 structure.
-        wake_time (int): The time the sensor was woken.
-        crc (bool): Set to True to enable error checking. Not yet implemented.
-        name (str): The name of the sensor.
+        plan (dict): The read plan of the sensor.
+        first_index (int): The number of values in the previous pages.
+        count (int): The number of values in the page.
 
     Returns:
-        str: The raw response from the sensor. This will be of the form atttn, where a is the address, ttt is the time to take the measurement, and n is the number of responses.
-
-    Raises:
-        ValueError: If the returned address is incorrect.
-        RuntimeError: If the sensor doesn't reply (or is unable to reply).
+        bool: True if the page has to be read.
     """
-    addr = sensor["address"]
-
-    log.info("Reading sensor: {0}".format(name if name else addr))
-
-    response = await _send_cmd(
-        "{0}M{1}!".format(addr, "C" if crc else ""), sensor, sdi, wake_time
-    )
-
-    # verify that the response was from the correct address
-    attemp = 0
-    while not _check_addr(response, addr) and attemp < 3:
-        attemp = attemp + 1
-        response = await _send_cmd(
-            "{0}M{1}!".format(addr, "C" if crc else ""), sensor, sdi, wake_time
-        )
-
-    return response
+    slots = plan["slots"]
+    for index in range(first_index + 1, first_index + count + 1):
+        if index in slots:
+            return True
+    return False
 
 
-async def deep_data_reading(
-    sensor: dict, sdi: dict, max_index: int, wake_time: int
-) -> list:
-    """Read all the data from a sensor.
+async def _read_data(
+    plan: dict, sensor: dict, sdi: dict, max_index: int, wake_time: int, pages: list
+) -> tuple:
+    """Read the data of a measurement into the reading slots of its read plan.
 
-    This will send as many aDn! commands as required until there is no more data to read, or when max_index is reached.
+    This sends as many aDn! commands as required to receive max_index values.
+    Pages whose number of values is known from earlier reads are skipped if no
+    reading uses their values.
 
     Args:
+        plan (dict): The read plan of the sensor.
         sensor (dict): The sensor information.
         sdi (dict): The SDI-12 structure.
-        max_index (int): The index of the last reading the user wants.
+        max_index (int): The index of the last value needed.
         wake_time (int): The time that the sensor was woken.
+        pages (list): The number of values in each data page, as far as known. Pages read for the first time are appended.
 
     Returns:
-        list: All the data from the sensor, up to max_index or the last reading, whichever comes first.
+        tuple: The adjusted readings, in configuration order. Readings whose value was not returned by the sensor are None.
 
     Raises:
-        ValueError: If the returned address is incorrect.
+        ValueError: If a page does not hold the number of values in pages.
         RuntimeError: If the sensor doesn't reply (or is unable to reply).
     """
-    # read response
+    addr = plan["address"]
+    values = [None] * len(plan["multipliers"])
     reading_index = 0
-    data_index = 0
-    addr = sensor["address"]
-    full_responses = []
+    for page, cmd in enumerate(plan["data_cmds"]):
+        if reading_index >= max_index:
+            break
+        known = page < len(pages)
+        if known and not _page_needed(plan, reading_index, pages[page]):
+            reading_index += pages[page]
+            continue
 
-    # Set up command with address, but leave index out (hence, {{0}})
-    read_cmd = "{0}D{{0}}!".format(addr)
-
-    while reading_index < max_index:
-        response = await _send_cmd(read_cmd.format(data_index), sensor, sdi, wake_time)
+        response = await _send_cmd(cmd, sensor, sdi, wake_time)
 
         attemp = 0
         while not _check_addr(response, addr) and attemp < 3:
             attemp = attemp + 1
-            response = await _send_cmd(
-                read_cmd.format(data_index), sensor, sdi, wake_time
-            )
+            response = await _send_cmd(cmd, sensor, sdi, wake_time)
 
-        response_list = _parse_sensor_data(response)
+        count = _parse_into_slots(response, plan, reading_index, values)
         # If no response received log an error. This really shouldn't happen.
-        if not response_list:
+        if not count:
             log.critical(
                 "No response received at index {0}. The program should never enter this branch.".format(
                     reading_index
                 )
             )
             raise RuntimeError("No response received from sensor")
-        # Add all responses to a list
-        full_responses.extend(response_list)
-        # Increment the index of the response read
-        reading_index += len(response_list)
-        # Increment the index of the D command
-        data_index += 1
+        if not known:
+            pages.append(count)
+        elif count != pages[page]:
+            raise ValueError(
+                "Sensor {0} returned {1} values for {2}, expected {3}".format(
+                    addr, count, cmd, pages[page]
+                )
+            )
+        reading_index += count
         await asyncio.sleep(0)
 
-    return full_responses
+    return tuple(values)
+
+
+async def _identify(sensor: dict, sdi: dict, wake_time: int) -> str:
+    """Send the send identification command (aI!).
+
+    Args:
+        sensor (dict): The sensor information.
+        sdi (dict): The SDI-12 structure.
+        wake_time (int): The time that the sensor was woken.
+
+    Returns:
+        str: The identification of the sensor (SDI-12 version, vendor, model, version and serial number), or None if it could not be read.
+    """
+    addr = str(sensor["address"])
+    try:
+        response = await _send_cmd("{0}I!".format(addr), sensor, sdi, wake_time)
+    except RuntimeError as e:
+        log.warning("Unable to identify sensor {0}: {1}".format(addr, e))
+        return None
+    if not _check_addr(response, addr):
+        return None
+    identification = response[1:].strip()
+    log.info("Sensor {0} identifies as {1}".format(addr, identification))
+    return identification
+
+
+def _sensor_model(identification: str) -> str:
+    """Get the vendor and model of a sensor from its identification.
+
+    Args:
+        identification (str): The response to aI!, without the address: the SDI-12 version (2 characters), vendor (8), model (6), sensor version (3) and optional serial number.
+
+    Returns:
+        str: The vendor and model, separated by a space, or None if the identification is too short.
+    """
+    if identification is None or len(identification) < 16:
+        return None
+    return "{0} {1}".format(identification[2:10].strip(), identification[10:16].strip())
+
+
+def _cached_sensor(addr: str) -> dict:
+    """Get what was learned about a sensor on previous wakes.
+
+    The cache is kept in RTC memory, keyed by address. Each entry contains:
+    - id: the response to aI!, without the address
+    - n: the number of values returned by the measurement command
+    - t: the measurement time, in seconds
+    - pages: the number of values in each aDn! page read
+
+    Args:
+        addr (str): The sensor address.
+
+    Returns:
+        dict: The cache entry, or None if the sensor is not known.
+    """
+    return rtcmem.get(SENSOR_CACHE_KEY, {}).get(addr)
+
+
+def _cache_sensor(addr: str, entry: dict):
+    """Store the cache entry of a sensor.
+
+    Args:
+        addr (str): The sensor address.
+        entry (dict): The entry, see _cached_sensor().
+    """
+    cache = rtcmem.get(SENSOR_CACHE_KEY, {})
+    cache[addr] = entry
+    rtcmem.put(SENSOR_CACHE_KEY, cache)
+
+
+def _forget_sensor(addr: str):
+    """Remove a sensor from the cache, so that it is identified again on its
+    next successful read.
+
+    Args:
+        addr (str): The sensor address.
+    """
+    cache = rtcmem.get(SENSOR_CACHE_KEY, {})
+    if cache.pop(addr, None) is not None:
+        rtcmem.put(SENSOR_CACHE_KEY, cache)
+
+
+async def measure(
+    sensor: dict,
+    sdi: dict,
+    wake_time: int,
+    crc: bool,
+    name: str,
+    concurrent: bool = False,
+) -> str:
+    """Send a measure command (aM!). Optionally, send an error checking measurement command instead (aMC!).
+
+    Args:
+        sensor (dict): The sensor information.
+        sdi (dict): The SDI-12 structure.
+        wake_time (int): The time the sensor was woken.
+        crc (bool): Set to True to enable error checking. Not yet implemented.
+        name (str): The name of the sensor.
+        concurrent (bool, optional): Send a concurrent measurement command (aC! or aCC!) instead. Defaults to False.
+
+    Returns:
+        str: The raw response from the sensor. This will be of the form atttn, where a is the address, ttt is the time to take the measurement, and n is the number of responses. The response to a concurrent measurement command is of the form atttnn.
+
+    Raises:
+        ValueError: If the returned address is incorrect.
+        RuntimeError: If the sensor doesn't reply (or is unable to reply).
+    """
+    addr = sensor["address"]
+
+    log.info("Reading sensor: {0}".format(name if name else addr))
+
+    cmd = "{0}{1}{2}!".format(addr, "C" if concurrent else "M", "C" if crc else "")
+    response = await _send_cmd(cmd, sensor, sdi, wake_time)
+
+    # verify that the response was from the correct address
+    attemp = 0
+    while not _check_addr(response, addr) and attemp < 3:
+        attemp = attemp + 1
+        response = await _send_cmd(cmd, sensor, sdi, wake_time)
+
+    return response
@@ -19,29 +19,65 @@ _level_dict = {
 }
 
 
+# Size of the log file buffer (bytes), a sector of the SD card
+BUFFER_SIZE = 512
+
+
 class MultiStream:
-    def __init__(self):
+    """
+    Writes log lines to the REPL, and to a log file through a ring buffer
+    allocated once. The buffer is written to the file in whole blocks as it
+    fills, and what remains by flush(): after each WARNING or higher, when
+    the file is closed, and before deep sleep (see logging.flush()).
+
+    A buffer_size of 0 writes each line straight to the file.
+    """
+
+    def __init__(self, buffer_size=BUFFER_SIZE):
         self.repl = sys.stderr
         self.file = None
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._used = 0
 
     def set_file(self, file):
         self.unset_file()
-        self.file = open(file, "a+")
+        self.file = open(file, "ab")
 
     def unset_file(self):
         if self.file:
+            self.flush()
             self.file.close()
         self.file = None
+        self._used = 0
 
     def write(self, msg):
         if self.repl:
             self.repl.write(msg)
         if self.file:
-            self.file.write(msg)
+            self._write_file(msg.encode())
+
+    def _write_file(self, data):
+        size = len(self._buffer)
+        if not size:
+            self.file.write(data)
+            return
+        data = memoryview(data)
+        while data:
+            n = min(size - self._used, len(data))
+            self._view[self._used : self._used + n] = data[:n]
+            self._used += n
+            data = data[n:]
+            if self._used == size:
+                self.file.write(self._buffer)
+                self._used = 0
 
     def flush(self):
         # stderr cannot be flushed
         if self.file:
+            if self._used:
+                self.file.write(self._view[: self._used])
+                self._used = 0
             self.file.flush()
 
 
@@ -68,26 +104,30 @@ class Logger:
         return level >= (self.level or _level)
 
     def log(self, level, msg, *args):
-        msg = str(msg)
-        datestamp = "{0}".format(isoformat(time.localtime(), sep=" "))
-        if level >= (self.level or _level):
-            _stream.write(
-                "{:19s}  {:5s}  {}: ".format(
-                    datestamp, self._level_str(level), self.name
-                )
+        # Nothing is formatted for a disabled level: pass values to format as
+        # args, e.g. log.debug("Response: %s", response)
+        if level < (self.level or _level):
+            return
+        if args:
+            msg = msg % args
+        _stream.write(
+            "{:19s}  {:5s}  {}: {}\n".format(
+                isoformat(time.localtime(), sep=" "),
+                self._level_str(level),
+                self.name,
+                msg,
             )
-            if not args:
-                _stream.write("{}\n".format(msg))
-            else:
-                _stream.write("{}\n".format(msg % args))
-            # Flush the file stream
+        )
+        if level >= WARNING:
             _stream.flush()
 
     def debug(self, msg, *args):
-        self.log(DEBUG, msg, *args)
+        if DEBUG >= (self.level or _level):
+            self.log(DEBUG, msg, *args)
 
     def info(self, msg, *args):
-        self.log(INFO, msg, *args)
+        if INFO >= (self.level or _level):
+            self.log(INFO, msg, *args)
 
     def warning(self, msg, *args):
         self.log(WARNING, msg, *args)
@@ -119,6 +159,11 @@ def debug(msg, *args):
     getLogger(None).debug(msg, *args)
 
 
+def flush():
+    """Write the buffered log to the log file, e.g. before deep sleep."""
+    _stream.flush()
+
+
 def basicConfig(level=INFO, filename=None, stream=None, format=None):
     global _level, _stream
     _level = level
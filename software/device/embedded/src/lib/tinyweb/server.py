@@ -356,13 +356,18 @@ async def restful_resource_handler(req, resp, param=None):
     # it can also return error code together with str / dict
     # res = {'blah': 'blah'}
     # res = {'blah': 'blah'}, 201
+    # and a content type other than JSON together with the error code
+    # res = generator, 200, 'text/csv'
+    content_type = "application/json"
+    if type(res) == tuple and len(res) == 3:
+        res, resp.code, content_type = res
     if isinstance(res, asyncio.type_gen):
         # Result is generator, use chunked response
         # NOTICE: HTTP 1.0 by itself does not support chunked responses, so, making workaround:
         # Response is HTTP/1.1 with Connection: close
         resp.version = "1.1"
         resp.add_header("Connection", "close")
-        resp.add_header("Content-Type", "application/json")
+        resp.add_header("Content-Type", content_type)
         resp.add_header("Transfer-Encoding", "chunked")
         resp.add_access_control_headers()
         await resp._send_headers()
@@ -385,7 +390,7 @@ async def restful_resource_handler(req, resp, param=None):
             res_str = json.dumps(res)
         else:
             res_str = res
-        resp.add_header("Content-Type", "application/json")
+        resp.add_header("Content-Type", content_type)
         resp.add_header("Content-Length", str(len(res_str)))
         resp.add_access_control_headers()
         await resp._send_headers()
@@ -30,11 +30,11 @@ if len(sys.path) > 0 and sys.path[0] == "":
 
 import logging
 
-# threading module is used to enable concurent execution of the time synchronizing process, by creating a seperate thread for the sync task. Thus, code can keep running other tasks without sync to complete. Hence, the device will stay responsive
-import threading
-
-# importing rtc(Real time clock) from drivers for needed functions in time module
-from drivers import rtc as rtc_driver
+# Only the modules used by every Regular Mode wake are imported at the top
+# level. Those used only when transmitting (pipeline() and its helpers), on
+# power-up or in Configure Mode are imported where they are used, so that the
+# wakes which only read the rain gauge do not load them. Use
+# test/manual_tests/bench_imports.py to measure the import times.
 
 # Set global log level
 # logging._level = logging.INFO
@@ -61,7 +61,7 @@ sdcard_driver.setup()
 # log.debug("Importing uPy modules")
 import machine
 import esp32
-from machine import Pin, deepsleep
+from machine import Pin
 from micropython import const, alloc_emergency_exception_buf
 
 # lib imports
@@ -71,9 +71,6 @@ try:
     import uasyncio as asyncio
 except ImportError:
     import asyncio
-import asyn
-from aswitch import Pushbutton
-
 import utime as time
 import json
 
@@ -84,13 +81,10 @@ import json
 from drivers import counter as counter_driver
 
 from services import config as config_services
-from services import sdi12 as sdi12_services
 from services import scheduler as scheduler_services
-from services import wlan as wlan_services
 
 from util.time import isoformat
-from util.buildinfo import log_build_info
-from util import helpers
+from util import profiler
 
 # TRACE-level debugging only:
 # log.debug("Completed module and library imports")
@@ -110,8 +104,12 @@ DEEP_SLEEP_PERIOD = 60000
 SERVER_STOP_WAIT_PERIOD = 5000
 
 # Recovery constants
-RECOVERY_TRANSMISSION_COUNT = 3
+# Default time (seconds) allowed for streaming cached transmissions over the
+# MQTT session; overridden by the `drain_budget` device setting.
+DRAIN_TIME_BUDGET = 60
 MAX_RETRANSMIT_CACHE_SIZE = 1000 * 1000
+# Maximum number of cached transmissions packed into one MQTT message
+MAX_BATCH_SIZE = 32
 
 
 # Allocate emergency ISR buffer - https://docs.micropython.org/en/latest/reference/isr_rules.html
@@ -134,6 +132,18 @@ async def all_shutdown():
     await asyncio.sleep(1)
 
 
+def deepsleep(time_ms: int):
+    """
+    Write the buffered system log to the SD card and deep sleep, see
+    machine.deepsleep()
+
+    Args:
+        time_ms (int): time to sleep for (ms)
+    """
+    logging.flush()
+    machine.deepsleep(time_ms)
+
+
 def deep_sleep(sensors: dict):
     """
     Go into deep sleep
@@ -177,6 +187,12 @@ async def stop_server(server, sensors):
 
 def sync_time(modem):
     """Function to calibrate local time using modem or external RTC"""
+    # threading module is used to enable concurent execution of the time synchronizing process, by creating a seperate thread for the sync task. Thus, code can keep running other tasks without sync to complete. Hence, the device will stay responsive
+    import threading
+
+    # importing rtc(Real time clock) from drivers for needed functions in time module
+    from drivers import rtc as rtc_driver
+
     rtc = rtc_driver.rtc()
 
     def sync_rtc():  # new function that encapsulates existing time function and is designed to run on a seperate thread
@@ -260,6 +276,7 @@ def regular_mode(device_config=None, device_data=None):
     Args:
         device_config (dict): device configuration dictionary
     """
+    profiler.start()
     current_time = time.time()
     log.info("Entering Regular Mode")
 
@@ -272,8 +289,10 @@ def regular_mode(device_config=None, device_data=None):
     device_data = device_data or config_services.read_data_file()
 
     # Create a Counter object
+    span = profiler.begin("rain")
     rain_counter = counter_driver.Counter()
     rainfall = rain_counter.get_rainfall()
+    profiler.end(span)
 
     # Check schedule (if raining change interval to 5 minutes else 60 minutes)
     interval_minutes = 5 if rainfall > 0 else 60
@@ -324,6 +343,7 @@ def regular_mode(device_config=None, device_data=None):
                         DEEP_SLEEP_PERIOD, (DEEP_SLEEP_PERIOD / 1000) / 60
                     )
                 )
+                profiler.finish()
                 deepsleep(DEEP_SLEEP_PERIOD)
     else:
         # Turn off red LED
@@ -352,6 +372,7 @@ def regular_mode(device_config=None, device_data=None):
                 sleep_time, (sleep_time / 60)
             )
         )
+        profiler.finish()
         deepsleep((1000 * sleep_time) + 500)
 
 
@@ -362,8 +383,10 @@ async def pipeline(device_config: dict, device_data: dict, current_time: int):
     Args:
         device_config (dict): device configuration dictionary
     """
+    import asyn
     from drivers import sdi12 as sdi12_driver
     from drivers import modem as modem_driver
+    from services import sdi12 as sdi12_services
 
     # Code moved from regular_mode() #650 to here to enable testing
     # Set last send time
@@ -373,8 +396,6 @@ async def pipeline(device_config: dict, device_data: dict, current_time: int):
     log.debug("Set last_transmitted {:d}".format(current_time))
 
     modem = modem_driver.Modem()
-    modem.initialise()
-    sync_time(modem)
     # Initialise SDI-12 UART
     sdi = sdi12_driver.init_sdi(1)
     # Enable the following debug statement only when troubleshooting
@@ -399,12 +420,23 @@ async def pipeline(device_config: dict, device_data: dict, current_time: int):
     # read sensorspro
     # TODO filter out sensors that aren't scheduled to be read
     names, gatherables = sdi12_services.gather_sensors(sdi, sensors_filtered, wake_time)
-    tasks.extend(gatherables)
+    # Time each sensor's read as a span of the `sensors` phase
+    tasks.extend(
+        asyn.Gatherable(profiler.timed, "sensors", coro, *args, **kwargs)
+        for coro, args, kwargs in (gatherable() for gatherable in gatherables)
+    )
+
+    # Bring up the modem, network and MQTT session while the sensors measure.
+    # Its result is the last in the list of task results.
+    tasks.append(asyn.Gatherable(profiler.timed, "modem", modem.initialise_async))
 
     # # Add sensors to tasks
     log.info("Running tasks...")
     sensor_reading_time = time.time()
     task_results = await asyn.Gather(tasks)
+    modem_ready = task_results.pop()
+    log.debug("Modem ready: {0}".format(modem_ready))
+    sync_time(modem)
 
     sensor_results = [
         {"name": name, "readings": readings}
@@ -439,7 +471,9 @@ async def pipeline(device_config: dict, device_data: dict, current_time: int):
     sensor_merged_results["DateTime"] = sensor_reading_time
 
     # Log to SD Card
+    span = profiler.begin("sd")
     sdcard_driver.save_telemetry(sensor_merged_results)
+    profiler.end(span)
 
     # Convert Datetime to ISO8601 compliant string
     sensor_merged_results["DateTime"] = isoformat(sensor_merged_results["DateTime"])
@@ -451,50 +485,39 @@ async def pipeline(device_config: dict, device_data: dict, current_time: int):
     # Add rainfall data
     sensor_merged_results["rainfall"] = rainfall_data
 
+    # Add the profile of the wakes since the last telemetry message. It is not
+    # saved in the datalog and is dropped by the compact encoding.
+    wake_profile = profiler.report()
+    if wake_profile:
+        sensor_merged_results["profile"] = wake_profile
+
     json_result = json.dumps(sensor_merged_results)
 
     # Start transmit
-    # don't transmit failed transmissions if the initial transmission fails
-    if transmit(
+    # Cached failed transmissions are streamed, oldest first, over the same
+    # MQTT session once the current result has been published. They are not
+    # attempted if the initial transmission fails.
+    drain_budget = device_config.get("drain_budget", DRAIN_TIME_BUDGET)
+    if not transmit(
         device_data,
         device_config,
         modem,
         json_result,
+        drain_budget_ms=1000 * drain_budget,
     ):
-        # attempt to transmit some failed transmissions
-        for itt in range(RECOVERY_TRANSMISSION_COUNT):
-            # if the file is too big
-            if (
-                helpers.get_file_size(
-                    sdcard_driver.REQUEUE_FILE + sdcard_driver.FILETYPE
-                )
-                > MAX_RETRANSMIT_CACHE_SIZE
-            ):
-                log.warning(
-                    "Transmission cache full! Transmissions will have to be read manually!\n\t"
-                )
-                break
-
-            # get failed transmission if any are remaining
-            failed_transmission = sdcard_driver.read_failed_transmission()
-            if failed_transmission is None:
-                break
-
-            log.debug(
-                "Attempting to retransmit transmission:\n\t{}".format(
-                    failed_transmission
-                )
+        if sdcard_driver.get_failed_transmissions_size() > MAX_RETRANSMIT_CACHE_SIZE:
+            log.warning(
+                "Transmission cache full! Transmissions will have to be read manually!"
             )
+        else:
+            log.warning("Transmitting failed, saving transmission to sd card")
+            # If the transmission fails, send the result to the sd card cache
+            sdcard_driver.write_failed_transmission(json_result)
 
-            # attempt to send the transmission
-            if transmit(device_data, device_config, modem, failed_transmission):
-                log.debug("Retransmission succeeded!")
-                # if the transmission succeeded, it can be removed from the cache
-                sdcard_driver.delete_latest_failed_transmission()
-    else:
-        log.warning("Transmitting failed, saving transmission to sd card")
-        # If the transmission fails, send the result to the sd card cache
-        sdcard_driver.write_failed_transmission(json_result)
+    # Record the size of the backlog in the device data so that it is
+    # available to the webapp and for planning further drains
+    device_data["failed_transmissions"] = sdcard_driver.count_failed_transmissions()
+    config_services.write_data_file(device_data)
 
     # Turn off modem
     # For frequent transmissions, e.g. once per minute, the power-on/power-off
@@ -507,8 +530,16 @@ async def pipeline(device_config: dict, device_data: dict, current_time: int):
         scheduler_services.calculate_sleep_time(int(time.time()), sensors),
     )
     if sleep_time > 60:
+        span = profiler.begin("modem_off")
+        if modem.mqtt_connected:
+            time.sleep(1)
+            modem.mqtt_disconnect()
         modem.power_off()
+        profiler.end(span)
     else:
+        # The modem keeps the MQTT session alive with keep-alive pings and
+        # the session state is kept in RTC memory, so the next wake can
+        # publish without logging in again.
         log.debug("Leaving modem on as sleep time is only {0} s".format(sleep_time))
 
     # Turn off red LED
@@ -537,10 +568,17 @@ async def pipeline(device_config: dict, device_data: dict, current_time: int):
                 sleep_time, (sleep_time / 60)
             )
         )
+        profiler.finish()
         deepsleep((sleep_time * 1000) + 500)
 
 
-def transmit(device_data: dict, device_config: dict, modem, json_result: str):
+def transmit(
+    device_data: dict,
+    device_config: dict,
+    modem,
+    json_result: str,
+    drain_budget_ms: int = 0,
+):
     """
     Attempts to transmit a given json-encoded data collection to the server.
 
@@ -549,16 +587,22 @@ def transmit(device_data: dict, device_config: dict, modem, json_result: str):
         json_result (str): data to be transmitted to the server
         device_data (dict): device data dictionary
         modem: modem to be used to transmit data
+        drain_budget_ms (int): time allowed for retransmitting cached failed
+            transmissions over the same MQTT session, see drain_backlog().
+            Cached transmissions are not sent if 0.
 
     Returns:
         bool: whether the transmission was successful
     """
+    from drivers import modem as modem_driver
+    from services import payload as payload_services
+
     if modem.has_serial:
         returnValue = True
         log.info("Start transmitting data...")
 
-        modem.get_signal_power()
-        modem.acquire_network()  # Proceed even if an IP address has not been acquired
+        # The signal power and network were acquired by initialise_async() in
+        # the pipeline. Proceed even if an IP address has not been acquired.
         # Update the Cellular network RSSI
         # !!! Must be executed _only_ when a transmit is taking place,
         # !!! otherwise the modem will not be instantiated.
@@ -569,24 +613,52 @@ def transmit(device_data: dict, device_config: dict, modem, json_result: str):
             else int(100 * modem.signal_power / 31)  # 31 is the maximum signal_power
         )
         config_services.write_data_file(device_data)
-        if modem.mqtt_connect():
+        # The MQTT session may already have been opened by the pipeline, or
+        # kept from the previous wake if the modem was left on
+        resumed = modem.mqtt_connected
+        span = profiler.begin("publish")
+        if modem.mqtt_connected or modem.mqtt_connect():
             topic = "{0}/{1}".format(
                 device_config["mqtt_settings"]["parent_topic"].rstrip("/"),
                 device_config["device_name"],
             )
-            modem.mqtt_publish(topic, str(json_result))
-            time.sleep(1)
-            modem.mqtt_disconnect()
+            message, _ = payload_services.encode(
+                device_config,
+                [str(json_result)],
+                modem_driver.MODEM_MQTT_MAX_MESSAGE_LENGTH,
+            )
+            published = modem.mqtt_publish(topic, message)
+            if not published and resumed:
+                # The session kept from the previous wake may have expired
+                log.warning("Publish failed on resumed MQTT session, logging in")
+                modem.mqtt_disconnect()
+                if modem.mqtt_connect():
+                    published = modem.mqtt_publish(topic, message)
+            profiler.end(span)
+            if not published:
+                # The reading is cached by pipeline(), and the cached
+                # transmissions are left for a later wake
+                log.error("Failed to publish the reading")
+                returnValue = False
+            elif drain_budget_ms > 0:
+                span = profiler.begin("drain")
+                drain_backlog(modem, topic, drain_budget_ms, device_config)
+                profiler.end(span)
+            # The MQTT session is closed when the modem is powered-off
             # Reset rainfall data buffer
             device_data["rainfall"] = []
             device_data["date_time"] = []
             config_services.write_data_file(device_data)
         else:
+            profiler.end(span)
             log.error("Failed to connect to the MQTT broker")
             returnValue = False
 
         # If mattermost connected
-        if modem.set_http_connection(modem_driver.MATTERMOST_SERVER):
+        span = profiler.begin("http")
+        if modem_driver.MODEM_RESPONSE_OK in modem.http_connect(
+            modem_driver.MATTERMOST_SERVER
+        ):
 
             modem.http_publish_mattermost(str(json_result))
             time.sleep(1)
@@ -600,6 +672,7 @@ def transmit(device_data: dict, device_config: dict, modem, json_result: str):
             log.error("Failed to connect to Mattermost")
             # Add this line when comfortable it works, or else might screw up everything
             # returnValue = False
+        profiler.end(span)
 
         log.info("Modem has no network or no response. No transmission")
 
@@ -609,9 +682,60 @@ def transmit(device_data: dict, device_config: dict, modem, json_result: str):
     return returnValue
 
 
-from services.webserver import WebServer
-from services import config
-from drivers import sdi12gi
+def drain_backlog(modem, topic: str, budget_ms: int, device_config: dict) -> int:
+    """
+    Publish cached failed transmissions, oldest first, over an MQTT session
+    that is already connected.
+
+    Transmissions are packed into batches of as many as fit in one MQTT
+    message, in the device's `telemetry_encoding` (see services.payload),
+    and removed from the cache once the modem
+    has accepted the batch. Draining stops when the cache is empty, a
+    publish fails, or the time budget is used up.
+
+    Args:
+        modem: modem with a connected MQTT session
+        topic (str): MQTT topic to publish to
+        budget_ms (int): time allowed for draining, in milliseconds
+        device_config (dict): device configuration dictionary
+
+    Returns:
+        int: number of transmissions remaining in the cache
+    """
+    from drivers import modem as modem_driver
+    from services import payload as payload_services
+
+    sent = 0
+    published = 0
+    time_in = time.ticks_ms()
+    while time.ticks_diff(time.ticks_ms(), time_in) < budget_ms:
+        # Batched readings are shorter than the cached transmissions, which
+        # carry a full ISO 8601 DateTime, so read more than one message's worth
+        failed_transmissions = sdcard_driver.read_failed_transmissions(
+            MAX_BATCH_SIZE, 2 * modem_driver.MODEM_MQTT_MAX_MESSAGE_LENGTH
+        )
+        if not failed_transmissions:
+            break
+        message, count = payload_services.encode(
+            device_config,
+            failed_transmissions,
+            modem_driver.MODEM_MQTT_MAX_MESSAGE_LENGTH,
+        )
+        if not modem.mqtt_publish(topic, message):
+            # keep the transmissions at the head of the queue for next time
+            log.warning("Retransmission failed, stopping backlog drain")
+            break
+        sdcard_driver.delete_failed_transmission(count)
+        sent += count
+        published += 1
+
+    remaining = sdcard_driver.count_failed_transmissions()
+    log.info(
+        "Retransmitted {0} cached transmission(s) in {1} message(s) in {2} ms, {3} remaining".format(
+            sent, published, time.ticks_diff(time.ticks_ms(), time_in), remaining
+        )
+    )
+    return remaining
 
 
 def configure_mode():
@@ -621,12 +745,17 @@ def configure_mode():
     Spins up a tinyweb server for visualization and configuration of the device.
 
     """
+    from aswitch import Pushbutton
+    from drivers import sdi12
+    from services import wlan as wlan_services
+    from services.webserver import WebServer
+
     log.info("Entering Configure Mode")
 
     # Read device configuration and data
-    device_config = config.read_config_file()
-    sensors = config.get_sensors(device_config)
-    device_data = config.read_data_file()
+    device_config = config_services.read_config_file()
+    sensors = config_services.get_sensors(device_config)
+    device_data = config_services.read_data_file()
 
     # Start AP mode
     wlan_services.start_ap_mode(ssid="GWRC-{0}".format(device_config["device_id"]))
@@ -710,6 +839,8 @@ if __name__ == "__main__":
     else:
         # Must be first power-up. Initialise rain gauge counter and
         # synchronise the on-board RTC with the network time.
+        from util.buildinfo import log_build_info
+
         log_build_info()
 
         log.info("Initialising rain gauge counter")
@@ -0,0 +1,246 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Packing of several readings into one MQTT message
+
+A single reading is published as a JSON object of the merged sensor
+readings, including an ISO 8601 `DateTime`. A batch packs several readings
+into one JSON object with a shared header:
+
+    {"v": 1, "dev": "<device_name>", "t0": "<DateTime of the first reading>",
+     "r": [{"dt": 0, <readings>}, {"dt": 300, <readings>}, ...]}
+
+where `dt` is the offset in seconds of each reading's `DateTime` from `t0`.
+Readings without a `DateTime` have no `dt`.
+
+With the `telemetry_encoding` device setting "compact", readings are
+instead packed in a binary format, sent base64 encoded so that it can be
+embedded in the AT publish command:
+
+    version (1 byte) | schema id (varint) | count (varint) | record ...
+
+    record: time (varint) | presence bitmap (varint) | value (varint) ...
+
+- The schema is the list of reading names and their number of decimal
+  places, derived from the `sdi12_sensors` configuration (see
+  build_schema()). The subscriber derives the same schema from the same
+  configuration and checks its id.
+- The time of the first record is in seconds since the device epoch
+  (2000-01-01 on the ESP32), later records hold the increase in seconds
+  over the previous record.
+- Bit i of the presence bitmap is set if the record holds a value for
+  schema entry i. Values follow in schema order, as zigzag varints of the
+  value scaled by 10**decimals.
+
+The subscriber (software/mqtt/mqtt_sub.py) accepts single readings, batches
+and compact messages.
+"""
+
+import binascii
+import json
+import logging
+from util.time import parse_isoformat
+
+log = logging.getLogger("payload")
+# Enable the following to set a log level specific to this module:
+# log.setLevel(logging.DEBUG)
+
+BATCH_VERSION = 1
+COMPACT_VERSION = 0xC1
+
+# Number of decimal places kept by the compact encoding when a reading does
+# not set `decimals`
+DEFAULT_DECIMALS = 2
+
+
+def encode_batch(device_name: str, records: list, max_length: int) -> tuple:
+    """
+    Pack as many records as fit in `max_length` into one message.
+
+    Args:
+        device_name (str): name of the device, added to the batch header
+        records (list): JSON encoded readings, oldest first, each with an
+            ISO 8601 `DateTime`
+        max_length (int): maximum length of the message
+
+    Returns:
+        tuple: (message, number of records packed). A record which cannot be
+        batched, e.g. it is too long or is not a JSON object, is returned
+        unchanged on its own so that it is still delivered.
+    """
+    if not records:
+        return None, 0
+
+    parts = []
+    header = None
+    t0 = None
+    length = 0
+    for record in records:
+        try:
+            reading = json.loads(record)
+            if t0 is None:
+                t0 = parse_isoformat(reading["DateTime"])
+                header = '{{"v": {0}, "dev": {1}, "t0": {2}, "r": ['.format(
+                    BATCH_VERSION,
+                    json.dumps(device_name),
+                    json.dumps(reading["DateTime"]),
+                )
+                length = len(header) + len("]}")
+            if "DateTime" in reading:
+                reading["dt"] = parse_isoformat(reading.pop("DateTime")) - t0
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            log.warning("Unable to batch record {0}: {1}".format(record, exc))
+            break
+
+        part = json.dumps(reading)
+        separator = len(", ") if parts else 0
+        if length + separator + len(part) > max_length:
+            break
+        parts.append(part)
+        length += separator + len(part)
+
+    if len(parts) < 2:
+        # Nothing gained by batching
+        return records[0], 1
+
+    return header + ", ".join(parts) + "]}", len(parts)
+
+
+def build_schema(device_config: dict) -> list:
+    """
+    Derive the compact encoding schema from the sensor configuration.
+
+    Readings of all sensors, enabled or not, are included so that enabling a
+    sensor does not change the schema. Sensors are taken in name order and
+    readings in configuration order, followed by the rainfall count.
+
+    Args:
+        device_config (dict): device configuration dictionary
+
+    Returns:
+        list: (reading name, decimal places) tuples
+    """
+    schema = []
+    sensors = device_config["sdi12_sensors"]
+    for sensor_name in sorted(sensors):
+        for reading in sensors[sensor_name]["readings"]:
+            schema.append(
+                (reading["reading"], reading.get("decimals", DEFAULT_DECIMALS))
+            )
+    schema.append(("rainfall", 0))
+    return schema
+
+
+def schema_id(schema: list) -> int:
+    """
+    Returns:
+        int: 16-bit identifier of the schema, sent with every compact message
+    """
+    text = ",".join("{0}:{1}".format(name, decimals) for name, decimals in schema)
+    return binascii.crc32(text.encode("utf-8")) & 0xFFFF
+
+
+def _write_varint(buf: bytearray, value: int):
+    while value > 0x7F:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+
+def encode_compact(schema: list, records: list, max_length: int) -> tuple:
+    """
+    Pack as many records as fit in `max_length` into one compact message.
+
+    Args:
+        schema (list): schema from build_schema()
+        records (list): JSON encoded readings, oldest first, each with an
+            ISO 8601 `DateTime`
+        max_length (int): maximum length of the base64 encoded message
+
+    Returns:
+        tuple: (message, number of records packed). A record which cannot be
+        encoded, e.g. it is not a JSON object with a `DateTime`, is returned
+        unchanged on its own so that it is still delivered.
+    """
+    if not records:
+        return None, 0
+
+    # base64 encodes each 3 bytes as 4 characters
+    max_bytes = (max_length // 4) * 3
+    body = bytearray()
+    previous = None
+    count = 0
+    for record in records:
+        try:
+            reading = json.loads(record)
+            timestamp = parse_isoformat(reading["DateTime"])
+            if previous is not None and timestamp < previous:
+                raise ValueError("Records out of time order")
+            encoded = bytearray()
+            _write_varint(
+                encoded, timestamp if previous is None else timestamp - previous
+            )
+            presence = 0
+            values = bytearray()
+            for i, (name, decimals) in enumerate(schema):
+                value = reading.get(name)
+                if value is None:
+                    continue
+                presence |= 1 << i
+                _write_varint(values, _zigzag(int(round(value * 10**decimals))))
+            _write_varint(encoded, presence)
+            encoded.extend(values)
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            log.warning("Unable to encode record {0}: {1}".format(record, exc))
+            break
+
+        # Header: version, 16-bit schema id and count, as varints
+        if 1 + 3 + 3 + len(body) + len(encoded) > max_bytes:
+            break
+        body.extend(encoded)
+        previous = timestamp
+        count += 1
+
+    if count == 0:
+        return records[0], 1
+
+    message = bytearray([COMPACT_VERSION])
+    _write_varint(message, schema_id(schema))
+    _write_varint(message, count)
+    message.extend(body)
+    return binascii.b2a_base64(message).decode("ascii").strip(), count
+
+
+def encode(device_config: dict, records: list, max_length: int) -> tuple:
+    """
+    Pack records into one message using the device's `telemetry_encoding`.
+
+    Args:
+        device_config (dict): device configuration dictionary
+        records (list): JSON encoded readings, oldest first
+        max_length (int): maximum length of the message
+
+    Returns:
+        tuple: (message, number of records packed)
+    """
+    if device_config.get("telemetry_encoding", "json") == "compact":
+        return encode_compact(build_schema(device_config), records, max_length)
+    return encode_batch(device_config["device_name"], records, max_length)
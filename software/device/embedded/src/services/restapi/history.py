@@ -0,0 +1,157 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import json
+from drivers import sdcard
+from util.time import isoformat, parse_isoformat
+
+log = logging.getLogger("restapi.history")
+# Enable the following to set a log level specific to this module:
+# log.setLevel(logging.DEBUG)
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+# Readings are sent in chunks of about CHUNK_SIZE bytes
+CHUNK_SIZE = 512
+
+CSV_HEADER = sdcard.HEADER_STR + "\n"
+
+
+class History:
+    def get(self, data: dict):
+        """
+        Get the readings saved on the microSD card between two times, a page
+        at a time. The response is streamed from the card in chunks.
+
+        Args:
+            data: query params, optionally containing:
+                "from", "to": the times of the first and last readings, as
+                    yyyy-mm-ddThh:mm:ss or seconds since the device's epoch
+                    (default the first and last readings saved)
+                "sensor": only the readings of this name
+                "limit": the number of readings in a page (default
+                    DEFAULT_LIMIT, at most MAX_LIMIT)
+                "cursor": the "next" field of the previous JSON page
+                "format": "json" (default) or "csv"
+
+        Returns:
+            JSON response with the readings, as [name, time, value], and the
+            cursor of the next page or null; or CSV in the layout of the
+            datalog files, without a cursor
+        """
+        log.debug("Received GET /data/history")
+        if not sdcard.enabled():
+            return json.dumps({"error": "no microSD card present"}), 404
+        try:
+            start = _parse_time(data.get("from"), 0)
+            end = _parse_time(data.get("to"), 0x7FFFFFFF)
+            limit = min(max(int(data.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+            skip = 0
+            if "cursor" in data:
+                start, skip = (int(field) for field in data["cursor"].split("-"))
+        except ValueError:
+            return json.dumps({"error": "invalid from, to, limit or cursor"}), 400
+        fmt = data.get("format", "json")
+        if fmt not in ("json", "csv"):
+            return json.dumps({"error": "format must be json or csv"}), 400
+
+        page = _Page(start, end, data.get("sensor"), limit, skip)
+        if fmt == "csv":
+            return _chunked(_csv_lines(page)), 200, "text/csv"
+        return _chunked(_json_lines(page)), 200
+
+
+def _parse_time(value: str or None, default: int) -> int:
+    if value is None:
+        return default
+    if value.isdigit():
+        return int(value)
+    return parse_isoformat(value)
+
+
+class _Page:
+    """
+    Iterator over the readings of a page, in the order saved.
+
+    A cursor is "<time>-<n>": the page starts at the time (s since the
+    device's epoch), after the first n readings of that time.
+
+    Attributes:
+        next (str): the cursor of the next page, or None if this is the last
+            page; set once the page has been read
+    """
+
+    def __init__(self, start: int, end: int, sensor: str, limit: int, skip: int):
+        self.readings = sdcard.query_telemetry(start, end, sensor)
+        self.limit = limit
+        self.skip = skip
+        self.first = isoformat(start)
+        self.count = 0
+        self.next = None
+        # Time of the last reading, and the number of readings of that time
+        self._time = None
+        self._same = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        for name, time_str, value in self.readings:
+            if time_str == self._time:
+                self._same += 1
+            else:
+                self._time = time_str
+                self._same = 1
+            if self.skip and time_str == self.first and self._same <= self.skip:
+                continue
+            if self.count == self.limit:
+                self.next = "{0}-{1}".format(parse_isoformat(time_str), self._same - 1)
+                # Close the daily file now rather than when garbage collected
+                self.readings.close()
+                break
+            self.count += 1
+            return name, time_str, value
+        raise StopIteration
+
+
+def _json_lines(page: _Page):
+    yield '{"readings":['
+    for reading in page:
+        yield ("," if page.count > 1 else "") + json.dumps(reading)
+    yield '],"next":' + json.dumps(page.next) + "}"
+
+
+def _csv_lines(page: _Page):
+    yield CSV_HEADER
+    for reading in page:
+        yield "{0},{1},{2}\n".format(*reading)
+
+
+def _chunked(lines):
+    """Join the lines of a response into chunks of about CHUNK_SIZE bytes."""
+    parts = []
+    size = 0
+    for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield "".join(parts)
@@ -0,0 +1,51 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import json
+from drivers import sdcard
+
+log = logging.getLogger("restapi.syslog")
+# Enable the following to set a log level specific to this module:
+# log.setLevel(logging.DEBUG)
+
+DEFAULT_KB = 4
+# The response is built in RAM
+MAX_KB = 16
+
+
+class SystemLog:
+    def get(self, data: dict):
+        """
+        Get the end of the system log
+
+        Args:
+            data: query params, optionally containing "kb", the number of KB
+                to return (default DEFAULT_KB, at most MAX_KB)
+
+        Returns:
+            JSON response with the last lines of the system log
+        """
+        log.debug("Received GET /log")
+        if not sdcard.enabled():
+            return json.dumps({"error": "no microSD card present"}), 404
+        try:
+            kb = int(data.get("kb", DEFAULT_KB))
+        except ValueError:
+            return json.dumps({"error": "kb must be an integer"}), 400
+        kb = min(max(kb, 1), MAX_KB)
+        return json.dumps({"log": sdcard.read_log_tail(kb * 1024)}), 200
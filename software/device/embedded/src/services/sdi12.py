@@ -31,15 +31,25 @@ def gather_sensors(sdi, sensors, wake_time):
     """
     Gather a list of functions as Gatherables to read the sensor data
 
+    Sensors using concurrent measurements come first, so that their aC!
+    commands are usually sent before a sensor using the standard measurement
+    command takes the bus for the length of its measurement. This is not
+    guaranteed: each sensor takes the SDI-12 lock for its own command, and
+    asyn.Lock is not first come, first served, so an aM! sensor may take the
+    bus between them and delay the remaining aC! commands until its
+    measurement is read.
+
     Args:
         sdi (dict): SDI-12 driver
         sensors (dict): Configuration of all sensors
         wake_time: time sensors were woken
 
     Returns:
-        Array of Gatherables
+        Names of the sensors and array of Gatherables, in the same order
     """
-    sensor_names = list(sensors.keys())
+    sensor_names = [
+        name for name in sensors if sensors[name].get("concurrent", False)
+    ] + [name for name in sensors if not sensors[name].get("concurrent", False)]
     gatherables = [
         asyn.Gatherable(
             drivers.sdi12.read_sensor, sensors[name], sdi, wake_time, name=name
@@ -54,11 +64,13 @@ def convert_readings(results: tuple, sensor: dict):
     Convert a tuple of readings for a particular sensor to a dict
 
     Args:
-        results (tuple): sensor reading results
+        results (tuple): sensor reading results, None for a reading the
+            sensor returned no value for
         sensor (dict): sensor config
 
     Returns:
-        dictionary of reading name -> result mapping
+        dictionary of reading name -> result mapping, without the readings
+        which have no value
     """
 
     if not results:
@@ -72,4 +84,10 @@ def convert_readings(results: tuple, sensor: dict):
     if len(results) != len(readings):
         raise ValueError("Result and readings not same length")
 
-    return {reading["reading"]: result for reading, result in zip(readings, results)}
+    # Readings the sensor returned no value for are left out, so that they are
+    # neither saved nor transmitted
+    return {
+        reading["reading"]: result
+        for reading, result in zip(readings, results)
+        if result is not None
+    }
@@ -257,6 +257,8 @@ DEVICE_SETTINGS_VALIDATIONS = {
     "wifi_password": [(validate_type, str), (validate_length, 5, 30)],
     "first_send_at": [(validate_type, int), (validate_num, 0)],
     "send_interval": [(validate_type, int), (validate_num, 1)],
+    "drain_budget": [(validate_type, int), (validate_num, 0)],
+    "telemetry_encoding": [(validate_type, str), (validate_enum, ["json", "compact"])],
     "maintenance_mode": [(validate_type, bool)],
     "mqtt_settings": {
         "host": [(validate_type, str), (validate_length, 1, 50)],
@@ -277,6 +279,7 @@ SENSOR_SETTINGS_VALIDATIONS = {
     "bootup_time": [(validate_type, int), (validate_num, 0)],
     "record_interval": [(validate_type, int), (validate_num, 0)],
     "first_record_at": [(validate_type, int), (validate_num, 0)],
+    "concurrent": [(validate_type, bool)],
     "readings": [
         (validate_type, list),
         (
@@ -288,6 +291,7 @@ SENSOR_SETTINGS_VALIDATIONS = {
                 "multiplier": [(validate_type, int, float)],
                 "offset": [(validate_type, int, float)],
                 "uuid": [(validate_type, str), (validate_length, 30, 40)],
+                "decimals": [(validate_type, int), (validate_num, 0, 7)],
             },
         ),
     ],
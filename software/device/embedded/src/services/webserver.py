@@ -33,12 +33,15 @@ try:
 except ImportError:
     import asyncio
 
-import lib.tinyweb as tinyweb
-from lib.aswitch import Delay_ms
+import tinyweb
+from tinyweb.server import parse_query_string
+from aswitch import Delay_ms
 
 import services.config as config
-from services.restapi import data, device, sdi12, monitor
+from services.restapi import data, device, sdi12, monitor, syslog, history
 import drivers.sdi12
+from drivers import sdcard
+from util import compress
 
 log = logging.getLogger("webserver")
 # Enable the following to set a log level specific to this module:
@@ -50,6 +53,12 @@ FILETYPE_ENCODINGS = {
     "html": "text/html",
 }
 
+# Daily datalog files are downloaded DOWNLOAD_BUFFER_SIZE bytes at a time,
+# compressed with a window of 2 ** DOWNLOAD_WBITS bytes, see
+# test/manual_tests/bench_download.py
+DOWNLOAD_BUFFER_SIZE = 1024
+DOWNLOAD_WBITS = 10
+
 
 class TimedWebserver(tinyweb.webserver):
     """
@@ -147,6 +156,11 @@ class WebServer:
             device_config=self.get_config,
             sensor_wake_time=self.get_wake_time,
         )
+        self.app.add_resource(syslog.SystemLog, "/log")
+        self.app.add_resource(history.History, "/data/history")
+        self.app.add_route(
+            "/data/download", self.get_daily_files, save_headers=["Accept-Encoding"]
+        )
         self.app.add_route("/", self.get_main_page)
         self.app.add_route("/<file>", self.get_static_file)
         self.running = False
@@ -243,6 +257,44 @@ class WebServer:
             "static/index.html.gz", content_encoding="gzip", content_type="text/html"
         )
 
+    async def get_daily_files(self, req, resp):
+        """
+        Send the daily datalog files from one date to another as a single CSV
+        file, read and sent DOWNLOAD_BUFFER_SIZE bytes at a time. It is gzip
+        compressed as it is sent if the client accepts it and the firmware
+        can compress.
+
+        Query params "from" and "to" are the first and last dates,
+        yyyy-mm-dd, by default the first and last files.
+        """
+        params = {}
+        if req.query_string:
+            params = parse_query_string(req.query_string.decode())
+        dates = []
+        if sdcard.enabled():
+            dates = sdcard.daily_dates(
+                params.get("from", "0000-00-00"), params.get("to", "9999-99-99")
+            )
+        log.info("Requested daily files: {0}".format(dates))
+        if not dates:
+            await resp.error(404)
+            return
+
+        resp.add_header("Content-Type", "text/csv")
+        resp.add_header(
+            "Content-Disposition",
+            'attachment; filename="datalog_{0}_{1}.csv"'.format(dates[0], dates[-1]),
+        )
+        chunks = sdcard.read_daily_files(dates, DOWNLOAD_BUFFER_SIZE)
+        if compress.available() and b"gzip" in req.headers.get(b"Accept-Encoding", b""):
+            resp.add_header("Content-Encoding", "gzip")
+            chunks = compress.gzip_chunks(chunks, DOWNLOAD_WBITS)
+        # The length is not known, so the response ends when the connection
+        # is closed
+        await resp._send_headers()
+        for chunk in chunks:
+            await resp.send(chunk)
+
     async def get_static_file(self, req, resp, file: str):
         """
         Get a static file.
@@ -0,0 +1,156 @@
+"""
+Measure the throughput of downloading daily datalog files from the SD card:
+sent raw with tinyweb's send_file(), read into a larger buffer, and gzip
+compressed as they are sent (as by GET /data/download) with a range of
+buffer sizes and compression windows.
+
+The response is written to a writer that discards it, so the throughput is
+that of reading and compressing, without the WLAN link. The sizes sent show
+how much less the link has to carry when compressed.
+
+Three daily files, from 2000-01-01, are written first and deleted
+afterwards.
+
+Run on the data recorder with the SD card inserted (Ctrl-C to stop
+main.py):
+
+    import test.manual_tests.bench_download
+"""
+
+import os
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from tinyweb.server import response
+from drivers import sdcard
+from util import compress
+from util import hourindex
+from util.time import isoformat
+
+MAIN_FILE = "bench_datalog"
+DAYS = 3
+# Readings saved every 10 minutes
+WAKES = 144
+READINGS = {
+    "flow": 0.125,
+    "temperature": 14.37,
+    "water_level": 1.204,
+    "pressure": 1013.2,
+    "humidity": 87.5,
+    "rainfall": 0,
+}
+START_TIME = 0
+DATES = [isoformat(START_TIME + 86400 * day)[:10] for day in range(DAYS)]
+
+# (buffer size, wbits) compressed with
+SETTINGS = [(512, 9), (1024, 9), (1024, 10), (2048, 10), (1024, 12)]
+
+
+def ticks_ms():
+    try:
+        return time.ticks_ms()
+    except AttributeError:
+        return int(time.perf_counter() * 1000)
+
+
+class NullWriter:
+    """Counts the bytes of a response written to it."""
+
+    def __init__(self):
+        self.s = 1
+        self.written = 0
+
+    async def awrite(self, buf, off=0, sz=-1):
+        if sz == -1:
+            sz = len(buf) - off
+        self.written += sz
+
+
+def write_files() -> int:
+    """Write the daily files, and return their total size (bytes)."""
+    for day in range(DAYS):
+        for i in range(WAKES):
+            data = dict(READINGS, DateTime=START_TIME + 86400 * day + 600 * i)
+            sdcard.save_telemetry(data)
+    return sum(os.stat(sdcard._daily_file(date))[6] for date in DATES)
+
+
+def remove_files():
+    for date in DATES:
+        daily_file = sdcard._daily_file(date)
+        for path in (daily_file, hourindex.index_path(daily_file)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    try:
+        os.remove(sdcard.gen_path(MAIN_FILE + sdcard.FILETYPE))
+    except OSError:
+        pass
+
+
+async def send_raw(writer: NullWriter):
+    for date in DATES:
+        await response(writer).send_file(sdcard._daily_file(date))
+
+
+async def send_chunks(writer: NullWriter, chunks):
+    for chunk in chunks:
+        await writer.awrite(chunk)
+
+
+def bench(name: str, size: int, coro_func, *args):
+    writer = NullWriter()
+    start = ticks_ms()
+    asyncio.get_event_loop().run_until_complete(coro_func(writer, *args))
+    elapsed = max(ticks_ms() - start, 1)
+    print(
+        "{0:24s} {1:8.1f} KB/s {2:8d} bytes sent".format(
+            name, size / 1024 / (elapsed / 1000), writer.written
+        )
+    )
+
+
+def run():
+    if not sdcard.enabled():
+        print("No microSD card present")
+        return
+    main_file = sdcard.MAIN_FILE
+    binary = sdcard.BINARY_DATALOG
+    sdcard.MAIN_FILE = MAIN_FILE
+    sdcard.BINARY_DATALOG = False
+    try:
+        remove_files()
+        size = write_files()
+        print("{0} daily files, {1} bytes".format(DAYS, size))
+        bench("send_file (128 B)", size, send_raw)
+        for buffer_size in (512, 1024, 2048):
+            bench(
+                "raw ({0} B)".format(buffer_size),
+                size,
+                send_chunks,
+                sdcard.read_daily_files(DATES, buffer_size),
+            )
+        if not compress.available():
+            print("gzip compression not available")
+            return
+        for buffer_size, wbits in SETTINGS:
+            bench(
+                "gzip ({0} B, wbits {1})".format(buffer_size, wbits),
+                size,
+                send_chunks,
+                compress.gzip_chunks(
+                    sdcard.read_daily_files(DATES, buffer_size), wbits
+                ),
+            )
+    finally:
+        sdcard.MAIN_FILE = main_file
+        sdcard.BINARY_DATALOG = binary
+        remove_files()
+
+
+run()
@@ -0,0 +1,109 @@
+"""
+Benchmark the telemetry encodings: bytes per reading and encode time for
+single JSON readings, JSON batches and the compact binary encoding.
+
+Run on the data recorder (or with CPython from the `src` directory):
+
+    import test.manual_tests.bench_encoding
+"""
+
+import json
+import time
+
+from services import payload as payload_services
+
+MAX_LENGTH = 1024
+ITERATIONS = 20
+
+DEVICE_CONFIG = {
+    "device_name": "data-recorder",
+    "sdi12_sensors": {
+        "water_sensor": {
+            "readings": [
+                {"reading": "flow", "decimals": 3},
+                {"reading": "temperature", "decimals": 2},
+                {"reading": "water_level", "decimals": 3},
+            ]
+        },
+        "weather_sensor": {
+            "readings": [
+                {"reading": "pressure", "decimals": 1},
+                {"reading": "humidity", "decimals": 1},
+            ]
+        },
+    },
+}
+
+
+def ticks_us():
+    try:
+        return time.ticks_us()
+    except AttributeError:
+        return int(time.perf_counter() * 1000000)
+
+
+def make_records(count: int) -> list:
+    return [
+        json.dumps(
+            {
+                "DateTime": "2023-09-01T{0:02d}:{1:02d}:00".format(
+                    10 + (5 * i) // 60, (5 * i) % 60
+                ),
+                "flow": 0.125 + i / 1000,
+                "temperature": 14.37 - i / 100,
+                "water_level": 1.204,
+                "pressure": 1013.2,
+                "humidity": 87.5,
+                "rainfall": i % 3,
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def bench(name: str, encode, records: list):
+    """Encode all records in as few messages as possible, ITERATIONS times."""
+    total_us = 0
+    for _ in range(ITERATIONS):
+        remaining = records
+        messages = []
+        start = ticks_us()
+        while remaining:
+            message, count = encode(remaining)
+            messages.append(message)
+            remaining = remaining[count:]
+        total_us += ticks_us() - start
+
+    nbytes = sum(len(message) for message in messages)
+    print(
+        "{0:8s} {1:4d} messages {2:6d} bytes {3:7.1f} bytes/reading {4:8.1f} us/reading".format(
+            name,
+            len(messages),
+            nbytes,
+            nbytes / len(records),
+            total_us / ITERATIONS / len(records),
+        )
+    )
+
+
+def run(count: int = 48):
+    records = make_records(count)
+    compact_config = dict(DEVICE_CONFIG, telemetry_encoding="compact")
+    print("Encoding {0} readings".format(count))
+    # The current format: one json.dumps() of the merged readings per message
+    bench("json", lambda remaining: (json.dumps(json.loads(remaining[0])), 1), records)
+    bench(
+        "batch",
+        lambda remaining: payload_services.encode(DEVICE_CONFIG, remaining, MAX_LENGTH),
+        records,
+    )
+    bench(
+        "compact",
+        lambda remaining: payload_services.encode(
+            compact_config, remaining, MAX_LENGTH
+        ),
+        records,
+    )
+
+
+run()
@@ -0,0 +1,113 @@
+"""
+Measure the time and memory taken to import the modules used by main.py.
+
+Modules are imported in the order of a boot: first those imported by every
+Regular Mode wake, then those imported only when transmitting, on power-up
+and in Configure Mode. The time and memory of each import include those of
+the modules it imports which were not already loaded.
+
+Run on the data recorder straight after a reset, so that no modules are
+loaded yet (Ctrl-C to stop main.py, then Ctrl-D for a soft reset and Ctrl-C
+again):
+
+    import test.manual_tests.bench_imports
+"""
+
+import gc
+import sys
+import time
+
+# Import groups in boot order, see main.py
+GROUPS = (
+    (
+        "regular",
+        (
+            "logging",
+            "drivers.sdcard",
+            "machine",
+            "esp32",
+            "uasyncio",
+            "utime",
+            "json",
+            "drivers.counter",
+            "services.config",
+            "services.scheduler",
+            "util.time",
+            "util.profiler",
+        ),
+    ),
+    (
+        "transmit",
+        (
+            "asyn",
+            "drivers.sdi12",
+            "drivers.modem",
+            "services.sdi12",
+            "services.payload",
+            "threading",
+            "drivers.rtc",
+        ),
+    ),
+    ("power-up", ("util.buildinfo",)),
+    (
+        "configure",
+        ("aswitch", "services.wlan", "services.webserver"),
+    ),
+)
+
+
+def ticks_us():
+    try:
+        return time.ticks_us()
+    except AttributeError:
+        return int(time.perf_counter() * 1000000)
+
+
+def mem_alloc():
+    gc.collect()
+    try:
+        return gc.mem_alloc()
+    except AttributeError:
+        return 0
+
+
+def bench(name: str) -> tuple:
+    """
+    Returns:
+        tuple: (import time (us), memory kept by the import (bytes)), or
+        None if the module was already loaded or could not be imported
+    """
+    if name in sys.modules:
+        return None
+    before = mem_alloc()
+    start = ticks_us()
+    try:
+        __import__(name)
+    except ImportError as exc:
+        print("{0:20s} not imported: {1}".format(name, exc))
+        return None
+    elapsed = ticks_us() - start
+    return elapsed, mem_alloc() - before
+
+
+def run():
+    print("{0:20s} {1:>8s} {2:>8s}".format("module", "ms", "bytes"))
+    for group, modules in GROUPS:
+        total_us = 0
+        total_bytes = 0
+        for name in modules:
+            result = bench(name)
+            if result is None:
+                continue
+            elapsed, allocated = result
+            total_us += elapsed
+            total_bytes += allocated
+            print("{0:20s} {1:8.1f} {2:8d}".format(name, elapsed / 1000, allocated))
+        print(
+            "{0:20s} {1:8.1f} {2:8d}\n".format(
+                "= " + group, total_us / 1000, total_bytes
+            )
+        )
+
+
+run()
@@ -0,0 +1,82 @@
+"""
+Benchmark the cost of a log call: for a disabled level, with the message
+formatted by the caller or by the logger from its args, and for an enabled
+level, written to a log file through the buffer of lib/logging.py, or line
+by line with and without a flush after each line (the former is how lines
+were written before the buffer).
+
+Run on the data recorder with the SD card inserted (Ctrl-C to stop
+main.py):
+
+    import test.manual_tests.bench_logging
+"""
+
+import os
+import time
+
+import logging
+from drivers import sdcard
+from util import helpers
+
+ITERATIONS = 200
+LOG_FILE = "bench_logging.log"
+
+RESPONSE = "+UUMQTTC: 1,0"
+
+
+def ticks_us():
+    try:
+        return time.ticks_us()
+    except AttributeError:
+        return int(time.perf_counter() * 1000000)
+
+
+def bench(name: str, call):
+    """Print the mean time of a call, ITERATIONS times."""
+    start = ticks_us()
+    for _ in range(ITERATIONS):
+        call()
+    elapsed = ticks_us() - start
+    print("{0:24s} {1:8.1f} us/call".format(name, elapsed / ITERATIONS))
+
+
+def run():
+    path = helpers.join_path(sdcard.get_logging_dir(), LOG_FILE)
+    log = logging.Logger("bench_logging")
+    log.setLevel(logging.INFO)
+    stream = logging._stream
+
+    try:
+        print("Disabled level (DEBUG)")
+        bench(
+            "caller formats",
+            lambda: log.debug("Response: {0}".format(RESPONSE)),
+        )
+        bench("logger formats", lambda: log.debug("Response: %s", RESPONSE))
+
+        print("Enabled level (INFO), to {0}".format(path))
+        for name, buffer_size, flush in (
+            ("line by line, flushed", 0, True),
+            ("line by line", 0, False),
+            ("buffered", logging.BUFFER_SIZE, False),
+        ):
+            logging._stream = logging.MultiStream(buffer_size)
+            # Only the file is timed, not the REPL
+            logging._stream.repl = None
+            logging._stream.set_file(path)
+            if flush:
+                bench(
+                    name, lambda: (log.info("Response: %s", RESPONSE), logging.flush())
+                )
+            else:
+                bench(name, lambda: log.info("Response: %s", RESPONSE))
+            logging._stream.unset_file()
+    finally:
+        logging._stream = stream
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+run()
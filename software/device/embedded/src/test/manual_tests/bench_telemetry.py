@@ -0,0 +1,105 @@
+"""
+Measure the time taken to save a wake's telemetry to the SD card: with
+sdcard.save_telemetry(), and as it was saved before (an existence check
+listing each directory of the path, then an open and a write per line for
+each file).
+
+The telemetry is written to bench_datalog.csv and to the daily file of a
+day in 2000, which are deleted afterwards.
+
+Run on the data recorder with the SD card inserted (Ctrl-C to stop
+main.py):
+
+    import test.manual_tests.bench_telemetry
+"""
+
+import os
+import time
+
+from drivers import sdcard
+from util import helpers
+from util.time import isoformat
+
+WAKES = 20
+MAIN_FILE = "bench_datalog"
+
+# Readings of the example configuration; the time is 2000-01-01T00:00:00
+READINGS = {
+    "flow": 0.125,
+    "temperature": 14.37,
+    "water_level": 1.204,
+    "pressure": 1013.2,
+    "humidity": 87.5,
+    "rainfall": 0,
+}
+START_TIME = 946684800
+
+
+def ticks_us():
+    try:
+        return time.ticks_us()
+    except AttributeError:
+        return int(time.perf_counter() * 1000000)
+
+
+def files(timestamp: str) -> list:
+    return [
+        sdcard.gen_path(MAIN_FILE + sdcard.FILETYPE),
+        sdcard.gen_path(
+            sdcard.BACKUP_DIR,
+            MAIN_FILE + "_" + timestamp[:10] + sdcard.FILETYPE,
+        ),
+    ]
+
+
+def save_line_by_line(data: dict):
+    """Save telemetry as before the telemetry buffer."""
+    data = dict(data)
+    timestamp = isoformat(int(data.pop("DateTime")))
+    data_list = [
+        sdcard._gen_data_string(name, value, timestamp) for name, value in data.items()
+    ]
+    for fname in files(timestamp):
+        if not helpers.check_exists(fname):
+            with open(fname, "a+") as csvfile:
+                csvfile.write(sdcard.HEADER_STR + "\n")
+        with open(fname, "a+") as csvfile:
+            for datum in data_list:
+                csvfile.write(datum + "\n")
+
+
+def remove_files():
+    for fname in files(isoformat(START_TIME)):
+        try:
+            os.remove(fname)
+        except OSError:
+            pass
+
+
+def bench(name: str, save):
+    remove_files()
+    total_us = 0
+    for i in range(WAKES):
+        data = dict(READINGS, DateTime=START_TIME + 600 * i)
+        start = ticks_us()
+        save(data)
+        total_us += ticks_us() - start
+    print("{0:16s} {1:8.2f} ms/wake".format(name, total_us / WAKES / 1000))
+
+
+def run():
+    if not sdcard.enabled():
+        print("No microSD card present")
+        return
+    main_file = sdcard.MAIN_FILE
+    sdcard.MAIN_FILE = MAIN_FILE
+    try:
+        print("{0} readings per wake, {1} wakes".format(len(READINGS), WAKES))
+        bench("line by line", save_line_by_line)
+        bench("buffered", sdcard.save_telemetry)
+    finally:
+        sdcard.MAIN_FILE = main_file
+        remove_files()
+
+
+run()
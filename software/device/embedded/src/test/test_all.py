@@ -32,6 +32,15 @@ def test_all():
         "test/test_sdcard",
         "test/test_pipeline",
         "test/test_logging",
+        "test/test_filequeue",
+        "test/test_logfile",
+        "test/test_compress",
+        "test/test_datalog",
+        "test/test_hourindex",
+        "test/test_atparser",
+        "test/test_rtcmem",
+        "test/test_batch",
+        "test/test_profiler",
         # "test/test_tinyweb", # temporarily disabled due to asyncio queue overflow errors in CI
     ]
 
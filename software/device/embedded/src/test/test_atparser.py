@@ -0,0 +1,87 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Test the incremental AT response parser
+"""
+
+import unittest
+from util.atparser import ATParser
+
+
+class TestATParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = ATParser()
+        self.urcs = []
+        self.parser.register_urc(
+            "+UUMQTTC", lambda prefix, params: self.urcs.append((prefix, params))
+        )
+        self.parser.register_urc(
+            "+CEREG", lambda prefix, params: self.urcs.append((prefix, params))
+        )
+
+    def test_response_split_across_chunks(self):
+        """Lines split between UART reads are joined before parsing."""
+        self.parser.begin("+CSQ")
+        self.assertFalse(self.parser.feed(b"AT+CSQ\r\r\n+CS"))
+        self.assertFalse(self.parser.feed(b"Q: 10,99\r\n\r\nO"))
+        self.assertTrue(self.parser.feed(b"K\r\n"))
+
+        self.assertEqual(self.parser.response(), "AT+CSQ  +CSQ: 10,99  OK")
+        self.assertEqual(self.parser.final, "OK")
+
+    def test_error_codes(self):
+        self.parser.begin("+UMQTTC=1")
+        self.assertTrue(self.parser.feed(b"AT+UMQTTC=1\r\r\n+CME ERROR: 3\r\n"))
+        self.assertEqual(self.parser.final, "+CME ERROR: 3")
+
+        self.parser.begin("+FOO")
+        self.assertTrue(self.parser.feed(b"AT+FOO\r\r\nERROR\r\n"))
+        self.assertEqual(self.parser.final, "ERROR")
+
+    def test_urc_dispatched(self):
+        """URCs go to their callbacks and are left out of the response."""
+        self.parser.begin("+UMQTTC=1")
+        self.parser.feed(
+            b"AT+UMQTTC=1\r\r\n+UMQTTC: 1,1\r\n\r\n+UUMQTTC: 1,0\r\nOK\r\n"
+        )
+
+        self.assertEqual(self.urcs, [("+UUMQTTC", "1,0")])
+        self.assertEqual(self.parser.response(), "AT+UMQTTC=1  +UMQTTC: 1,1  OK")
+
+    def test_solicited_response_not_dispatched(self):
+        """The information text of a query is not mistaken for its URC."""
+        self.parser.begin("+CEREG?")
+        self.parser.feed(b"AT+CEREG?\r\r\n+CEREG: 0,1\r\n\r\nOK\r\n")
+
+        self.assertEqual(self.urcs, [])
+        self.assertIn("+CEREG: 0,1", self.parser.lines())
+
+        self.parser.begin("+CSQ")
+        self.parser.feed(b"+CEREG: 2\r\n")
+        self.assertEqual(self.urcs, [("+CEREG", "2")])
+
+    def test_flush(self):
+        """An unterminated line is only parsed when flushed."""
+        self.parser.begin()
+        self.parser.feed(b"\r\nstray")
+        self.assertEqual(self.parser.lines(), [])
+        self.parser.flush()
+        self.assertEqual(self.parser.lines(), ["stray"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Test packing readings into batched MQTT messages
+"""
+
+import binascii
+import json
+import unittest
+from services import payload as payload_services
+
+
+def make_record(minute: int, temperature: float) -> str:
+    return json.dumps(
+        {
+            "DateTime": "2023-09-01T10:{0:02d}:00".format(minute),
+            "temperature": temperature,
+            "rainfall": 0,
+        }
+    )
+
+
+class TestBatch(unittest.TestCase):
+    def test_batch(self):
+        """Readings are packed with timestamp offsets from the first."""
+        records = [make_record(5 * i, 10.0 + i) for i in range(3)]
+
+        message, count = payload_services.encode_batch("recorder", records, 1024)
+        batch = json.loads(message)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(batch["v"], payload_services.BATCH_VERSION)
+        self.assertEqual(batch["dev"], "recorder")
+        self.assertEqual(batch["t0"], "2023-09-01T10:00:00")
+        self.assertEqual([reading["dt"] for reading in batch["r"]], [0, 300, 600])
+        self.assertEqual(batch["r"][2]["temperature"], 12.0)
+
+    def test_length_limit(self):
+        """Batches are kept within the maximum message length."""
+        records = [make_record(i, 10.0) for i in range(50)]
+
+        message, count = payload_services.encode_batch("recorder", records, 256)
+
+        self.assertTrue(len(message) <= 256)
+        self.assertTrue(1 < count < 50)
+        self.assertEqual(len(json.loads(message)["r"]), count)
+
+    def test_unbatchable_record(self):
+        """A record which cannot be batched is sent on its own, unchanged."""
+        records = ["not json", make_record(0, 10.0)]
+
+        message, count = payload_services.encode_batch("recorder", records, 1024)
+
+        self.assertEqual((message, count), ("not json", 1))
+
+    def test_schema(self):
+        """The schema lists readings by sensor name, then rainfall."""
+        device_config = {
+            "sdi12_sensors": {
+                "b_sensor": {"readings": [{"reading": "pressure", "decimals": 1}]},
+                "a_sensor": {
+                    "readings": [{"reading": "flow"}, {"reading": "temperature"}]
+                },
+            }
+        }
+
+        schema = payload_services.build_schema(device_config)
+
+        self.assertEqual(
+            schema,
+            [("flow", 2), ("temperature", 2), ("pressure", 1), ("rainfall", 0)],
+        )
+
+    def test_compact(self):
+        """Compact messages are much smaller than the equivalent JSON."""
+        schema = [("temperature", 2), ("rainfall", 0)]
+        records = [make_record(5 * i, 10.0 + i) for i in range(10)]
+
+        message, count = payload_services.encode_compact(schema, records, 1024)
+        data = binascii.a2b_base64(message)
+
+        self.assertEqual(count, 10)
+        self.assertEqual(data[0], payload_services.COMPACT_VERSION)
+        self.assertTrue(len(message) < sum(len(record) for record in records) / 4)
+
+        message, count = payload_services.encode_compact(schema, records, 32)
+        self.assertTrue(len(message) <= 32)
+        self.assertTrue(1 <= count < 10)
+
+    def test_compact_unencodable_record(self):
+        schema = [("temperature", 2)]
+
+        message, count = payload_services.encode_compact(schema, ["[1, 2]"], 1024)
+
+        self.assertEqual((message, count), ("[1, 2]", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
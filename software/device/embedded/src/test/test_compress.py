@@ -0,0 +1,66 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Test streaming gzip compression
+"""
+
+import io
+import unittest
+from util import compress
+
+DATA = b"".join(
+    "flow,2000-01-01T{0:02d}:{1:02d}:00,{2}\n".format(i // 60, i % 60, i / 8).encode()
+    for i in range(200)
+)
+
+
+def gunzip(data: bytes) -> bytes:
+    if compress.deflate is not None:
+        return compress.deflate.DeflateIO(
+            io.BytesIO(data), compress.deflate.GZIP
+        ).read()
+    return compress.zlib.decompress(data, 31)
+
+
+class TestGzipChunks(unittest.TestCase):
+    def setUp(self):
+        if not compress.available():
+            raise unittest.SkipTest("gzip compression not available")
+
+    def test_round_trip(self):
+        blocks = [DATA[i : i + 512] for i in range(0, len(DATA), 512)]
+        compressed = b"".join(compress.gzip_chunks(blocks))
+
+        self.assertEqual(compressed[:2], b"\x1f\x8b")
+        self.assertTrue(len(compressed) < len(DATA))
+        self.assertEqual(gunzip(compressed), DATA)
+
+    def test_reused_buffer(self):
+        """Each block is compressed before the next, so a buffer can be reused."""
+        buffer = bytearray(100)
+        view = memoryview(buffer)
+
+        def blocks():
+            for i in range(0, len(DATA), 100):
+                size = len(DATA[i : i + 100])
+                buffer[:size] = DATA[i : i + 100]
+                yield view[:size]
+
+        self.assertEqual(gunzip(b"".join(compress.gzip_chunks(blocks()))), DATA)
+
+    def test_empty(self):
+        self.assertEqual(gunzip(b"".join(compress.gzip_chunks([]))), b"")
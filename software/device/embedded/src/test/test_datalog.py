@@ -0,0 +1,129 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Test the binary datalog
+"""
+
+import os
+import unittest
+from util import datalog
+from util.datalog import BinaryDatalog
+
+DATALOG_FILE = "test_datalog.bin"
+
+
+class TestBinaryDatalog(unittest.TestCase):
+    def setUp(self):
+        self.tearDown()
+
+    def tearDown(self):
+        try:
+            os.remove(DATALOG_FILE)
+        except OSError:
+            pass
+
+    def test_append_and_read(self):
+        log = BinaryDatalog(DATALOG_FILE)
+        self.assertEqual(log.append(1000, {"flow": 0.125, "rainfall": 2}), 2)
+        self.assertEqual(log.append(1600, {"flow": 0.25, "rainfall": 0}), 2)
+
+        records = sorted(BinaryDatalog(DATALOG_FILE).records())
+        self.assertEqual(
+            records,
+            [
+                (1000, "flow", 0.125),
+                (1000, "rainfall", 2.0),
+                (1600, "flow", 0.25),
+                (1600, "rainfall", 0.0),
+            ],
+        )
+        self.assertEqual(len(log), 4)
+
+    def test_fixed_size_records(self):
+        """Records follow the header at a fixed size, and can be read by index."""
+        log = BinaryDatalog(DATALOG_FILE)
+        for i in range(10):
+            log.append(i, {"flow": i / 4})
+
+        self.assertEqual(
+            os.stat(DATALOG_FILE)[6], datalog.HEADER_SIZE + 10 * datalog.RECORD_SIZE
+        )
+        self.assertEqual(list(log.records(7, 9)), [(7, "flow", 1.75), (8, "flow", 2.0)])
+
+    def test_new_names(self):
+        """Names are added to the table as readings appear."""
+        log = BinaryDatalog(DATALOG_FILE)
+        log.append(1000, {"flow": 1})
+        log.append(1600, {"temperature": 14.5})
+
+        reopened = BinaryDatalog(DATALOG_FILE)
+        self.assertEqual(
+            list(reopened.records()), [(1000, "flow", 1.0), (1600, "temperature", 14.5)]
+        )
+        self.assertEqual(reopened.names, ["flow", "temperature"])
+        self.assertEqual(reopened.epoch, datalog.device_epoch())
+
+    def test_non_numeric(self):
+        log = BinaryDatalog(DATALOG_FILE)
+        self.assertEqual(log.append(1000, {"flow": 1, "status": "ok"}), 1)
+        self.assertEqual(log.names, ["flow"])
+
+    def test_torn_record(self):
+        """A partially written record is overwritten by the next append."""
+        log = BinaryDatalog(DATALOG_FILE)
+        log.append(1000, {"flow": 1})
+        with open(DATALOG_FILE, "ab") as f_out:
+            f_out.write(b"\x01\x02\x03")
+        log.append(1600, {"flow": 2})
+
+        self.assertEqual(
+            list(log.records()), [(1000, "flow", 1.0), (1600, "flow", 2.0)]
+        )
+
+    def test_torn_header(self):
+        """A datalog left shorter than its header is created again."""
+        with open(DATALOG_FILE, "wb") as f_out:
+            f_out.write(datalog.MAGIC)
+        log = BinaryDatalog(DATALOG_FILE)
+        self.assertEqual(log.append(1000, {"flow": 1}), 1)
+        self.assertEqual(
+            list(BinaryDatalog(DATALOG_FILE).records()), [(1000, "flow", 1.0)]
+        )
+
+    def test_existing_not_replaced(self):
+        """An existing datalog is not replaced when its header can't be read."""
+        with open(DATALOG_FILE, "wb") as f_out:
+            f_out.write(b"Sensor,Datetime,Data\n" * 40)
+        with self.assertRaises(ValueError):
+            BinaryDatalog(DATALOG_FILE).append(1000, {"flow": 1})
+        self.assertEqual(os.stat(DATALOG_FILE)[6], 21 * 40)
+
+    def test_header_full(self):
+        log = BinaryDatalog(DATALOG_FILE)
+        names = {"reading_{0:040d}".format(i): i for i in range(20)}
+        with self.assertRaises(ValueError):
+            log.append(1000, names)
+        self.assertEqual(log.append(1000, {"flow": 1}), 1)
+        self.assertEqual(
+            list(BinaryDatalog(DATALOG_FILE).records()), [(1000, "flow", 1.0)]
+        )
+
+    def test_not_a_datalog(self):
+        with open(DATALOG_FILE, "wb") as f_out:
+            f_out.write(b"Sensor,Datetime,Data\n" * 40)
+        with self.assertRaises(ValueError):
+            list(BinaryDatalog(DATALOG_FILE).records())
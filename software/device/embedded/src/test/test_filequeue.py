@@ -0,0 +1,144 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Test the segmented file queue used to cache failed transmissions
+"""
+
+import os
+import unittest
+import util.helpers as helpers
+from util.filequeue import FileQueue
+
+QUEUE_DIR = "test_queue"
+
+
+class TestFileQueue(unittest.TestCase):
+    def setUp(self):
+        self.tearDown()
+
+    def tearDown(self):
+        try:
+            helpers.deep_rmdir(QUEUE_DIR)
+        except OSError:
+            pass
+
+    def test_empty(self):
+        """An empty queue has nothing to peek or ack."""
+        queue = FileQueue(QUEUE_DIR)
+
+        self.assertIsNone(queue.peek())
+        self.assertFalse(queue.ack())
+        self.assertEqual(len(queue), 0)
+
+    def test_fifo_order(self):
+        """Records are returned in the order they were enqueued."""
+        queue = FileQueue(QUEUE_DIR)
+        for i in range(5):
+            queue.enqueue("record {0}".format(i))
+
+        records = []
+        while queue.peek() is not None:
+            records.append(queue.peek())
+            queue.ack()
+
+        expected = ["record {0}".format(i) for i in range(5)]
+        self.assertEqual(
+            records,
+            expected,
+            "Records returned out of order.\nExpected {0}, got {1}".format(
+                expected, records
+            ),
+        )
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue.size(), 0)
+
+    def test_segments_roll_over(self):
+        """Small segments roll over and are deleted once read."""
+        queue = FileQueue(QUEUE_DIR, segment_size=32)
+        for i in range(10):
+            queue.enqueue("record {0}".format(i))
+        self.assertTrue(queue.tail_seg > 0, "Queue did not roll over to a new segment")
+
+        for i in range(10):
+            self.assertEqual(queue.peek(), "record {0}".format(i))
+            queue.ack()
+
+        segments = [name for name in os.listdir(QUEUE_DIR) if name.endswith(".dat")]
+        self.assertTrue(
+            len(segments) <= 1,
+            "Exhausted segments were not deleted: {0}".format(segments),
+        )
+
+    def test_persistence(self):
+        """The head position survives re-opening the queue."""
+        queue = FileQueue(QUEUE_DIR, segment_size=32)
+        for i in range(4):
+            queue.enqueue("record {0}".format(i))
+        queue.peek()
+        queue.ack()
+
+        reopened = FileQueue(QUEUE_DIR, segment_size=32)
+        self.assertEqual(len(reopened), 3)
+        self.assertEqual(reopened.peek(), "record 1")
+
+    def test_unacknowledged_record_is_redelivered(self):
+        """A record peeked but not acknowledged before a reset is returned again."""
+        queue = FileQueue(QUEUE_DIR)
+        queue.enqueue("in flight")
+        queue.peek()
+
+        reopened = FileQueue(QUEUE_DIR)
+        self.assertEqual(reopened.peek(), "in flight")
+
+    def test_torn_record_is_skipped(self):
+        """A partially written record is discarded when the queue is re-opened."""
+        queue = FileQueue(QUEUE_DIR)
+        queue.enqueue("complete")
+        with open(queue._segment_path(queue.tail_seg), "ab") as f_out:
+            f_out.write(b'{"partial": ')
+
+        reopened = FileQueue(QUEUE_DIR)
+        reopened.enqueue("after reset")
+
+        self.assertEqual(reopened.peek(), "complete")
+        reopened.ack()
+        self.assertEqual(reopened.peek(), "after reset")
+        self.assertEqual(len(reopened), 1)
+
+    def test_peek_many(self):
+        """Several records are peeked and acknowledged together."""
+        queue = FileQueue(QUEUE_DIR)
+        for i in range(5):
+            queue.enqueue("record {0}".format(i))
+
+        records = queue.peek_many(3, 1000)
+        self.assertEqual(records, ["record 0", "record 1", "record 2"])
+        queue.ack(2)
+        self.assertEqual(len(queue), 3)
+        self.assertEqual(queue.peek(), "record 2")
+
+        # Limited by size, but the first record is always returned
+        self.assertEqual(queue.peek_many(10, 1), ["record 2"])
+        self.assertEqual(len(queue.peek_many(10, 20)), 2)
+        queue.ack(10)
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue.peek(), "record 4")
+
+    def test_newline_rejected(self):
+        queue = FileQueue(QUEUE_DIR)
+        with self.assertRaises(ValueError):
+            queue.enqueue("two\nlines")
@@ -0,0 +1,79 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Test the hourly index of the daily datalog files
+"""
+
+import os
+import unittest
+from util import hourindex
+
+INDEX_FILE = "test_hourindex.idx"
+
+
+class TestHourIndex(unittest.TestCase):
+    def setUp(self):
+        self.tearDown()
+
+    def tearDown(self):
+        try:
+            os.remove(INDEX_FILE)
+        except OSError:
+            pass
+
+    def test_index_path(self):
+        self.assertEqual(
+            hourindex.index_path("sd/daily/datalog_2023-09-01.csv"),
+            "sd/daily/datalog_2023-09-01.idx",
+        )
+
+    def test_update_and_read(self):
+        self.assertTrue(hourindex.update(INDEX_FILE, 0, 21, create=True))
+        self.assertTrue(hourindex.update(INDEX_FILE, 5, 400))
+        offsets = hourindex.read(INDEX_FILE)
+
+        self.assertEqual(len(offsets), hourindex.HOURS)
+        self.assertEqual(offsets[0], 21)
+        self.assertEqual(offsets[5], 400)
+        self.assertEqual(offsets.count(hourindex.UNSET), hourindex.HOURS - 2)
+
+    def test_first_offset_kept(self):
+        """Only the first rows of an hour are indexed."""
+        hourindex.update(INDEX_FILE, 3, 100, create=True)
+        self.assertFalse(hourindex.update(INDEX_FILE, 3, 200))
+        self.assertEqual(hourindex.read(INDEX_FILE)[3], 100)
+
+    def test_missing_index_not_created(self):
+        """A missing index is only created for a new daily file."""
+        self.assertFalse(hourindex.update(INDEX_FILE, 3, 100))
+        self.assertIsNone(hourindex.read(INDEX_FILE))
+
+    def test_span(self):
+        offsets = [hourindex.UNSET] * hourindex.HOURS
+        offsets[1] = 21
+        offsets[4] = 300
+        offsets[9] = 800
+
+        # Hours 2 to 5: the rows of hour 4
+        self.assertEqual(hourindex.span(offsets, 2, 5, 1000), (300, 800))
+        # Up to the end of the day
+        self.assertEqual(hourindex.span(offsets, 4, 23, 1000), (300, 1000))
+        # No rows in hours 5 to 8
+        start, stop = hourindex.span(offsets, 5, 8, 1000)
+        self.assertEqual(start, stop)
+        # No index: the whole file
+        self.assertEqual(hourindex.span(None, 2, 5, 1000), (0, 1000))
@@ -0,0 +1,176 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Test the rotation and tail of the system log
+"""
+
+import os
+import unittest
+import util.helpers as helpers
+from util import compress
+from util import logfile
+
+LOG_DIR = "test_logfile"
+LOG_FILE = LOG_DIR + "/system.log"
+# Created by rotate()
+ARCHIVE_DIR = "test_logfile_daily"
+
+TODAY = "2023-09-02"
+YESTERDAY = "2023-09-01"
+
+
+def write_log(date: str, count: int, path: str = LOG_FILE):
+    with open(path, "a") as f_out:
+        for i in range(count):
+            f_out.write("{0} 12:00:00  INFO   test: line {1:04d}\n".format(date, i))
+
+
+def exists(path: str) -> bool:
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def rotate(max_size: int = 4096, max_total: int = 65536) -> str:
+    return logfile.rotate(LOG_FILE, ARCHIVE_DIR, TODAY, max_size, max_total)
+
+
+class TestLogFile(unittest.TestCase):
+    def setUp(self):
+        self.tearDown()
+        os.mkdir(LOG_DIR)
+
+    def tearDown(self):
+        for directory in (LOG_DIR, ARCHIVE_DIR):
+            try:
+                helpers.deep_rmdir(directory)
+            except OSError:
+                pass
+
+    def test_no_rotation(self):
+        """A small log started today is kept."""
+        self.assertIsNone(rotate())
+        write_log(TODAY, 10)
+
+        self.assertIsNone(rotate())
+        self.assertTrue(exists(LOG_FILE))
+        self.assertEqual(logfile.list_archives(ARCHIVE_DIR), [])
+
+    def test_rotate_by_day(self):
+        """A log started on an earlier day is archived under that day."""
+        write_log(YESTERDAY, 10)
+
+        archive = rotate()
+        self.assertEqual(archive, ARCHIVE_DIR + "/system_2023-09-01_000.log")
+        self.assertTrue(exists(archive))
+        self.assertFalse(exists(LOG_FILE))
+
+    def test_rotate_by_size(self):
+        """Segments of the same day are numbered in order."""
+        for _ in range(3):
+            write_log(TODAY, 40)
+            rotate(max_size=1024)
+
+        names = [
+            name.replace(compress.GZIP_SUFFIX, "")
+            for name in logfile.list_archives(ARCHIVE_DIR)
+        ]
+        self.assertEqual(
+            names,
+            [
+                "system_2023-09-02_000.log",
+                "system_2023-09-02_001.log",
+                "system_2023-09-02_002.log",
+            ],
+        )
+
+    def test_compression(self):
+        """Archives other than the newest are compressed."""
+        if not compress.available():
+            raise unittest.SkipTest("gzip compression not available")
+        write_log(YESTERDAY, 40)
+        rotate()
+        write_log(TODAY, 40)
+        rotate(max_size=1024)
+
+        archives = logfile.list_archives(ARCHIVE_DIR)
+        self.assertEqual(
+            archives,
+            ["system_2023-09-01_000.log.gz", "system_2023-09-02_000.log"],
+        )
+        compressed = helpers.get_file_size(ARCHIVE_DIR + "/" + archives[0])
+        self.assertTrue(
+            compressed < helpers.get_file_size(ARCHIVE_DIR + "/" + archives[1])
+        )
+
+    def test_prune(self):
+        """The oldest archives are deleted to keep within the total size."""
+        for _ in range(4):
+            write_log(TODAY, 40)
+            rotate(max_size=1024, max_total=4000)
+
+        archives = logfile.list_archives(ARCHIVE_DIR)
+        total = sum(
+            helpers.get_file_size(ARCHIVE_DIR + "/" + name) for name in archives
+        )
+        self.assertTrue(total <= 4000)
+        self.assertTrue(archives[-1].startswith("system_2023-09-02_003"))
+
+    def test_rotate_after_prune(self):
+        """A segment is not archived over one of the same day after a prune."""
+        for _ in range(6):
+            write_log(TODAY, 15)
+            rotate(max_size=500, max_total=700)
+
+        names = [
+            name.replace(compress.GZIP_SUFFIX, "")
+            for name in logfile.list_archives(ARCHIVE_DIR)
+        ]
+        self.assertTrue(len(names) < 6)
+        self.assertEqual(len(set(names)), len(names))
+        self.assertEqual(names[-1], "system_2023-09-02_005.log")
+        # The segments kept are the newest, numbered in order
+        self.assertEqual(
+            names,
+            [
+                "system_2023-09-02_{0:03d}.log".format(i)
+                for i in range(6 - len(names), 6)
+            ],
+        )
+
+    def test_tail(self):
+        """The tail is whole lines, from the newest archive if needed."""
+        write_log(YESTERDAY, 40)
+        rotate()
+        write_log(TODAY, 2)
+
+        lines = logfile.tail(LOG_FILE, ARCHIVE_DIR, 200).splitlines()
+        self.assertTrue(len(lines) > 2)
+        self.assertTrue(lines[-1].startswith(TODAY))
+        self.assertTrue(lines[0].startswith(YESTERDAY))
+        for line in lines:
+            self.assertTrue(line.startswith("2023-09-0"), line)
+
+    def test_tail_current(self):
+        write_log(TODAY, 100)
+
+        text = logfile.tail(LOG_FILE, ARCHIVE_DIR, 1000)
+        self.assertTrue(len(text) <= 1000)
+        self.assertTrue(text.endswith("line 0099\n"))
+        self.assertTrue(text.startswith(TODAY))
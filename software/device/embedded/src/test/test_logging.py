@@ -42,3 +42,91 @@ class TestLogging(unittest.TestCase):
                 exception_msg
             ),
         )
+
+    def test_disabled_level(self):
+        """Nothing is formatted for a disabled level."""
+        formatted = []
+
+        class Value:
+            def __str__(self):
+                formatted.append(self)
+                return "value"
+
+        stream = logging._stream
+        logging._stream = logging.MultiStream()
+        logging._stream.repl = None
+        test_log = logging.Logger("test_disabled_level")
+        test_log.setLevel(logging.WARNING)
+        try:
+            test_log.debug("Value %s", Value())
+            test_log.info("Value %s", Value())
+            self.assertEqual(len(formatted), 0)
+            test_log.warning("Value %s", Value())
+            self.assertEqual(len(formatted), 1)
+        finally:
+            logging._stream = stream
+
+
+class LogFile:
+    """Records the writes to a log file."""
+
+    def __init__(self):
+        self.writes = []
+        self.flushed = False
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        self.flushed = True
+
+    def close(self):
+        pass
+
+
+class TestMultiStream(unittest.TestCase):
+    def setUp(self):
+        self.stream = logging.MultiStream(buffer_size=16)
+        self.stream.repl = None
+        self.file = self.stream.file = LogFile()
+
+    def test_whole_blocks(self):
+        """The file is written in whole blocks until flushed."""
+        self.stream.write("0123456789\n")
+        self.assertEqual(self.file.writes, [])
+        self.stream.write("abcdefghijklmnopqrstuvwxyz\n")
+        self.assertEqual(self.file.writes, [b"0123456789\nabcde", b"fghijklmnopqrstu"])
+
+        self.stream.flush()
+        self.assertEqual(self.file.writes[-1], b"vwxyz\n")
+        self.assertTrue(self.file.flushed)
+
+    def test_flush_on_warning(self):
+        stream = logging._stream
+        logging._stream = logging.MultiStream()
+        logging._stream.repl = None
+        self.file = logging._stream.file = LogFile()
+        test_log = logging.Logger("test_flush")
+        test_log.setLevel(logging.INFO)
+        try:
+            test_log.info("Buffered")
+            self.assertEqual(self.file.writes, [])
+            test_log.warning("Written")
+            self.assertIn(b"Written\n", b"".join(self.file.writes))
+            self.assertTrue(self.file.flushed)
+        finally:
+            logging._stream = stream
+
+    def test_unbuffered(self):
+        stream = logging.MultiStream(buffer_size=0)
+        stream.repl = None
+        stream.file = LogFile()
+        stream.write("line\n")
+        self.assertEqual(stream.file.writes, [b"line\n"])
+
+    def test_unset_file(self):
+        """Buffered lines are written when the file is closed."""
+        self.stream.write("line\n")
+        self.stream.unset_file()
+        self.assertEqual(self.file.writes, [b"line\n"])
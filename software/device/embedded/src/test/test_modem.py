@@ -25,6 +25,11 @@ from util.time import isoformat
 
 import time
 
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
 
 class TestModem(unittest.TestCase):
     """Test class for modem"""
@@ -55,6 +60,23 @@ class TestModem(unittest.TestCase):
         result = self.modem.initialise()
         self.assertTrue(result, "Modem fail to register to network.")
 
+    @staticmethod
+    def async_test_helper(async_generator):
+        """async test helper"""
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(async_generator)
+
+    def test_serial_async(self):
+        """Test the asynchronous AT command path."""
+        result = self.async_test_helper(self.modem.send_command_check_async(""))
+        self.assertTrue(result, "Fail to passthrough AT command asynchronously")
+
+    def test_initialise_async(self):
+        """Test bringing up the network and MQTT session asynchronously."""
+        result = self.async_test_helper(self.modem.initialise_async())
+        self.assertTrue(result, "Modem fail to register to network and broker.")
+        self.assertTrue(self.modem.mqtt_connected)
+
     def test_network_time(self):
         """Test if the modem can get network time."""
         result = self.modem.get_network_time()
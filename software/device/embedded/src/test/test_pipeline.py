@@ -71,6 +71,19 @@ class PipelineTests(unittest.TestCase):
         with self.assertRaises(ValueError):
             result_dict = sdi12.convert_readings(sensor_results, sensor)
 
+    def test_convert_readings_missing(self):
+        readings = [
+            {"reading": "temperature", "index": 0, "multiplier": 1, "offset": 0},
+            {"reading": "flow", "index": 1, "multiplier": 1, "offset": 0},
+        ]
+
+        sensor = {"readings": readings}
+        sensor_results = (None, 20)
+
+        result_dict = sdi12.convert_readings(sensor_results, sensor)
+
+        self.assertEqual({"flow": 20}, result_dict)
+
     def test_convert_readings_empty(self):
         readings = tuple([])
         sensor = {}
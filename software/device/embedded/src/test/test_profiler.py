@@ -0,0 +1,98 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Test the wake cycle profiler
+"""
+
+import unittest
+import time
+from util import profiler
+from util import rtcmem
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        rtcmem.put(profiler.RTCMEM_KEY, None)
+        profiler.start()
+
+    def tearDown(self):
+        rtcmem.put(profiler.RTCMEM_KEY, None)
+
+    def test_span(self):
+        span = profiler.begin("test")
+        time.sleep_ms(20)
+        profiler.end(span)
+
+        times = profiler.phase_times()
+        self.assertIn("boot", times)
+        self.assertTrue(20 <= times["test"] < 100)
+
+    def test_overlapping_spans(self):
+        """Time in concurrent spans of a phase is counted once."""
+        first = profiler.begin("test")
+        time.sleep_ms(20)
+        second = profiler.begin("test")
+        time.sleep_ms(20)
+        profiler.end(first)
+        profiler.end(second)
+
+        self.assertTrue(40 <= profiler.phase_times()["test"] < 100)
+
+    def test_buffer_full(self):
+        """Spans beyond the buffer are not timed."""
+        for _ in range(profiler.MAX_SPANS):
+            profiler.begin("test")
+        span = profiler.begin("overflow")
+
+        self.assertEqual(span, -1)
+        profiler.end(span)
+        self.assertNotIn("overflow", profiler.phase_times())
+
+    def test_summary(self):
+        """Wakes are summarised as last, rolling average and maximum."""
+        for duration in (40, 0):
+            profiler.start()
+            span = profiler.begin("test")
+            time.sleep_ms(duration)
+            profiler.end(span)
+            profiler.finish()
+
+        summary = profiler.report()
+        self.assertEqual(summary["n"], 2)
+        last, average, maximum = summary["test"]
+        self.assertTrue(last < 10)
+        self.assertTrue(last < average < maximum)
+        self.assertTrue(maximum >= 40)
+        self.assertIn("wake", summary)
+
+    def test_report_restarts(self):
+        """The wake count and maxima start again after a report."""
+        span = profiler.begin("test")
+        profiler.end(span)
+        profiler.finish()
+        profiler.report()
+
+        summary = profiler.report()
+        self.assertEqual(summary["n"], 0)
+        self.assertEqual(summary["test"][2], 0)
+
+    def test_no_summary(self):
+        self.assertIsNone(profiler.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Test the RTC memory key-value store
+"""
+
+import unittest
+from util import rtcmem
+
+TEST_KEY = "test"
+
+
+class TestRTCMem(unittest.TestCase):
+    def tearDown(self):
+        rtcmem.put(TEST_KEY, None)
+
+    def test_put_get(self):
+        """Values are returned as stored, alongside other users' keys."""
+        value = {"pwr": True, "reg": 1, "baud": 115200}
+        rtcmem.put(TEST_KEY, value)
+
+        self.assertEqual(rtcmem.get(TEST_KEY), value)
+
+    def test_reload(self):
+        """Stored values survive re-reading RTC memory."""
+        rtcmem.put(TEST_KEY, [1, 2, 3])
+        rtcmem._store = None
+
+        expected = [1, 2, 3] if rtcmem._memory() else None
+        self.assertEqual(rtcmem.get(TEST_KEY), expected)
+
+    def test_default(self):
+        self.assertEqual(rtcmem.get("no such key", 42), 42)
+
+    def test_overflow(self):
+        """A value too large for RTC memory does not stop later values being stored."""
+        memory = rtcmem._memory
+
+        def small_memory(data: bytes = None) -> bytes:
+            # RTC user memory of the ESP32
+            if data is not None and len(data) > 2048:
+                raise ValueError("buffer too long")
+            return memory(data)
+
+        rtcmem._memory = small_memory
+        try:
+            rtcmem.put(TEST_KEY, [1])
+            rtcmem.put(TEST_KEY, "x" * 2048)
+            self.assertEqual(rtcmem.get(TEST_KEY), [1])
+            rtcmem.put(TEST_KEY + "_large", "x" * 2048)
+            self.assertIsNone(rtcmem.get(TEST_KEY + "_large"))
+
+            rtcmem.put(TEST_KEY, [2])
+            self.assertEqual(rtcmem.get(TEST_KEY), [2])
+        finally:
+            rtcmem._memory = memory
+
+
+if __name__ == "__main__":
+    unittest.main()
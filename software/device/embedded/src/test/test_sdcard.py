@@ -23,6 +23,7 @@ import logging
 import unittest
 import drivers.sdcard as sdcard
 
+from util.filequeue import FileQueue
 from util.time import isoformat
 
 
@@ -46,6 +47,10 @@ class TestSD(unittest.TestCase):
             os.remove(sdcard.get_main_telemetry_file())
         except OSError:
             pass
+        try:
+            os.remove(sdcard.gen_path(sdcard.BINARY_FILE))
+        except OSError:
+            pass
 
         sdcard.teardown()
 
@@ -159,6 +164,58 @@ class TestSD(unittest.TestCase):
                 )
             )
 
+    def test_querying_telemetry(self):
+        """Check that a query only returns the readings within its time range."""
+        # Every 20 minutes over two days
+        for i in range(144):
+            sdcard.save_telemetry(
+                {"Sensor 1": i, "Sensor 2": -i, "DateTime": 123456 + 1200 * i}
+            )
+
+        start = 123456 + 1200 * 50
+        end = 123456 + 1200 * 80
+        actual = list(sdcard.query_telemetry(start, end, "Sensor 1"))
+        expected = [
+            ("Sensor 1", isoformat(123456 + 1200 * i), float(i)) for i in range(50, 81)
+        ]
+        self.assertEqual(
+            actual,
+            expected,
+            "Query returned incorrect readings.\nExpected: {}, got: {}".format(
+                repr(expected), repr(actual)
+            ),
+        )
+
+        # Both readings, from the start of the first day's file
+        actual = list(sdcard.query_telemetry(0, 123456 + 1200 * 2))
+        self.assertEqual(len(actual), 6)
+        self.assertEqual(
+            sorted(name for name, _, _ in actual[:2]), ["Sensor 1", "Sensor 2"]
+        )
+
+    def test_reading_daily_files(self):
+        """Check that daily files are read as one CSV, with a single header."""
+        for day in range(3):
+            sdcard.save_telemetry({"Sensor 1": day, "DateTime": 123456 + 86400 * day})
+        dates = sdcard.daily_dates("0000-00-00", "9999-99-99")
+        self.assertEqual(len(dates), 3)
+
+        response = b"".join(
+            bytes(chunk) for chunk in sdcard.read_daily_files(dates, buffer_size=16)
+        ).decode()
+        expected = sdcard.HEADER_STR + "\n"
+        for day in range(3):
+            expected += "Sensor 1,{0},{1}\n".format(
+                isoformat(123456 + 86400 * day), day
+            )
+        self.assertEqual(
+            response,
+            expected,
+            "Daily files were not read correctly.\nExpected: {}, got: {}".format(
+                repr(expected), repr(response)
+            ),
+        )
+
     def test_logging(self):
         """Test that logging to the SD card is successful."""
         log = logging.getLogger("test_sdcard")
@@ -190,6 +247,20 @@ class TestSD(unittest.TestCase):
         )
 
 
+class _ResetQueue(FileQueue):
+    """A queue which raises, as a reset would stop the migration, after some records."""
+
+    def __init__(self, directory: str, limit: int):
+        super().__init__(directory)
+        self.limit = limit
+
+    def enqueue(self, record: str):
+        if self.limit == 0:
+            raise KeyboardInterrupt("reset")
+        super().enqueue(record)
+        self.limit -= 1
+
+
 class TestSDLogic(unittest.TestCase):
     def test_data_generation(self):
         """Test that the data string generated is correct."""
@@ -205,29 +276,31 @@ class TestSDLogic(unittest.TestCase):
             ),
         )
 
-    def test_file_appending(self):
-        """Check that it can append to a file correctly."""
-        file = "test_file"
-        # Delete file before doing anything
-        if file in os.listdir():
-            os.remove(file)
-
-        data_string = "hello world"
-        sdcard._append_to_csv(file, [data_string])
-        expected = data_string + "\n"
-
-        data = None
-        with open(file, "r") as f:
-            data = f.read()
+    def test_formatting_rows(self):
+        """Check that the rows of a wake follow the header in one buffer."""
+        rows = sdcard._format_rows({"Sensor 1": 1, "Sensor 2": 2.5}, "some timestamp")
+        lines = bytes(rows).decode().split("\n")
 
+        self.assertEqual(lines[0], sdcard.HEADER_STR)
+        # There is no guarantee what order they will be saved, so sort them
+        expected = ["", "Sensor 1,some timestamp,1", "Sensor 2,some timestamp,2.5"]
+        actual = sorted(lines[1:])
         self.assertEqual(
-            data,
+            actual,
             expected,
-            "File does not contain the correct data. Expected: {}, got: {}".format(
-                repr(expected), repr(data)
+            "Rows are incorrect. Expected: {}, got: {}".format(
+                repr(expected), repr(actual)
             ),
         )
 
+    def test_formatting_many_rows(self):
+        """Check that the buffer grows to fit all the readings."""
+        data = {"Sensor {0}".format(i): i for i in range(100)}
+        rows = bytes(sdcard._format_rows(data, "some timestamp")).decode()
+
+        self.assertTrue(len(rows) > sdcard.TELEMETRY_BUFFER_SIZE)
+        self.assertEqual(len(rows.splitlines()), 101)
+
     def test_generating_path_short(self):
         expected = sdcard.get_logging_dir() + "/test"
         actual = sdcard.gen_path("test")
@@ -251,3 +324,47 @@ class TestSDLogic(unittest.TestCase):
                 expected, actual
             ),
         )
+
+    def test_interrupted_migration(self):
+        """Check that a migration resumed after a reset does not duplicate records."""
+        legacy_file = "test_failed_transmissions.csv"
+        queue_dir = "test_requeue"
+        with open(legacy_file, "w") as f_out:
+            for i in range(10):
+                f_out.write("record {0}\n".format(i))
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                sdcard._migrate_requeue_file(_ResetQueue(queue_dir, 4), legacy_file)
+            queue = FileQueue(queue_dir)
+            sdcard._migrate_requeue_file(queue, legacy_file)
+
+            records = []
+            while queue.peek() is not None:
+                records.append(queue.peek())
+                queue.ack()
+            expected = ["record {0}".format(i) for i in range(10)]
+            self.assertEqual(
+                records,
+                expected,
+                "Records were not migrated once each.\nExpected {0}, got {1}".format(
+                    expected, records
+                ),
+            )
+            self.assertFalse(
+                legacy_file + sdcard.MIGRATING_SUFFIX in os.listdir(),
+                "Migrated file was not removed",
+            )
+        finally:
+            for path in (
+                legacy_file,
+                legacy_file + sdcard.MIGRATING_SUFFIX,
+                legacy_file + sdcard.MIGRATING_SUFFIX + sdcard.POSITION_SUFFIX,
+            ):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            try:
+                helpers.deep_rmdir(queue_dir)
+            except OSError:
+                pass
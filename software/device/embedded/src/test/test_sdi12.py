@@ -108,13 +108,68 @@ class TestSDI(unittest.TestCase):
             ),
         )
 
+    def test_requesting_concurrent_measurement(self):
+        """Requires a water level sensor."""
+
+        sensor = self.gen_sensor_data(**{"address": "1", "bootup_time": 5})
+
+        wake_time = sdi12_driver.turn_on_sensors(self.sdi)
+
+        response = self.async_test_helper(
+            sdi12_driver.measure(
+                sensor, self.sdi, wake_time, False, "water level 1", concurrent=True
+            )
+        )
+
+        # Turn off sensors after running
+        sdi12_driver.turn_off_sensors(self.sdi)
+
+        # atttnn: two digits for the number of values
+        expected = "100203\r\n"
+
+        self.assertEqual(
+            response,
+            expected,
+            "Did not receive correct response from sensor.\nExpected {0}, got {1}".format(
+                expected, response
+            ),
+        )
+
+    def test_service_request(self):
+        """Waiting for a measurement ends no later than the advertised measure time."""
+        sensor = self.gen_sensor_data(**{"address": "1", "bootup_time": 5})
+
+        wake_time = sdi12_driver.turn_on_sensors(self.sdi)
+
+        response = self.async_test_helper(
+            sdi12_driver.measure(sensor, self.sdi, wake_time, False, "water level 1")
+        )
+        measure_time = int(response[1:4])
+        elapsed = self.async_test_helper(
+            sdi12_driver._wait_for_service_request(self.sdi, "1", measure_time)
+        )
+
+        # Turn off sensors after running
+        sdi12_driver.turn_off_sensors(self.sdi)
+
+        self.assertTrue(
+            elapsed <= 1000 * measure_time + 100,
+            "Waited {0} ms for a {1} s measurement".format(elapsed, measure_time),
+        )
+
     def test_data_reading(self):
         """Test reading data from sdi12 sensor 1"""
         sensor = self.gen_sensor_data(**{"address": "1", "bootup_time": 5})
+        sensor["readings"] = [
+            {"reading": reading, "index": index, "multiplier": 1, "offset": 0}
+            for index, reading in enumerate(
+                ("pressure", "temperature", "voltage"), start=1
+            )
+        ]
+        plan = sdi12_driver.compile_read_plan(sensor)
 
         wake_time = sdi12_driver.turn_on_sensors(self.sdi)
 
-        # run with max index equal to 3 as the sensor being used returns 3 values
         self.async_test_helper(
             sdi12_driver.measure(sensor, self.sdi, wake_time, False, "water level 1")
         )
@@ -122,7 +177,9 @@ class TestSDI(unittest.TestCase):
         time.sleep(4)
         # read data
         response = self.async_test_helper(
-            sdi12_driver.deep_data_reading(sensor, self.sdi, 3, wake_time)
+            sdi12_driver._read_data(
+                plan, sensor, self.sdi, plan["max_index"], wake_time, []
+            )
         )
 
         # Turn off sensors after running
@@ -150,3 +207,39 @@ class TestSDI(unittest.TestCase):
                 response[2]
             ),
         )  # voltage
+
+    def test_read_plan(self):
+        """Test parsing data responses into the reading slots of a read plan"""
+        sensor = self.gen_sensor_data(**{"address": "1"})
+        sensor["readings"] = [
+            {"reading": "temperature", "index": 2, "multiplier": 1, "offset": 0},
+            {"reading": "level", "index": 4, "multiplier": 2, "offset": -1},
+            {"reading": "level_raw", "index": 4, "multiplier": 1, "offset": 0},
+        ]
+        plan = sdi12_driver.read_plan(sensor)
+
+        self.assertIs(plan, sdi12_driver.read_plan(sensor))
+        self.assertEqual(plan["max_index"], 4)
+        self.assertEqual(plan["data_cmds"][1], "1D1!")
+
+        values = [None] * 3
+        count = sdi12_driver._parse_into_slots("1+1.5-12.25+3\r\n", plan, 0, values)
+        self.assertEqual(count, 3)
+        self.assertEqual(values, [-12.25, None, None])
+
+        count = sdi12_driver._parse_into_slots("1+0.5\r\n", plan, 3, values)
+        self.assertEqual(count, 1)
+        self.assertEqual(values, [-12.25, 0.0, 0.5])
+
+        # Only pages holding values 2 or 4 need to be read
+        self.assertTrue(sdi12_driver._page_needed(plan, 0, 2))
+        self.assertFalse(sdi12_driver._page_needed(plan, 2, 1))
+        self.assertTrue(sdi12_driver._page_needed(plan, 3, 3))
+
+    def test_sensor_model(self):
+        """Test getting the vendor and model from a sensor's identification"""
+        self.assertEqual(
+            sdi12_driver._sensor_model("13METER   TER12 1002.0"), "METER TER12"
+        )
+        self.assertIsNone(sdi12_driver._sensor_model("13METER"))
+        self.assertIsNone(sdi12_driver._sensor_model(None))
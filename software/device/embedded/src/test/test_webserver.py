@@ -16,14 +16,19 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import gc
+import os
 import unittest
 from lib.tinyweb import webserver
 from services.restapi.monitor import Monitor
 from services.restapi.sdi12 import Rename, Delete
+from services.restapi.history import History
 from test.test_tinyweb import mockReader, mockWriter, HDRE, HDR, run_coro
 import json
 from drivers import sdi12
+from drivers import sdcard
 from services import config
+from util import helpers
+from util.time import isoformat
 
 try:
     import uasyncio as asyncio
@@ -58,6 +63,19 @@ class TestResourceAsync:
         return '{"data":"yep"}'
 
 
+class TestResourceCsv:
+    """
+    Class that streams a response with a content type other than JSON.
+    """
+
+    def gen(self):
+        yield "a,b\n"
+        yield "1,2\n"
+
+    def get(self, data):
+        return self.gen(), 200, "text/csv"
+
+
 class TinyWebTests(unittest.TestCase):
     """
     These tests test the additional functionality added to the tinyweb library (namely coroutine support to resources)
@@ -69,6 +87,7 @@ class TinyWebTests(unittest.TestCase):
         self.server.add_resource(TestResourceSync, "/resource_sync")
         self.server.add_resource(TestResourceSyncStatic, "/resource_sync_static")
         self.server.add_resource(TestResourceAsync, "/resource_async")
+        self.server.add_resource(TestResourceCsv, "/resource_csv")
 
     def resource_test_helper(self, url):
         rdr = mockReader(["GET {0} HTTP/1.0\r\n".format(url), HDRE])
@@ -96,6 +115,14 @@ class TinyWebTests(unittest.TestCase):
     def test_resource_sync_async(self):
         self.resource_test_helper("/resource_async")
 
+    def test_resource_content_type(self):
+        rdr = mockReader(["GET /resource_csv HTTP/1.0\r\n", HDRE])
+        wrt = mockWriter()
+        run_coro(self.server._handler(rdr, wrt))
+        self.assertTrue("Content-Type: text/csv\r\n" in wrt.history[0])
+        self.assertTrue("Transfer-Encoding: chunked\r\n" in wrt.history[0])
+        self.assertEqual(wrt.history[1:4], ["4\r\n", "a,b\n", "\r\n"])
+
 
 class MonitorTests(unittest.TestCase):
     """
@@ -344,3 +371,80 @@ class DeleteTests(unittest.TestCase):
         print("received " + wrt.history[1])
         self.assertTrue("message" in resp)
         self.assertFalse("water_sensor" in self.device_config["sdi12_sensors"])
+
+
+class HistoryTests(unittest.TestCase):
+    """
+    Test the data history, saved to the SD card.
+    """
+
+    def setUp(self):
+        sdcard.setup()
+        # Every 10 minutes over a day
+        for i in range(144):
+            sdcard.save_telemetry(
+                {"Sensor 1": i, "Sensor 2": -i, "DateTime": 123456 + 600 * i}
+            )
+
+    def tearDown(self):
+        try:
+            helpers.deep_rmdir("sd/daily")
+        except OSError:
+            pass
+        for fname in (
+            sdcard.get_main_telemetry_file(),
+            sdcard.gen_path(sdcard.BINARY_FILE),
+        ):
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+        sdcard.teardown()
+        gc.collect()
+
+    def get(self, params: dict):
+        response = History().get(params)
+        self.assertEqual(response[1], 200)
+        return "".join(response[0])
+
+    def test_range(self):
+        page = json.loads(
+            self.get(
+                {
+                    "from": isoformat(123456 + 600 * 10),
+                    "to": isoformat(123456 + 600 * 19),
+                    "sensor": "Sensor 2",
+                }
+            )
+        )
+        expected = [
+            ["Sensor 2", isoformat(123456 + 600 * i), -float(i)] for i in range(10, 20)
+        ]
+        self.assertEqual(page["readings"], expected)
+        self.assertIsNone(page["next"])
+
+    def test_pages(self):
+        """Pages follow each other without gaps, even within a time."""
+        readings = []
+        params = {"limit": "7"}
+        for _ in range(50):
+            page = json.loads(self.get(params))
+            self.assertTrue(len(page["readings"]) <= 7)
+            readings.extend(page["readings"])
+            if page["next"] is None:
+                break
+            params["cursor"] = page["next"]
+        self.assertEqual(len(readings), 288)
+        self.assertEqual(len(set(tuple(reading) for reading in readings)), 288)
+
+    def test_csv(self):
+        lines = self.get(
+            {"to": isoformat(123456 + 600 * 2), "format": "csv", "sensor": "Sensor 1"}
+        ).splitlines()
+        self.assertEqual(lines[0], sdcard.HEADER_STR)
+        self.assertEqual(lines[1], "Sensor 1,{0},0.0".format(isoformat(123456)))
+        self.assertEqual(len(lines), 4)
+
+    def test_invalid(self):
+        response = History().get({"from": "yesterday"})
+        self.assertEqual(response[1], 400)
@@ -0,0 +1,156 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Incremental parser for AT command responses
+
+Data read from the modem is fed to the parser in whatever chunks the UART
+delivers. Only the unterminated tail of the previous chunk is kept between
+calls, and each completed line is decoded, stripped and classified exactly
+once, so the cost of parsing is linear in the length of the response.
+
+Lines are classified as:
+- a Final Result Code (`OK`, `ERROR` or `+CME ERROR: <err>`), which completes
+  the response to the current command;
+- an Unsolicited Result Code (URC) with a registered prefix, which is passed
+  to its callback and left out of the response;
+- anything else (command echo, information text), which is added to the
+  response.
+"""
+
+import logging
+
+log = logging.getLogger("atparser")
+# Enable the following to set a log level specific to this module:
+# log.setLevel(logging.DEBUG)
+
+RESPONSE_OK = "OK"
+RESPONSE_ERROR = "ERROR"
+RESPONSE_CME_ERROR = "+CME ERROR"
+
+
+class ATParser:
+    """
+    Line-oriented parser for the responses of one AT command at a time, with
+    dispatch of Unsolicited Result Codes to callbacks.
+    """
+
+    def __init__(self):
+        self._partial = b""
+        self._lines = []
+        self._command = None
+        # URC prefix (e.g. "+UUMQTTC") -> callback(prefix, parameters)
+        self._urc_handlers = {}
+        self.final = None
+
+    def register_urc(self, prefix: str, callback):
+        """
+        Register a callback for an Unsolicited Result Code.
+
+        Args:
+            prefix (str): URC name including the `+`, e.g. "+CEREG".
+            callback: called as `callback(prefix, parameters)` where
+                `parameters` is the text following "<prefix>: ".
+        """
+        self._urc_handlers[prefix] = callback
+
+    def begin(self, command: str = None):
+        """
+        Start collecting the response to a new command.
+
+        Args:
+            command (str): the command sent, without the `AT` prefix. An
+                information text response to this command, e.g. `+CEREG: 0,1`
+                to `+CEREG?`, is kept in the response rather than being
+                treated as a URC with the same name.
+        """
+        self._lines = []
+        self.final = None
+        self._command = None
+        if command:
+            for terminator in ("=", "?"):
+                command = command.split(terminator)[0]
+            self._command = command
+
+    def feed(self, data: bytes) -> bool:
+        """
+        Parse a chunk of data read from the modem.
+
+        Args:
+            data (bytes): the chunk, which may end part way through a line.
+
+        Returns:
+            bool: True once a Final Result Code has been received.
+        """
+        if data:
+            lines = (self._partial + data).split(b"\n")
+            self._partial = lines.pop()
+            for line in lines:
+                self._feed_line(line)
+        return self.final is not None
+
+    def flush(self) -> bool:
+        """Parse any unterminated data left over from previous chunks."""
+        if self._partial:
+            line, self._partial = self._partial, b""
+            self._feed_line(line)
+        return self.final is not None
+
+    def response(self) -> str:
+        """
+        Returns:
+            str: non-empty response lines joined with two spaces, e.g.
+            `AT+CSQ  +CSQ: 10,99  OK`.
+        """
+        return "  ".join(self._lines)
+
+    def lines(self) -> list:
+        """
+        Returns:
+            list: non-empty response lines received since begin().
+        """
+        return self._lines
+
+    def _feed_line(self, line: bytes):
+        try:
+            text = line.decode("utf-8").strip()
+        except UnicodeError:
+            log.error("Unable to decode modem response: {0}".format(repr(line)))
+            return
+        # Skip the empty lines between text string and response code
+        if not text:
+            return
+
+        name = text.split(":")[0]
+        if name in self._urc_handlers and name != self._command:
+            try:
+                self._urc_handlers[name](name, text[len(name) + 1 :].strip())
+            except Exception as exc:
+                log.error("URC handler for {0} failed: {1}".format(name, exc))
+            return
+
+        if self.final is not None:
+            # Nothing is expected after the Final Result Code
+            log.warning("Unexpected modem output: {0}".format(text))
+            return
+
+        self._lines.append(text)
+        if (
+            text == RESPONSE_OK
+            or text == RESPONSE_ERROR
+            or text.startswith(RESPONSE_CME_ERROR)
+        ):
+            self.final = text
@@ -0,0 +1,157 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Streaming gzip compression, where the firmware provides it
+
+MicroPython 1.21 and later compress with deflate.DeflateIO when the port is
+built with compression (MICROPY_PY_DEFLATE_COMPRESS, as the ESP32 port is).
+Earlier firmware, including v1.14, can only decompress (uzlib), so
+available() is False there and callers keep their data uncompressed. Under
+CPython, e.g. in the simulator, zlib is used.
+"""
+
+try:
+    import deflate
+except ImportError:
+    deflate = None
+
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+GZIP_SUFFIX = ".gz"
+
+# Base-2 logarithm of the compression window (bytes): the RAM used while
+# compressing, traded against the compression of repeated text
+DEFAULT_WBITS = 10
+
+
+def available() -> bool:
+    """
+    Returns:
+        bool: whether gzip compression is available
+    """
+    return deflate is not None or hasattr(zlib, "compressobj")
+
+
+class GzipWriter:
+    """
+    Compresses the data written to it into a stream in gzip format.
+
+    Args:
+        stream: binary stream to write the compressed data to, e.g. a file
+            opened "wb". It is left open by close().
+        wbits (int): base-2 logarithm of the compression window (bytes)
+
+    Raises:
+        NotImplementedError: if gzip compression is not available
+    """
+
+    def __init__(self, stream, wbits: int = DEFAULT_WBITS):
+        self.stream = stream
+        self._deflate = None
+        self._compressor = None
+        if deflate is not None:
+            self._deflate = deflate.DeflateIO(stream, deflate.GZIP, wbits, False)
+        elif hasattr(zlib, "compressobj"):
+            # zlib's smallest window is 512 bytes; 16 + wbits selects gzip
+            self._compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + max(wbits, 9))
+        else:
+            raise NotImplementedError("gzip compression is not available")
+
+    def write(self, data) -> int:
+        if self._deflate is not None:
+            return self._deflate.write(data)
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self.stream.write(compressed)
+        return len(data)
+
+    def close(self):
+        """Write the rest of the compressed data and the gzip trailer."""
+        if self._deflate is not None:
+            self._deflate.close()
+        else:
+            self.stream.write(self._compressor.flush())
+
+
+class _Sink:
+    """Collects the data written to it, for gzip_chunks()."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data) -> int:
+        self.data.extend(data)
+        return len(data)
+
+    def take(self) -> bytes:
+        data = bytes(self.data)
+        self.data = bytearray()
+        return data
+
+
+def gzip_chunks(blocks, wbits: int = DEFAULT_WBITS):
+    """
+    Compress blocks of data, generating the compressed data in gzip format
+    as it is produced. Only the compressor's window and the output of one
+    block are held in memory, so data of any size can be streamed, e.g. as
+    an HTTP response.
+
+    Args:
+        blocks: iterable of the data to compress, e.g. buffers read from a
+            file. Each block is compressed before the next is taken.
+        wbits (int): base-2 logarithm of the compression window (bytes)
+
+    Yields:
+        bytes: the next compressed data
+
+    Raises:
+        NotImplementedError: if gzip compression is not available
+    """
+    sink = _Sink()
+    writer = GzipWriter(sink, wbits)
+    for block in blocks:
+        writer.write(block)
+        if sink.data:
+            yield sink.take()
+    writer.close()
+    if sink.data:
+        yield sink.take()
+
+
+def compress_file(source: str, destination: str, buffer_size: int = 512):
+    """
+    Compress a file to a gzip file, a buffer at a time.
+
+    Args:
+        source (str): path of the file to compress
+        destination (str): path of the gzip file, replaced if it exists
+        buffer_size (int): bytes read from source at a time
+    """
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(source, "rb") as f_in:
+        with open(destination, "wb") as f_out:
+            writer = GzipWriter(f_out)
+            while True:
+                size = f_in.readinto(buffer)
+                if not size:
+                    break
+                writer.write(view[:size])
+            writer.close()
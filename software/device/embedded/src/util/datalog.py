@@ -0,0 +1,259 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Compact binary datalog of fixed-size records
+
+The file starts with a header of HEADER_SIZE bytes, little-endian:
+
+- the magic bytes MAGIC, the format VERSION (uint8) and RECORD_SIZE (uint8)
+- the number of reading names (uint16)
+- the Unix time of the device's epoch (uint32), e.g. 946684800 for the
+  ESP32's epoch of 2000-01-01, so that times can be converted on a host
+- the reading name table: for each name its length (uint8) and its UTF-8
+  bytes. The index of a name in the table is its reading id.
+- zero padding
+
+followed by one record per reading, in the order appended: the time in
+seconds since the device's epoch (uint32), the reading id (uint16) and the
+value (float32). Record i is at byte HEADER_SIZE + i * RECORD_SIZE, so any
+record can be read with a single seek.
+
+A record only partially appended when the device reset is overwritten by
+the next append, and a datalog left shorter than its header by a reset
+while it was created is created again. Use tools/datalog_to_csv.py to convert a datalog to the
+CSV layout of the SD card's datalog.csv.
+"""
+
+import errno
+import os
+import struct
+import time
+import logging
+
+log = logging.getLogger("datalog")
+# Enable the following to set a log level specific to this module:
+# log.setLevel(logging.DEBUG)
+
+MAGIC = b"DLOG"
+VERSION = 1
+HEADER_SIZE = 512
+HEADER_FORMAT = "<4sBBHI"
+RECORD_FORMAT = "<IHf"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# Records read from the file at a time by records()
+READ_RECORDS = 32
+
+# Unix time of 2000-01-01T00:00:00, the epoch of MicroPython on the ESP32
+EPOCH_2000 = 946684800
+
+
+def device_epoch() -> int:
+    """
+    Returns:
+        int: Unix time of the epoch of time.time() on this device
+    """
+    return EPOCH_2000 if time.localtime(0)[0] == 2000 else 0
+
+
+class BinaryDatalog:
+    """
+    A binary datalog file.
+
+    Args:
+        path (str): path of the datalog, created by the first append() if
+            it does not exist
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.epoch = None
+        # Reading names by reading id, loaded from the header on first use
+        self.names = None
+        self._ids = {}
+        self._buffer = bytearray(RECORD_SIZE * 16)
+
+    def _load_header(self, f_ptr):
+        f_ptr.seek(0)
+        header = f_ptr.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError("{0} has no datalog header".format(self.path))
+        magic, version, record_size, count, epoch = struct.unpack_from(
+            HEADER_FORMAT, header
+        )
+        if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+            raise ValueError(
+                "{0} is not a version {1} datalog".format(self.path, VERSION)
+            )
+        offset = struct.calcsize(HEADER_FORMAT)
+        names = []
+        for _ in range(count):
+            length = header[offset]
+            names.append(bytes(header[offset + 1 : offset + 1 + length]).decode())
+            offset += 1 + length
+        self.epoch = epoch
+        self.names = names
+        self._ids = {name: i for i, name in enumerate(names)}
+
+    def _header(self) -> bytearray:
+        header = bytearray(HEADER_SIZE)
+        struct.pack_into(
+            HEADER_FORMAT,
+            header,
+            0,
+            MAGIC,
+            VERSION,
+            RECORD_SIZE,
+            len(self.names),
+            self.epoch,
+        )
+        offset = struct.calcsize(HEADER_FORMAT)
+        for name in self.names:
+            encoded = name.encode()
+            if len(encoded) > 255 or offset + 1 + len(encoded) > HEADER_SIZE:
+                raise ValueError("No room in the datalog header for {0}".format(name))
+            header[offset] = len(encoded)
+            header[offset + 1 : offset + 1 + len(encoded)] = encoded
+            offset += 1 + len(encoded)
+        return header
+
+    def _open(self, mode: str):
+        """
+        Open the datalog and load its header. For writing, it is created if
+        missing, or if it is shorter than its header (a reset while it was
+        being created), which loses no records. Any other error is raised,
+        so that an existing datalog is never replaced.
+        """
+        if mode != "rb" and self._size() < HEADER_SIZE:
+            f_ptr = open(self.path, "w+b")
+            self.epoch = device_epoch()
+            self.names = []
+            self._ids = {}
+            f_ptr.write(self._header())
+            return f_ptr
+        f_ptr = open(self.path, mode)
+        try:
+            if self.names is None:
+                self._load_header(f_ptr)
+        except Exception:
+            f_ptr.close()
+            raise
+        return f_ptr
+
+    def _size(self) -> int:
+        """
+        Returns:
+            int: the size of the datalog (bytes), 0 if it is missing
+        """
+        try:
+            return os.stat(self.path)[6]
+        except OSError as exc:
+            if exc.args[0] != errno.ENOENT:
+                raise
+            return 0
+
+    def _count(self, f_ptr) -> int:
+        f_ptr.seek(0, 2)
+        return (f_ptr.tell() - HEADER_SIZE) // RECORD_SIZE
+
+    def __len__(self) -> int:
+        with self._open("rb") as f_ptr:
+            return self._count(f_ptr)
+
+    def append(self, epoch: int, readings: dict) -> int:
+        """
+        Append a record for each numeric reading, with a single write.
+        Reading names not yet in the name table are added to it.
+
+        Args:
+            epoch (int): time of the readings (s since the device's epoch)
+            readings (dict): reading name -> value
+
+        Returns:
+            int: the number of records appended
+
+        Raises:
+            ValueError: if the name table is full
+        """
+        with self._open("r+b") as f_ptr:
+            new_names = [
+                name
+                for name, value in readings.items()
+                if name not in self._ids and isinstance(value, (int, float))
+            ]
+            if new_names:
+                for name in new_names:
+                    self._ids[name] = len(self.names)
+                    self.names.append(name)
+                try:
+                    header = self._header()
+                except ValueError:
+                    for name in new_names:
+                        del self._ids[name]
+                    del self.names[-len(new_names) :]
+                    raise
+                f_ptr.seek(0)
+                f_ptr.write(header)
+
+            if len(self._buffer) < RECORD_SIZE * len(readings):
+                self._buffer = bytearray(RECORD_SIZE * len(readings))
+            count = 0
+            for name, value in readings.items():
+                if not isinstance(value, (int, float)):
+                    log.debug("Not saving non-numeric reading %s: %s", name, value)
+                    continue
+                struct.pack_into(
+                    RECORD_FORMAT,
+                    self._buffer,
+                    count * RECORD_SIZE,
+                    epoch,
+                    self._ids[name],
+                    value,
+                )
+                count += 1
+
+            # Overwrite any record left partially written by a reset
+            f_ptr.seek(HEADER_SIZE + self._count(f_ptr) * RECORD_SIZE)
+            f_ptr.write(memoryview(self._buffer)[: count * RECORD_SIZE])
+        return count
+
+    def records(self, start: int = 0, stop: int = None):
+        """
+        Generate the records from index start up to, not including, stop,
+        reading READ_RECORDS records from the file at a time.
+
+        Yields:
+            tuple: (time (s since the device's epoch), reading name, value)
+        """
+        buffer = bytearray(RECORD_SIZE * READ_RECORDS)
+        view = memoryview(buffer)
+        with self._open("rb") as f_ptr:
+            count = self._count(f_ptr)
+            stop = count if stop is None else min(stop, count)
+            index = max(start, 0)
+            f_ptr.seek(HEADER_SIZE + index * RECORD_SIZE)
+            while index < stop:
+                size = min(READ_RECORDS, stop - index) * RECORD_SIZE
+                read = f_ptr.readinto(view[:size]) // RECORD_SIZE
+                if not read:
+                    break
+                for i in range(read):
+                    epoch, reading_id, value = struct.unpack_from(
+                        RECORD_FORMAT, buffer, i * RECORD_SIZE
+                    )
+                    yield epoch, self.names[reading_id], value
+                index += read
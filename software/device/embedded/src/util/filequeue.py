@@ -0,0 +1,368 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Segmented, append-only first-in first-out queue of text records
+
+Records are appended, newline terminated, to numbered segment files in a
+queue directory. A small pointer file holds the read position (head segment
+and byte offset), the segment currently being appended to, and the number of
+queued records and bytes. Enqueue, peek and ack each touch at most one
+segment file and the pointer file, so their cost does not depend on the
+length of the queue.
+
+Crash behaviour:
+- The pointer file is replaced by writing a temporary copy and renaming it,
+  so a reset leaves either the old or the new pointer on the filesystem.
+- A record is only acknowledged (the head advanced) after the caller has
+  finished with it, so a reset between peek and ack re-delivers that one
+  record.
+- A record only partially appended when the device reset is terminated with
+  TORN_MARKER when the queue is next opened and is skipped by peek().
+"""
+
+import os
+import logging
+
+log = logging.getLogger("filequeue")
+# Enable the following to set a log level specific to this module:
+# log.setLevel(logging.DEBUG)
+
+SEGMENT_PREFIX = "seg_"
+SEGMENT_SUFFIX = ".dat"
+POINTER_FILE = "queue.ptr"
+DEFAULT_SEGMENT_SIZE = 65536  # bytes
+
+# Appended to a record found without its newline terminator on open. Records
+# ending with the marker are discarded rather than returned by peek().
+TORN_MARKER = b"\x15"  # ASCII NAK
+
+
+class FileQueue:
+    """
+    A persistent FIFO queue of single-line text records.
+
+    Args:
+        directory (str): directory holding the segment and pointer files.
+            Created if it does not exist.
+        segment_size (int): size in bytes after which appends roll over to a
+            new segment file. Fully read segments are deleted.
+    """
+
+    def __init__(self, directory: str, segment_size: int = DEFAULT_SEGMENT_SIZE):
+        self.directory = directory.rstrip("/")
+        self.segment_size = segment_size
+        self.head_seg = 0
+        self.head_off = 0
+        self.tail_seg = 0
+        self.count = 0
+        self.nbytes = 0
+        # (length, counted) of each line returned or skipped by the last
+        # peek() or peek_many(), lengths including terminators
+        self._peeked = []
+
+        try:
+            os.mkdir(self.directory)
+        except OSError:
+            # Already exists
+            pass
+
+        self._load()
+        self._repair_tail()
+
+    def __len__(self) -> int:
+        """
+        Number of queued records. May under-count by one after a reset part
+        way through enqueue().
+        """
+        return self.count
+
+    def size(self) -> int:
+        """
+        Returns:
+            int: number of bytes held by queued records.
+        """
+        return self.nbytes
+
+    def enqueue(self, record: str):
+        """
+        Append a record to the tail of the queue.
+
+        Args:
+            record (str): the record, which must not contain a newline.
+
+        Raises:
+            ValueError: if the record contains a newline.
+        """
+        if "\n" in record:
+            raise ValueError("Queue records must not contain a newline")
+        data = record.encode("utf-8") + b"\n"
+
+        tail_size = self._segment_size(self.tail_seg)
+        if tail_size > 0 and tail_size + len(data) > self.segment_size:
+            # Roll over to a new segment. Persist the new tail first: a reset
+            # before the append below leaves an empty (missing) segment.
+            self.tail_seg += 1
+            self._save()
+
+        with open(self._segment_path(self.tail_seg), "ab") as f_out:
+            f_out.write(data)
+
+        self.count += 1
+        self.nbytes += len(data)
+        self._save()
+
+    def peek(self) -> str or None:
+        """
+        Return the record at the head of the queue without removing it.
+
+        Returns:
+            str: the oldest record, or None if the queue is empty.
+        """
+        while True:
+            line = self._read_head()
+            if line is None:
+                self._peeked = []
+                return None
+            if line.endswith(TORN_MARKER + b"\n"):
+                self._warn_torn()
+                # Torn records were never counted, see _repair_tail()
+                self._advance(len(line), 0, 0)
+                continue
+            self._peeked = [(len(line), True)]
+            return line[:-1].decode("utf-8")
+
+    def peek_many(self, max_count: int, max_bytes: int) -> list:
+        """
+        Return records from the head of the queue without removing them.
+        Only records in the head segment are returned.
+
+        Args:
+            max_count (int): maximum number of records to return.
+            max_bytes (int): maximum total length of the records returned,
+                including a terminator per record. The first record is
+                returned regardless of its length.
+
+        Returns:
+            list: the oldest records, oldest first; empty if the queue is
+            empty.
+        """
+        first = self.peek()
+        if first is None:
+            return []
+        records = [first]
+        nbytes = self._peeked[0][0]
+
+        with open(self._segment_path(self.head_seg), "rb") as f_in:
+            f_in.seek(self.head_off + nbytes)
+            while len(records) < max_count:
+                line = f_in.readline()
+                if not line.endswith(b"\n"):
+                    break
+                if line.endswith(TORN_MARKER + b"\n"):
+                    self._warn_torn()
+                    self._peeked.append((len(line), False))
+                    continue
+                if nbytes + len(line) > max_bytes:
+                    break
+                self._peeked.append((len(line), True))
+                records.append(line[:-1].decode("utf-8"))
+                nbytes += len(line)
+
+        return records
+
+    def ack(self, count: int = 1) -> bool:
+        """
+        Remove records from the head of the queue, i.e. records most
+        recently returned by peek() or peek_many().
+
+        Args:
+            count (int): number of records to remove, at most the number
+                returned by the last peek.
+
+        Returns:
+            bool: False if the queue was empty.
+        """
+        if not self._peeked and self.peek() is None:
+            return False
+        length = 0
+        records = 0
+        nbytes = 0
+        for line_length, counted in self._peeked:
+            if records == count:
+                break
+            length += line_length
+            if counted:
+                records += 1
+                nbytes += line_length
+        self._advance(length, records, nbytes)
+        self._peeked = []
+        return True
+
+    def _segment_path(self, segment: int) -> str:
+        return "{0}/{1}{2:06d}{3}".format(
+            self.directory, SEGMENT_PREFIX, segment, SEGMENT_SUFFIX
+        )
+
+    def _pointer_path(self) -> str:
+        return "{0}/{1}".format(self.directory, POINTER_FILE)
+
+    def _segment_size(self, segment: int) -> int:
+        try:
+            return os.stat(self._segment_path(segment))[6]
+        except OSError:
+            # A missing segment is an empty segment
+            return 0
+
+    def _read_head(self) -> bytes or None:
+        """
+        Read the complete line at the head position, moving on to the next
+        segment when the head segment has been read to the end.
+        """
+        while True:
+            try:
+                with open(self._segment_path(self.head_seg), "rb") as f_in:
+                    f_in.seek(self.head_off)
+                    line = f_in.readline()
+            except OSError:
+                line = b""
+            if line.endswith(b"\n"):
+                return line
+            if self.head_seg >= self.tail_seg:
+                return None
+            self._next_head_segment()
+
+    def _warn_torn(self):
+        log.warning(
+            "Discarding partially written record in {0}".format(
+                self._segment_path(self.head_seg)
+            )
+        )
+
+    def _advance(self, length: int, records: int, nbytes: int):
+        """
+        Move the head `length` bytes past `records` counted records holding
+        `nbytes` bytes, and persist it.
+        """
+        self.head_off += length
+        self.count = max(0, self.count - records)
+        self.nbytes = max(0, self.nbytes - nbytes)
+        if self.head_off >= self._segment_size(self.head_seg):
+            if self.head_seg == self.tail_seg:
+                # Queue drained: start appending to a fresh segment so the
+                # exhausted one can be deleted
+                self.tail_seg += 1
+            self._next_head_segment()
+        else:
+            self._save()
+
+    def _next_head_segment(self):
+        """Persist the head at the start of the next segment, then delete the old one."""
+        exhausted = self._segment_path(self.head_seg)
+        self.head_seg += 1
+        self.head_off = 0
+        self._save()
+        try:
+            os.remove(exhausted)
+        except OSError:
+            pass
+
+    def _save(self):
+        """Atomically replace the pointer file."""
+        path = self._pointer_path()
+        with open(path + ".tmp", "w") as f_out:
+            f_out.write(
+                "{0} {1} {2} {3} {4}\n".format(
+                    self.head_seg, self.head_off, self.tail_seg, self.count, self.nbytes
+                )
+            )
+        os.rename(path + ".tmp", path)
+
+    def _load(self):
+        """Restore the pointer file, rebuilding it from the segments if it is unusable."""
+        path = self._pointer_path()
+        for candidate in (path, path + ".tmp"):
+            try:
+                with open(candidate, "r") as f_in:
+                    fields = [int(field) for field in f_in.read().split()]
+                (
+                    self.head_seg,
+                    self.head_off,
+                    self.tail_seg,
+                    self.count,
+                    self.nbytes,
+                ) = fields
+                return
+            except OSError:
+                # Missing, try the next candidate
+                pass
+            except ValueError:
+                log.error("Corrupt queue pointer file {0}".format(candidate))
+
+        self._rebuild()
+
+    def _rebuild(self):
+        """
+        Recreate the pointers from the segment files in the directory. The
+        head is placed at the start of the oldest segment, so records already
+        acknowledged in that segment will be delivered again.
+        """
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    segments.append(
+                        int(name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+                    )
+                except ValueError:
+                    pass
+        if segments:
+            log.warning(
+                "Rebuilding queue pointers from {0} segment(s) in {1}".format(
+                    len(segments), self.directory
+                )
+            )
+            self.head_seg = min(segments)
+            self.tail_seg = max(segments)
+            self.head_off = 0
+            self.count = 0
+            self.nbytes = 0
+            for segment in range(self.head_seg, self.tail_seg + 1):
+                try:
+                    with open(self._segment_path(segment), "rb") as f_in:
+                        for line in f_in:
+                            self.count += 1
+                            self.nbytes += len(line)
+                except OSError:
+                    pass
+        self._save()
+
+    def _repair_tail(self):
+        """Terminate a record left without its newline by a reset during enqueue()."""
+        tail_size = self._segment_size(self.tail_seg)
+        if tail_size == 0:
+            return
+        with open(self._segment_path(self.tail_seg), "rb") as f_in:
+            f_in.seek(tail_size - 1)
+            last = f_in.read(1)
+        if last != b"\n":
+            log.warning(
+                "Marking partially written record in {0}".format(
+                    self._segment_path(self.tail_seg)
+                )
+            )
+            with open(self._segment_path(self.tail_seg), "ab") as f_out:
+                f_out.write(TORN_MARKER + b"\n")
@@ -0,0 +1,120 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Sparse hourly index of a day's datalog file
+
+The index of a daily file is a file of 24 little-endian uint32 slots, one
+per hour of the day, kept beside it with the suffix INDEX_SUFFIX. Slot h is
+the byte offset in the daily file of the first row saved in hour h, or
+UNSET if no row was saved in that hour. Rows are appended in time order, so
+the rows of hours first to last of a day lie between the offsets returned
+by span(), and a query only reads that part of the file.
+
+An index is only created with its daily file. A daily file without an
+index, e.g. one started before indexes were kept, is read whole.
+"""
+
+import struct
+
+INDEX_SUFFIX = ".idx"
+HOURS = 24
+SLOT_FORMAT = "<I"
+SLOT_SIZE = 4
+UNSET = 0xFFFFFFFF
+
+
+def index_path(daily_path: str) -> str:
+    """
+    Returns:
+        str: path of the index of a daily file, e.g. `datalog_2023-09-01.idx`
+        for `datalog_2023-09-01.csv`
+    """
+    return daily_path[: daily_path.rfind(".")] + INDEX_SUFFIX
+
+
+def update(path: str, hour: int, offset: int, create: bool = False) -> bool:
+    """
+    Set the slot of an hour if it is not already set.
+
+    Args:
+        path (str): path of the index file
+        hour (int): hour of the day, 0 to 23
+        offset (int): byte offset of the first row saved in the hour
+        create (bool): create the index if missing. Only create the index
+            of a new daily file, since earlier rows would not be indexed.
+
+    Returns:
+        bool: True if the slot was set, False if it was already set or
+        the index is missing
+    """
+    try:
+        f_ptr = open(path, "r+b")
+    except OSError:
+        if not create:
+            return False
+        f_ptr = open(path, "w+b")
+        f_ptr.write(b"\xff" * (HOURS * SLOT_SIZE))
+    with f_ptr:
+        f_ptr.seek(hour * SLOT_SIZE)
+        if f_ptr.read(SLOT_SIZE) != b"\xff\xff\xff\xff":
+            return False
+        f_ptr.seek(hour * SLOT_SIZE)
+        f_ptr.write(struct.pack(SLOT_FORMAT, offset))
+    return True
+
+
+def read(path: str) -> list or None:
+    """
+    Returns:
+        list: the offsets of each hour, UNSET for hours without rows, or
+        None if the index is missing or incomplete
+    """
+    try:
+        with open(path, "rb") as f_ptr:
+            data = f_ptr.read(HOURS * SLOT_SIZE)
+    except OSError:
+        return None
+    if len(data) != HOURS * SLOT_SIZE:
+        return None
+    return [
+        struct.unpack_from(SLOT_FORMAT, data, h * SLOT_SIZE)[0] for h in range(HOURS)
+    ]
+
+
+def span(offsets: list or None, first: int, last: int, size: int) -> tuple:
+    """
+    Args:
+        offsets (list): the index, as returned by read(), or None
+        first (int): first hour of the day to read
+        last (int): last hour of the day to read
+        size (int): size of the daily file (bytes)
+
+    Returns:
+        tuple: (start, stop) byte offsets of the part of the daily file
+        holding the rows of hours first to last
+    """
+    if offsets is None:
+        return 0, size
+    start = size
+    for offset in offsets[first : last + 1]:
+        if offset != UNSET:
+            start = min(start, offset)
+    stop = size
+    for offset in offsets[last + 1 :]:
+        if offset != UNSET:
+            stop = min(stop, offset)
+    return start, max(start, stop)
@@ -0,0 +1,204 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Rotation of the system log by size and by day
+
+The system log is appended to a single file, the current segment. Before
+the file is opened for a wake, rotate() archives the segment if it has
+reached a maximum size or was started on an earlier day, by renaming it to
+`system_<date>_<n>.log` in the archive directory, where <date> is the day
+the segment was started (the date of its first line) and <n> numbers the
+segments of that day. A new segment is started by the next write.
+
+The newest archive is kept uncompressed so that tail() can read it; older
+ones are compressed to `.log.gz` when compression is available (see
+util.compress). The oldest archives are deleted to keep the total size of
+the archives within a cap.
+"""
+
+import os
+import logging
+from util import compress
+from util import helpers
+
+log = logging.getLogger("logfile")
+# Enable the following to set a log level specific to this module:
+# log.setLevel(logging.DEBUG)
+
+ARCHIVE_PREFIX = "system_"
+ARCHIVE_SUFFIX = ".log"
+
+# Log lines start with the date, "yyyy-mm-dd"
+DATE_LENGTH = 10
+
+
+def segment_date(path: str) -> str or None:
+    """
+    Returns:
+        str: the date of the first line of a log file, "yyyy-mm-dd", or None
+        if the file is missing, empty or does not start with a date
+    """
+    try:
+        with open(path, "rb") as f_in:
+            start = f_in.read(DATE_LENGTH)
+    except OSError:
+        return None
+    if len(start) != DATE_LENGTH or start[4:5] != b"-" or start[7:8] != b"-":
+        return None
+    return start.decode()
+
+
+def list_archives(archive_dir: str) -> list:
+    """
+    Returns:
+        list: names of the log archives in archive_dir, oldest first
+    """
+    try:
+        names = os.listdir(archive_dir)
+    except OSError:
+        return []
+    return sorted(name for name in names if name.startswith(ARCHIVE_PREFIX))
+
+
+def rotate(
+    path: str,
+    archive_dir: str,
+    today: str,
+    max_size: int,
+    max_total: int,
+    compressed: bool = True,
+) -> str or None:
+    """
+    Archive the log file if it is at least max_size bytes or was started
+    before today. The log file must not be open.
+
+    Args:
+        path (str): path of the log file
+        archive_dir (str): directory of the archives, created if needed
+        today (str): the current date, "yyyy-mm-dd"
+        max_size (int): size at which the log is archived (bytes)
+        max_total (int): maximum total size of the archives (bytes)
+        compressed (bool): compress the archives other than the newest
+
+    Returns:
+        str: path of the new archive, or None if the log was not rotated
+    """
+    try:
+        size = os.stat(path)[6]
+    except OSError:
+        return None
+    started = segment_date(path)
+    if not size or (size < max_size and started in (today, None)):
+        return None
+
+    try:
+        os.mkdir(archive_dir)
+    except OSError:
+        # Already exists
+        pass
+    archives = list_archives(archive_dir)
+    prefix = ARCHIVE_PREFIX + (started or today) + "_"
+    number = _next_number(archives, prefix)
+    name = "{0}{1:03d}{2}".format(prefix, number, ARCHIVE_SUFFIX)
+    archive = helpers.join_path(archive_dir, name)
+    os.rename(path, archive)
+
+    if compressed and compress.available():
+        for i, older in enumerate(archives):
+            if older.endswith(ARCHIVE_SUFFIX):
+                older_path = helpers.join_path(archive_dir, older)
+                compress.compress_file(older_path, older_path + compress.GZIP_SUFFIX)
+                os.remove(older_path)
+                archives[i] = older + compress.GZIP_SUFFIX
+    archives.append(name)
+    _prune(archive_dir, archives, max_total)
+    return archive
+
+
+def _next_number(archives: list, prefix: str) -> int:
+    """
+    Returns:
+        int: one more than the highest number of the archives named with a
+        prefix, whether compressed or not, or 0 if there are none. Earlier
+        segments may have been pruned, so the archives are not counted.
+    """
+    number = 0
+    for name in archives:
+        if name.startswith(prefix):
+            try:
+                number = max(number, int(name[len(prefix) : len(prefix) + 3]) + 1)
+            except ValueError:
+                pass
+    return number
+
+
+def _prune(archive_dir: str, archives: list, max_total: int):
+    """Delete the oldest archives until the rest fit within max_total bytes."""
+    sizes = [
+        helpers.get_file_size(helpers.join_path(archive_dir, name)) for name in archives
+    ]
+    total = sum(sizes)
+    # The newest archive is kept regardless of its size
+    for name, size in zip(archives[:-1], sizes):
+        if total <= max_total:
+            break
+        log.info("Deleting log archive {0}".format(name))
+        os.remove(helpers.join_path(archive_dir, name))
+        total -= size
+
+
+def tail(path: str, archive_dir: str, nbytes: int) -> str:
+    """
+    Read the end of the log: the last nbytes bytes of the log file, preceded
+    by the end of the newest archive if the file is shorter and the archive
+    is uncompressed. Only the ends of the files are read.
+
+    Args:
+        path (str): path of the log file
+        archive_dir (str): directory of the archives
+        nbytes (int): maximum number of bytes to read
+
+    Returns:
+        str: the whole lines within the last nbytes bytes of the log
+    """
+    data, cut = _read_end(path, nbytes)
+    if not cut and len(data) < nbytes:
+        archives = list_archives(archive_dir)
+        if archives and archives[-1].endswith(ARCHIVE_SUFFIX):
+            archive = helpers.join_path(archive_dir, archives[-1])
+            older, cut = _read_end(archive, nbytes - len(data))
+            data = older + data
+    if cut:
+        # Skip the line cut by the start of the read
+        data = data[data.find(b"\n") + 1 :]
+    return data.decode()
+
+
+def _read_end(path: str, nbytes: int) -> tuple:
+    """
+    Returns:
+        tuple: (the last nbytes bytes of a file, whether the start of the
+        file was left out); empty if the file is missing
+    """
+    try:
+        with open(path, "rb") as f_in:
+            size = os.stat(path)[6]
+            if size > nbytes:
+                f_in.seek(size - nbytes)
+            return f_in.read(nbytes), size > nbytes
+    except OSError:
+        return b"", False
@@ -0,0 +1,197 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Profiler of the phases of a regular mode wake
+
+Each phase of a wake (reading the rain gauge, measuring, bringing up the
+modem, publishing, ...) is timed as one or more spans:
+
+    span = profiler.begin("sensors")
+    ...
+    profiler.end(span)
+
+Spans are recorded with time.ticks_ms() into buffers allocated once at
+import, so timing a phase does not allocate. The time of a phase is the
+time during which at least one of its spans was open, so concurrent spans,
+e.g. of sensors measuring at the same time, are not counted twice. The
+`boot` phase is the time from reset to start(), and `wake` the time from
+reset to finish(), called just before deep sleep.
+
+finish() adds the wake's phase times to a summary kept in RTC memory (see
+util.rtcmem): for each phase the time in the last wake it ran in, a
+rolling average and the maximum, and the lowest gc.mem_free() seen. report() returns the
+summary for the next telemetry message, from which the maxima are reset:
+
+    {"n": <wakes>, "mem": <lowest free memory (bytes)>,
+     "<phase>": [<last (ms)>, <average (ms)>, <maximum (ms)>], ...}
+"""
+
+import gc
+import time
+from array import array
+from util import rtcmem
+
+# RTC memory key of the summary
+RTCMEM_KEY = "prof"
+
+# Maximum number of spans recorded in a wake. Further spans are not timed.
+MAX_SPANS = 32
+
+# Weight of the last wake in the rolling average is 1 / AVERAGE_WEIGHT
+AVERAGE_WEIGHT = 8
+
+_names = [None] * MAX_SPANS
+_starts = array("i", [0] * MAX_SPANS)
+_ends = array("i", [0] * MAX_SPANS)
+_count = 0
+_started = 0
+# Lowest free memory seen in this wake, None if not available on the port
+_mem_low = None
+
+
+def _sample_memory():
+    global _mem_low
+    if hasattr(gc, "mem_free"):
+        free = gc.mem_free()
+        if _mem_low is None or free < _mem_low:
+            _mem_low = free
+
+
+def start():
+    """Start timing a wake, discarding any spans recorded so far."""
+    global _count, _started, _mem_low
+    _count = 0
+    _mem_low = None
+    _started = time.ticks_ms()
+    _sample_memory()
+
+
+def begin(name: str) -> int:
+    """
+    Open a span of a phase.
+
+    Args:
+        name (str): name of the phase
+
+    Returns:
+        int: the span, to pass to end(). -1 if the buffer is full.
+    """
+    global _count
+    if _count >= MAX_SPANS:
+        return -1
+    span = _count
+    _count += 1
+    _names[span] = name
+    _starts[span] = time.ticks_ms()
+    _ends[span] = _starts[span]
+    _sample_memory()
+    return span
+
+
+def end(span: int):
+    """
+    Close a span opened with begin().
+
+    Args:
+        span (int): the span returned by begin()
+    """
+    if span >= 0:
+        _ends[span] = time.ticks_ms()
+        _sample_memory()
+
+
+async def timed(phase: str, coro, *args, **kwargs):
+    """
+    Run a coroutine function as a span of a phase, e.g. in an asyn.Gatherable.
+
+    Args:
+        phase (str): name of the phase
+        coro: coroutine function to run with the remaining arguments
+
+    Returns:
+        the result of the coroutine
+    """
+    span = begin(phase)
+    try:
+        return await coro(*args, **kwargs)
+    finally:
+        end(span)
+
+
+def phase_times() -> dict:
+    """
+    Returns:
+        dict: phase name -> time (ms) in the spans recorded since start(),
+        with the `boot` phase.
+    """
+    times = {"boot": _started}
+    for name in set(_names[:_count]):
+        # Merge the phase's spans in start order, counting overlaps once
+        spans = sorted(
+            (time.ticks_diff(_starts[i], _started), time.ticks_diff(_ends[i], _started))
+            for i in range(_count)
+            if _names[i] == name
+        )
+        total = 0
+        covered = spans[0][0]
+        for span_start, span_end in spans:
+            span_start = max(span_start, covered)
+            if span_end > span_start:
+                total += span_end - span_start
+                covered = span_end
+        times[name] = total
+    return times
+
+
+def finish():
+    """Add the wake's phase times to the summary in RTC memory."""
+    _sample_memory()
+    times = phase_times()
+    times["wake"] = time.ticks_ms()
+
+    summary = rtcmem.get(RTCMEM_KEY) or {"n": 0, "mem": None}
+    summary["n"] += 1
+    if _mem_low is not None and (summary["mem"] is None or _mem_low < summary["mem"]):
+        summary["mem"] = _mem_low
+    for name, last in times.items():
+        if name in summary:
+            _, average, maximum = summary[name]
+            average += (last - average) // AVERAGE_WEIGHT
+            summary[name] = [last, average, max(last, maximum)]
+        else:
+            summary[name] = [last, last, last]
+    rtcmem.put(RTCMEM_KEY, summary)
+
+
+def report() -> dict:
+    """
+    Take the summary of the wakes since the last report, to be sent with a
+    telemetry message. The wake count, the maxima and the lowest free memory
+    then start again from the next wake; the averages are kept.
+
+    Returns:
+        dict: the summary, or None if no wake has been profiled
+    """
+    summary = rtcmem.get(RTCMEM_KEY)
+    if not summary:
+        return None
+    restarted = {"n": 0, "mem": None}
+    for name, value in summary.items():
+        if name not in restarted:
+            restarted[name] = [value[0], value[1], 0]
+    rtcmem.put(RTCMEM_KEY, restarted)
+    return summary
@@ -0,0 +1,113 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Small key-value store in ESP32 RTC memory
+
+RTC memory keeps its contents through deep sleep but not through a power
+loss or hard reset, making it suitable for state that saves work on the
+next wake but can be rebuilt when lost. All users share the one RTC memory
+buffer, so each keeps its state under its own key.
+
+Values must be JSON serialisable. The whole store is limited to the size of
+RTC user memory (2 KiB by default on the ESP32).
+"""
+
+import json
+import logging
+
+try:
+    from machine import RTC
+except ImportError:
+    # Not running on a MicroPython port with RTC memory
+    RTC = None
+
+log = logging.getLogger("rtcmem")
+# Enable the following to set a log level specific to this module:
+# log.setLevel(logging.DEBUG)
+
+# Decoded copy of the RTC memory contents, loaded on first use
+_store = None
+
+
+def _memory(data: bytes = None) -> bytes:
+    if RTC is None:
+        return b""
+    rtc = RTC()
+    if not hasattr(rtc, "memory"):
+        return b""
+    if data is None:
+        return rtc.memory()
+    rtc.memory(data)
+    return data
+
+
+def _load() -> dict:
+    global _store
+    if _store is None:
+        _store = {}
+        raw = _memory()
+        if raw:
+            try:
+                _store = json.loads(raw)
+            except ValueError:
+                log.warning("Discarding unreadable RTC memory contents")
+    return _store
+
+
+def get(key: str, default=None):
+    """
+    Args:
+        key (str): key the value was stored under.
+        default: returned if the key is not in the store.
+
+    Returns:
+        the stored value, or `default`.
+    """
+    return _load().get(key, default)
+
+
+def put(key: str, value):
+    """
+    Store a value, replacing any existing value for the key. If the store
+    would no longer fit in RTC memory, the error is logged and the existing
+    value, if any, is kept.
+
+    Args:
+        key (str): key to store the value under.
+        value: JSON serialisable value.
+    """
+    store = _load()
+    new = key not in store
+    previous = store.get(key)
+    store[key] = value
+    try:
+        _memory(json.dumps(store).encode("utf-8"))
+    except ValueError as exc:
+        # RTC memory full. Restore the store to what is in RTC memory, so
+        # that other keys can still be stored.
+        if new:
+            del store[key]
+        else:
+            store[key] = previous
+        log.error("Unable to store {0} in RTC memory: {1}".format(key, exc))
+
+
+def clear():
+    """Remove all values from the store."""
+    global _store
+    _store = {}
+    _memory(b"")
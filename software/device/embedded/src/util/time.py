@@ -41,3 +41,23 @@ def isoformat(timetuple, sep="T"):
             len(timetuple)
         )
     return time_str
+
+
+def parse_isoformat(time_str: str) -> int:
+    """
+    Return the time in seconds since the epoch represented by a string in
+    the format produced by isoformat(), i.e. `YYYY-MM-DDTHH:MM:SS`.
+
+    Args:
+        time_str (str): ISO 8601 date and time, without a time zone
+
+    Raises:
+        ValueError: if the string is not in the expected format
+    """
+    try:
+        date_str, time_of_day = time_str[:10], time_str[11:19]
+        year, month, day = (int(field) for field in date_str.split("-"))
+        hour, minute, second = (int(field) for field in time_of_day.split(":"))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid ISO 8601 time: {0}".format(time_str))
+    return int(time.mktime((year, month, day, hour, minute, second, 0, 0, 0)))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Convert a binary datalog from the SD card to CSV
+
+Writes the records of a binary datalog (datalog.bin, see
+src/util/datalog.py) in the layout of the SD card's datalog.csv:
+
+    Sensor,Datetime,Data
+    flow,2023-09-01T10:00:00,0.125
+
+Values are stored as 32-bit floats, and written with 7 significant digits.
+
+Run from software/device/embedded:
+
+    python3 tools/datalog_to_csv.py /media/sd/datalog.bin datalog.csv
+"""
+
+import argparse
+import datetime
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+from util import datalog  # noqa: E402
+
+HEADER_STR = "Sensor,Datetime,Data"
+
+
+def convert(path: str, out=sys.stdout) -> int:
+    """
+    Returns:
+        int: the number of records written
+    """
+    log = datalog.BinaryDatalog(path)
+    out.write(HEADER_STR + "\n")
+    count = 0
+    for epoch, name, value in log.records():
+        timestamp = datetime.datetime.fromtimestamp(
+            log.epoch + epoch, datetime.timezone.utc
+        )
+        out.write(
+            "{0},{1},{2:.7g}\n".format(
+                name, timestamp.strftime("%Y-%m-%dT%H:%M:%S"), value
+            )
+        )
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a binary datalog from the SD card to CSV"
+    )
+    parser.add_argument("datalog", help="binary datalog, e.g. datalog.bin")
+    parser.add_argument(
+        "csv", nargs="?", help="CSV file to write (default standard output)"
+    )
+    args = parser.parse_args()
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f_out:
+            count = convert(args.datalog, f_out)
+        print("{0} readings written to {1}".format(count, args.csv), file=sys.stderr)
+    else:
+        convert(args.datalog)
+
+
+if __name__ == "__main__":
+    main()
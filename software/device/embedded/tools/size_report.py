@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Size report of the development and production builds
+
+Compiles each module of the embedded software with mpy-cross as it is
+built by the development and the production profiles of the Makefile, and
+reports for each module:
+
+- the number of debug log calls stripped by the production build
+- the size of the module in the development and production builds (bytes)
+- where the production build keeps it: in a file on flash, or frozen into
+  the firmware
+
+followed by the totals on flash and in the firmware. Modules are compiled
+the same way for freezing, so their size is close to that of their frozen
+bytecode. The tests are not included.
+
+Import times and RAM use are measured on the data recorder with
+test/manual_tests/bench_imports.py, once with each build installed.
+
+Run from software/device/embedded (requires mpy-cross):
+
+    make report
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import strip_debug
+
+# Modules kept as source files by the Makefile
+SOURCE_MODULES = ("board.py", "boot.py", "main.py")
+EXCLUDED_DIRS = ("test", "__pycache__")
+
+
+def find_modules(srcdir: str) -> list:
+    """
+    Returns:
+        list: paths of the modules relative to srcdir, in sorted order
+    """
+    modules = []
+    for directory, subdirs, files in os.walk(srcdir):
+        subdirs[:] = [name for name in subdirs if name not in EXCLUDED_DIRS]
+        for name in files:
+            if name.endswith(".py"):
+                path = os.path.join(directory, name)
+                modules.append(os.path.relpath(path, srcdir).replace(os.sep, "/"))
+    return sorted(modules)
+
+
+def is_frozen(module: str, frozen: list) -> bool:
+    return any(
+        module == name + ".py" or module.startswith(name + "/") for name in frozen
+    )
+
+
+def compiled_size(path: str, module: str, workdir: str, march: str) -> int:
+    """
+    Returns:
+        int: size of the module as built, .mpy bytecode or source (bytes)
+    """
+    if module in SOURCE_MODULES:
+        return os.path.getsize(path)
+    output = os.path.join(workdir, "module.mpy")
+    # The same source name is embedded in both builds, so that only the code
+    # differs
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "mpy_cross",
+            "-march=" + march,
+            "-s",
+            module,
+            "-o",
+            output,
+            path,
+        ],
+        check=True,
+    )
+    return os.path.getsize(output)
+
+
+def report(srcdir: str, frozen: list, march: str, out=sys.stdout):
+    totals = {"development": 0, "flash": 0, "frozen": 0, "stripped": 0}
+    out.write(
+        "{0:40s} {1:>8s} {2:>8s} {3:>10s}  {4}\n".format(
+            "module", "stripped", "dev B", "prod B", "production"
+        )
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        stripped_path = os.path.join(workdir, "stripped.py")
+        for module in find_modules(srcdir):
+            path = os.path.join(srcdir, module)
+            with open(path, encoding="utf-8") as f_in:
+                text = f_in.read()
+            text, stripped, _ = strip_debug.strip(
+                text, strip_debug.PRODUCTION_SETTINGS.get(module), path
+            )
+            with open(stripped_path, "w", encoding="utf-8") as f_out:
+                f_out.write(text)
+
+            development = compiled_size(path, module, workdir, march)
+            production = compiled_size(stripped_path, module, workdir, march)
+            where = "frozen" if is_frozen(module, frozen) else "flash"
+            totals["development"] += development
+            totals[where] += production
+            totals["stripped"] += stripped
+            out.write(
+                "{0:40s} {1:8d} {2:8d} {3:10d}  {4}\n".format(
+                    module, stripped, development, production, where
+                )
+            )
+
+    out.write(
+        "\n{0} debug calls stripped\n"
+        "development: {1:8d} bytes on flash\n"
+        "production:  {2:8d} bytes on flash, {3:8d} bytes frozen\n".format(
+            totals["stripped"],
+            totals["development"],
+            totals["flash"],
+            totals["frozen"],
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report module sizes of the development and production builds"
+    )
+    parser.add_argument("--srcdir", default="src", help="source directory")
+    parser.add_argument(
+        "--frozen",
+        nargs="*",
+        default=[],
+        help="packages and modules frozen by the production build, relative to srcdir",
+    )
+    parser.add_argument(
+        "--march", default="xtensawin", help="mpy-cross architecture (xtensawin)"
+    )
+    args = parser.parse_args()
+    report(args.srcdir, args.frozen, args.march)
+
+
+if __name__ == "__main__":
+    main()
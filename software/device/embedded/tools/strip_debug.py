@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Prepare a source file of the embedded software for the production build
+
+Copies a source file, replacing each statement that is a call of a logger's
+debug() method, e.g. `log.debug("Sensor results: {0}".format(results))`,
+with `pass`. The message is then neither formatted nor passed to the logger.
+Lines are kept, so that line numbers in tracebacks match the source.
+
+A call is kept if its arguments call anything other than the functions in
+PURE_FUNCTIONS, e.g. `log.debug("Cleared {}".format(uart.read()))`, since
+removing it would change what the code does. Kept calls are listed on
+stderr.
+
+The module-level settings in PRODUCTION_SETTINGS are also replaced, e.g.
+`PRODUCTION = True` in main.py.
+
+Run by the Makefile with `make PROFILE=production`, or directly:
+
+    python3 tools/strip_debug.py src/drivers/modem.py build-production/src/drivers/modem.py
+
+With --check, as by `make check-strip`, every source file given is stripped
+and compiled with mpy-cross, and the check fails if a file does not compile
+or if a debug call is kept other than those in KEPT_CALLS:
+
+    python3 tools/strip_debug.py --check src/main.py src/drivers/*.py
+
+Requires Python 3.9 or later (ast.unparse() and end positions of nodes).
+"""
+
+import argparse
+import ast
+import os
+import subprocess
+import sys
+import tempfile
+import warnings
+
+# Functions and methods which may be called in the arguments of a stripped
+# call, as they only format values
+PURE_FUNCTIONS = {
+    "format",
+    "str",
+    "repr",
+    "len",
+    "int",
+    "float",
+    "hex",
+    "round",
+    "list",
+    "tuple",
+    "join",
+    "replace",
+    "strip",
+    "decode",
+    "isoformat",
+    "ticks_diff",
+    "ticks_ms",
+    "time",
+}
+
+# Module-level assignments replaced in the production build: file name
+# (relative to the source directory) -> {target: value}
+PRODUCTION_SETTINGS = {
+    "main.py": {
+        "PRODUCTION": "True",
+        "logging._level": "logging.INFO",
+    },
+}
+
+
+# Debug calls kept on purpose: file name (relative to the source directory)
+# -> number of calls kept. Any other call kept fails the check.
+KEPT_CALLS = {
+    # Checks that a message is not formatted when its level is disabled
+    "test/test_logging.py": 1,
+}
+
+
+def _called_name(call: ast.Call) -> str:
+    func = call.func
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    if isinstance(func, ast.Name):
+        return func.id
+    return ""
+
+
+def _is_debug_call(node: ast.stmt) -> bool:
+    return (
+        isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Call)
+        and isinstance(node.value.func, ast.Attribute)
+        and node.value.func.attr == "debug"
+        and isinstance(node.value.func.value, ast.Name)
+    )
+
+
+def _is_pure(call: ast.Call) -> bool:
+    arguments = call.args + [keyword.value for keyword in call.keywords]
+    return all(
+        _called_name(node) in PURE_FUNCTIONS
+        for argument in arguments
+        for node in ast.walk(argument)
+        if isinstance(node, ast.Call)
+    )
+
+
+class _Source:
+    """Source lines, edited in place by (line, column) positions of the AST."""
+
+    def __init__(self, text: str):
+        # AST columns are UTF-8 byte offsets
+        self.lines = text.encode("utf-8").splitlines(keepends=True)
+
+    def rest_of_line(self, lineno: int, col: int) -> bytes:
+        return self.lines[lineno - 1][col:]
+
+    def replace(self, node: ast.AST, text: str):
+        """Replace the source of a node, keeping the number of lines."""
+        first, last = node.lineno - 1, node.end_lineno - 1
+        head = self.lines[first][: node.col_offset]
+        tail = self.lines[last][node.end_col_offset :]
+        self.lines[first] = head + text.encode("utf-8") + b"\n" * (last - first) + tail
+        for i in range(first + 1, last + 1):
+            self.lines[i] = b""
+
+    def text(self) -> str:
+        return b"".join(self.lines).decode("utf-8")
+
+
+def strip(text: str, settings: dict = None, filename: str = "<source>") -> tuple:
+    """
+    Args:
+        text (str): source of a module
+        settings (dict): module-level assignments to replace, target -> value
+        filename (str): name of the module, for messages
+
+    Returns:
+        tuple: (stripped source, number of calls stripped, list of line
+        numbers of the calls kept)
+    """
+    with warnings.catch_warnings():
+        # Invalid escape sequences are accepted by MicroPython
+        warnings.simplefilter("ignore", SyntaxWarning)
+        tree = ast.parse(text, filename)
+    source = _Source(text)
+    stripped = 0
+    kept = []
+
+    for node in ast.walk(tree):
+        if not _is_debug_call(node):
+            continue
+        rest = source.rest_of_line(node.end_lineno, node.end_col_offset).strip()
+        if not _is_pure(node.value) or (rest and not rest.startswith(b"#")):
+            kept.append(node.lineno)
+            continue
+        source.replace(node, "pass")
+        stripped += 1
+
+    settings = dict(settings or {})
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target = ast.unparse(node.targets[0])
+            if target in settings:
+                source.replace(node.value, settings.pop(target))
+    if settings:
+        raise ValueError(
+            "{0}: no module-level assignment to {1}".format(
+                filename, ", ".join(sorted(settings))
+            )
+        )
+
+    return source.text(), stripped, sorted(kept)
+
+
+def _strip_file(source: str, srcdir: str) -> tuple:
+    """Strip a source file, returning strip() of its text and its name."""
+    with open(source, encoding="utf-8") as f_in:
+        text = f_in.read()
+    name = os.path.relpath(source, srcdir).replace(os.sep, "/")
+    return strip(text, PRODUCTION_SETTINGS.get(name), source) + (name,)
+
+
+def check(sources: list, srcdir: str) -> int:
+    """
+    Strip and compile each source file with mpy-cross.
+
+    Returns:
+        int: the number of files which do not compile or keep debug calls
+        not in KEPT_CALLS
+    """
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for source in sources:
+            text, _, kept, name = _strip_file(source, srcdir)
+            if len(kept) != KEPT_CALLS.get(name, 0):
+                for lineno in kept:
+                    print(
+                        "{0}:{1}: debug call kept, it has side effects".format(
+                            source, lineno
+                        ),
+                        file=sys.stderr,
+                    )
+                failed += 1
+            stripped = os.path.join(tmpdir, name)
+            os.makedirs(os.path.dirname(stripped), exist_ok=True)
+            with open(stripped, "w", encoding="utf-8") as f_out:
+                f_out.write(text)
+            compiled = subprocess.run(
+                [sys.executable, "-m", "mpy_cross", "-o", stripped + ".mpy", stripped]
+            )
+            if compiled.returncode != 0:
+                print(
+                    "{0}: does not compile once stripped".format(source),
+                    file=sys.stderr,
+                )
+                failed += 1
+    return failed
+
+
+def main():
+    if sys.version_info < (3, 9):
+        sys.exit("strip_debug.py requires Python 3.9 or later")
+
+    parser = argparse.ArgumentParser(
+        description="Strip debug logging from a source file for the production build"
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        metavar="path",
+        help="source file and stripped file to write, or with --check the source files",
+    )
+    parser.add_argument(
+        "--srcdir",
+        default="src",
+        help="source directory, for finding PRODUCTION_SETTINGS (default src)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="strip and compile the source files with mpy-cross, without writing them",
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        failed = check(args.paths, args.srcdir)
+        print("{0} files checked, {1} failed".format(len(args.paths), failed))
+        sys.exit(1 if failed else 0)
+    if len(args.paths) != 2:
+        parser.error("expected a source file and a destination")
+    source, destination = args.paths
+
+    text, stripped, kept, _ = _strip_file(source, args.srcdir)
+    for lineno in kept:
+        print(
+            "{0}:{1}: debug call kept, it has side effects".format(source, lineno),
+            file=sys.stderr,
+        )
+
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    with open(destination, "w", encoding="utf-8") as f_out:
+        f_out.write(text)
+
+
+if __name__ == "__main__":
+    main()
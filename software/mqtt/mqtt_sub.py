@@ -22,19 +22,130 @@ Subscribe to a MQTT topic and publish to another service via an HTTP API.
 import os
 import sys
 import json
+import base64
+import zlib
 import argparse
 import logging
 import traceback
-from datetime import datetime
+from datetime import datetime, timedelta
 import requests
 import paho.mqtt.client as mqtt
 
 MQTT_BROKER = "test.mosquitto.org"
 MQTT_TOPIC = "test/environmentMonitoring/"
 MQTT_SUBSCRIBER = f"MQTT subscriber on {os.uname()[1]}"
+BATCH_VERSION = 1  # Batch format version, see decode_payload()
+COMPACT_VERSION = 0xC1  # Compact binary format version, see decode_compact()
+DEFAULT_DECIMALS = 2
+DEVICE_EPOCH = datetime(2000, 1, 1)  # MicroPython epoch on the ESP32
 GWRC_FAVICON = "https://t3.gstatic.com/faviconV2?client=SOCIAL&type=FAVICON&fallback_opts=TYPE,SIZE,URL&url=http://gw.govt.nz&size=16"
 
 
+def build_schema(device_config: dict) -> list:
+    """
+    Derive the compact encoding schema from a data recorder's configuration,
+    as the data recorder's `services.payload.build_schema()` does.
+    """
+    schema = []
+    sensors = device_config["sdi12_sensors"]
+    for sensor_name in sorted(sensors):
+        for reading in sensors[sensor_name]["readings"]:
+            schema.append(
+                (reading["reading"], reading.get("decimals", DEFAULT_DECIMALS))
+            )
+    schema.append(("rainfall", 0))
+    return schema
+
+
+def schema_id(schema: list) -> int:
+    text = ",".join(f"{name}:{decimals}" for name, decimals in schema)
+    return zlib.crc32(text.encode("utf-8")) & 0xFFFF
+
+
+def _read_varint(data: bytes, pos: int) -> tuple:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def decode_compact(data: bytes, schema: list) -> list:
+    """
+    Decode a compact binary message packed by the data recorder's
+    `services.payload.encode_compact()`, which documents the format.
+    """
+    if data[0] != COMPACT_VERSION:
+        raise ValueError(f"Unsupported compact format version {data[0]:#x}")
+    message_schema_id, pos = _read_varint(data, 1)
+    if message_schema_id != schema_id(schema):
+        raise ValueError(
+            f"Schema id {message_schema_id:#06x} does not match the "
+            f"configuration ({schema_id(schema):#06x})"
+        )
+    count, pos = _read_varint(data, pos)
+
+    readings = []
+    timestamp = 0
+    for _ in range(count):
+        delta, pos = _read_varint(data, pos)
+        timestamp += delta
+        presence, pos = _read_varint(data, pos)
+        reading = {
+            "DateTime": (DEVICE_EPOCH + timedelta(seconds=timestamp)).isoformat()
+        }
+        for i, (name, decimals) in enumerate(schema):
+            if presence & (1 << i):
+                value, pos = _read_varint(data, pos)
+                value = (value >> 1) ^ -(value & 1)  # zigzag
+                reading[name] = value / 10**decimals if decimals else value
+        readings.append(reading)
+    return readings
+
+
+def decode_payload(msg_payload: str, schema: list = None) -> list:
+    """
+    Decode an MQTT message from a data recorder into a list of readings.
+
+    A message holds either a single reading, a JSON object with an ISO 8601
+    `DateTime`, a batch of readings packed by the data recorder's
+    `services.payload.encode_batch()`:
+
+        {"v": 1, "dev": "<device_name>", "t0": "<DateTime>",
+         "r": [{"dt": <offset from t0 in seconds>, <readings>}, ...]}
+
+    or, if not a JSON object, base64 encoded compact readings which are
+    decoded with `schema` (see decode_compact()).
+
+    Each batched reading is returned with its `DateTime` restored.
+    """
+    if not msg_payload.lstrip().startswith("{"):
+        if schema is None:
+            raise ValueError("Compact message received without a device configuration")
+        return decode_compact(base64.b64decode(msg_payload), schema)
+
+    data = json.loads(msg_payload)
+    if not (isinstance(data, dict) and "r" in data and "v" in data):
+        return [data]
+    if data["v"] != BATCH_VERSION:
+        raise ValueError(f"Unsupported batch version {data['v']}")
+
+    t0 = datetime.fromisoformat(data["t0"])
+    readings = []
+    for record in data["r"]:
+        reading = dict(record)
+        if "dt" in reading:
+            reading["DateTime"] = (
+                t0 + timedelta(seconds=reading.pop("dt"))
+            ).isoformat()
+        readings.append(reading)
+    return readings
+
+
 # Callbacks
 def cb_connect(client, userdata, flags, return_code):
     """
@@ -64,7 +175,7 @@ def cb_message(client, userdata, msg):
     msg_payload = msg.payload.decode("utf-8")
     try:
         log.debug("Received MQTT message with payload: %s", msg_payload)
-        readings = json.loads(msg_payload)
+        readings = decode_payload(msg_payload, userdata.schema)
     except Exception as exception:
         log.exception("Message %s generated an exception:", msg_payload)
         post_mattermost(
@@ -73,15 +184,16 @@ def cb_message(client, userdata, msg):
             f"```python\n{traceback.format_exc()}\n```",
         )
     else:
-        log.info("%s", readings)
-        text = (
-            f"**{readings['DateTime']}**  "
-            f"Temperature: {readings['temperature']} ; "
-            f"Pressure: {readings['pressure']} ; "
-            f"Bucket Tips: {readings['rainfall']}."
-        )
-        post_mattermost(text, userdata.topic + " via MQTT", GWRC_FAVICON)
-        post_mmy(readings)
+        for reading in readings:
+            log.info("%s", reading)
+            text = (
+                f"**{reading['DateTime']}**  "
+                f"Temperature: {reading['temperature']} ; "
+                f"Pressure: {reading['pressure']} ; "
+                f"Bucket Tips: {reading['rainfall']}."
+            )
+            post_mattermost(text, userdata.topic + " via MQTT", GWRC_FAVICON)
+            post_mmy(reading)
         # # Post to Microsoft Power BI
         # requests.post(REST_API_URL, msg.payload)
 
@@ -158,6 +270,14 @@ def parse_arguments():
         "typically the data recorder name, is added; must end in '/'.",
     )
 
+    parser.add_argument(
+        "--device-config",
+        type=str,
+        default=None,
+        help="data recorder configuration file (JSON), required to decode "
+        "readings sent with the compact telemetry encoding.",
+    )
+
     parser.add_argument(
         "topic",
         type=str,
@@ -244,6 +364,11 @@ def main():
 
     log = setup_logger(args)
 
+    args.schema = None
+    if args.device_config:
+        with open(args.device_config, encoding="utf-8") as config_file:
+            args.schema = build_schema(json.load(config_file))
+
     # Create an MQTT client instance and configure the callback
     # functions prior to connecting to the specified broker.
     client = mqtt.Client()
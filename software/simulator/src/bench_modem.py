@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Benchmark of the modem driver on the virtual SARA-R4 modem
+
+Brings up the modem and publishes a set of readings for a sequence of
+scenarios, reporting the time taken and the AT and MQTT traffic:
+
+- cold start, with the blocking and the asynchronous bring-up
+- a resumed session, with the modem left on by the previous wake
+- publishing the readings batched (services/payload.py)
+- a rejected first login and slow network registration, with the retry
+  made by transmit() in main.py
+
+Run from the repository top level with CPython or the MicroPython unix port:
+
+    python software/simulator/src/bench_modem.py
+"""
+
+import json
+import sys
+
+SIMULATOR_DIR = __file__.rsplit("/", 1)[0] if "/" in __file__ else "."
+SRC_DIR = SIMULATOR_DIR + "/../../device/embedded/src"
+
+sys.path.insert(0, SIMULATOR_DIR)
+sys.path.insert(1, SRC_DIR)
+if sys.implementation.name == "micropython":
+    # The firmware's libraries (uasyncio, asyn, logging) run on the unix port
+    sys.path.insert(2, SRC_DIR + "/lib")
+
+import sara_r4
+import vmachine
+
+sara_r4.install()
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from drivers.modem import Modem, MODEM_MQTT_MAX_MESSAGE_LENGTH
+from services import payload as payload_services
+from util import rtcmem
+
+TOPIC = "devices/data-recorder/messages/events/"
+DEVICE_CONFIG = {"device_name": "data-recorder", "sdi12_sensors": {}}
+READINGS = 12
+
+
+def make_records(count: int) -> list:
+    return [
+        json.dumps(
+            {
+                "DateTime": "2023-09-01T{0:02d}:{1:02d}:00".format(
+                    10 + (5 * i) // 60, (5 * i) % 60
+                ),
+                "water_level": 1.204,
+                "temperature": 14.37,
+                "rainfall": i % 3,
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def bring_up_sync(modem: Modem) -> bool:
+    modem.initialise()
+    modem.get_signal_power()
+    modem.acquire_network()
+    return modem.has_network and modem.mqtt_connect()
+
+
+def bring_up_async(modem: Modem) -> bool:
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(modem.initialise_async())
+
+
+def bring_up_retry(modem: Modem) -> bool:
+    # transmit() tries once more to log in if the first attempt failed
+    return bring_up_async(modem) or (modem.has_network and modem.mqtt_connect())
+
+
+def publish_each(modem: Modem, records: list) -> int:
+    return sum(1 for record in records if modem.mqtt_publish(TOPIC, record))
+
+
+def publish_batched(modem: Modem, records: list) -> int:
+    published = 0
+    while records:
+        message, count = payload_services.encode(
+            DEVICE_CONFIG, records, MODEM_MQTT_MAX_MESSAGE_LENGTH
+        )
+        if not modem.mqtt_publish(TOPIC, message):
+            break
+        published += count
+        records = records[count:]
+    return published
+
+
+def run_scenario(name, virtual_modem, bring_up, publish):
+    virtual_modem.attach()
+    start = vmachine.ticks_us()
+    modem = Modem()
+    ready = bring_up(modem)
+    ready_time = (vmachine.ticks_us() - start) / 1000000
+    published = publish(modem, make_records(READINGS)) if ready else 0
+    elapsed = (vmachine.ticks_us() - start) / 1000000
+    print(
+        "{0:16s} ready {1:5.2f} s total {2:5.2f} s {3:3d} commands {4:2d} errors "
+        "{5:2d} readings in {6:2d} messages".format(
+            name,
+            ready_time,
+            elapsed,
+            virtual_modem.stats["commands"],
+            virtual_modem.stats["errors"],
+            published,
+            len(virtual_modem.broker.messages),
+        )
+    )
+    return virtual_modem
+
+
+def new_wake(powered_modem=None) -> sara_r4.VirtualModem:
+    """Start a wake from deep sleep, or from power-on if no modem is left on."""
+    if powered_modem is None:
+        vmachine.reset_devices()
+        rtcmem.clear()
+        return sara_r4.VirtualModem()
+    # RTC memory and the modem's session are kept
+    powered_modem.broker.messages = []
+    powered_modem.stats = dict.fromkeys(powered_modem.stats, 0)
+    return powered_modem
+
+
+def main():
+    run_scenario("cold sync", new_wake(), bring_up_sync, publish_each)
+    left_on = run_scenario("cold async", new_wake(), bring_up_async, publish_each)
+    run_scenario("resumed", new_wake(left_on), bring_up_async, publish_each)
+    run_scenario("batched", new_wake(left_on), bring_up_async, publish_batched)
+
+    faulty = new_wake()
+    faulty.registration_time = 6
+    faulty.inject("+UMQTTC=1", "ERROR")
+    run_scenario("faults", faulty, bring_up_retry, publish_batched)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Benchmark of the SDI-12 driver on the virtual SDI-12 bus
+
+Reads three sensors the way the pipeline does (services/sdi12.py) for a
+set of bus scenarios, and reports the time taken, the bus traffic and the
+readings. Faults are seeded, so the bus traffic of each run is the same.
+
+Run from the repository top level with CPython or the MicroPython unix port:
+
+    python software/simulator/src/bench_sdi12.py
+    micropython software/simulator/src/bench_sdi12.py
+"""
+
+import sys
+import time
+
+SIMULATOR_DIR = __file__.rsplit("/", 1)[0] if "/" in __file__ else "."
+SRC_DIR = SIMULATOR_DIR + "/../../device/embedded/src"
+
+sys.path.insert(0, SIMULATOR_DIR)
+sys.path.insert(1, SRC_DIR)
+if sys.implementation.name == "micropython":
+    # The firmware's libraries (uasyncio, asyn, logging) run on the unix port
+    sys.path.insert(2, SRC_DIR + "/lib")
+
+import sdi12bus
+import vmachine
+
+# Sensor configuration (see services/config.example.json) and virtual sensor
+# for each sensor read
+SENSORS = [
+    (
+        "water_sensor",
+        {"address": "1", "readings": [("level", 1), ("temperature", 2)]},
+        [1.204, 14.37, 12.1],
+    ),
+    (
+        "weather_sensor",
+        {"address": "2", "readings": [("pressure", 1), ("humidity", 4)]},
+        [1013.2, 5.5, 0.25, 87.5],
+    ),
+    (
+        "flow_sensor",
+        {"address": "3", "readings": [("flow", 6)]},
+        [0.1, 0.2, 0.3, 0.4, 0.5, 0.125],
+    ),
+]
+
+# name, measure time, ready after, concurrent, sensor options
+SCENARIOS = [
+    ("sequential", 2, 2, False, {}),
+    ("service request", 2, 0.5, False, {}),
+    ("concurrent", 2, 2, True, {}),
+    ("faults", 2, 0.5, False, {"drop_rate": 0.01, "wrong_address_rate": 0.1}),
+]
+
+sdi12bus.install()
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+import asyn
+from drivers import sdi12 as sdi12_driver
+from services import sdi12 as sdi12_services
+from util import rtcmem
+
+
+def sensor_config(config: dict, concurrent: bool) -> dict:
+    return {
+        "address": config["address"],
+        "bootup_time": 0,
+        "concurrent": concurrent,
+        "enabled": True,
+        "readings": [
+            {"reading": name, "index": index, "multiplier": 1, "offset": 0}
+            for name, index in config["readings"]
+        ],
+    }
+
+
+async def read_all(sdi: dict, sensors: dict) -> list:
+    # Sensors have been on for long enough to have booted
+    wake_time = time.time() - 2
+    names, gatherables = sdi12_services.gather_sensors(sdi, sensors, wake_time)
+    results = await asyn.Gather(gatherables)
+    return [
+        (name, sdi12_services.convert_readings(result, sensors[name]))
+        for name, result in zip(names, results)
+    ]
+
+
+def run_scenario(name, measure_time, ready_after, concurrent, options):
+    vmachine.reset_devices()
+    rtcmem.clear()
+    bus = sdi12bus.VirtualBus(
+        [
+            sdi12bus.VirtualSensor(
+                config["address"],
+                values,
+                measure_time=measure_time,
+                ready_after=ready_after,
+                seed=i + 1,
+                **options
+            )
+            for i, (_, config, values) in enumerate(SENSORS)
+        ]
+    )
+    bus.attach()
+    sensors = {
+        sensor_name: sensor_config(config, concurrent)
+        for sensor_name, config, _ in SENSORS
+    }
+
+    sdi = sdi12_driver.init_sdi(1)
+    loop = asyncio.get_event_loop()
+    start = vmachine.ticks_us()
+    try:
+        results = loop.run_until_complete(read_all(sdi, sensors))
+    except (ValueError, RuntimeError, TypeError) as exc:
+        results = "failed: {0}".format(exc)
+    elapsed = (vmachine.ticks_us() - start) / 1000000
+    sdi12_driver.turn_off_sensors(sdi)
+
+    print(
+        "{0:16s} {1:6.2f} s {2:3d} commands {3:3d} replies".format(
+            name, elapsed, bus.stats["commands"], bus.stats["replies"]
+        )
+    )
+    print("    {0}".format(results))
+
+
+def main():
+    for scenario in SCENARIOS:
+        run_scenario(*scenario)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+MicroPython compatibility for running the data recorder code under CPython
+
+The firmware uses the fast_io fork of uasyncio and `asyn` from `src/lib`,
+neither of which runs under CPython, and the MicroPython `time.ticks_*()`
+functions. install() provides the parts the drivers use, built on CPython's
+asyncio:
+
+- `uasyncio`: sleep_ms(), wait_for_ms() and a StreamReader over a
+  non-blocking stream such as a virtual UART (see vmachine.py). The event
+  loops' remove_reader() ignores such streams, which are never registered.
+- `asyn`: Lock, Gather and Gatherable.
+- `time`: ticks_ms(), ticks_us(), ticks_diff(), ticks_add() and sleep_ms().
+- `ure` and `utime`, as the CPython `re` and `time` modules.
+
+Under MicroPython install() does nothing.
+"""
+
+import asyncio
+import functools
+import re
+import sys
+import time
+
+# Interval at which a StreamReader polls its stream, in seconds
+POLL_INTERVAL = 0.001
+
+# Creates the event loop returned by get_event_loop(), see vclock.py
+loop_factory = asyncio.new_event_loop
+
+_loop = None
+
+
+def sleep_ms(ms: int):
+    return asyncio.sleep(ms / 1000)
+
+
+async def wait_for_ms(coro, timeout: int):
+    return await asyncio.wait_for(coro, timeout / 1000)
+
+
+def get_event_loop(*args, **kwargs):
+    """Get the running event loop, or a loop to run the firmware's tasks in."""
+    global _loop
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    if _loop is None or _loop.is_closed():
+        _loop = loop_factory()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def _remove_reader(remove_reader):
+    """
+    Wrap the event loops' remove_reader() to accept the streams the firmware
+    unregisters from uasyncio: StreamReader polls them, so they are never
+    registered with the loop.
+    """
+
+    @functools.wraps(remove_reader)
+    def wrapper(self, fd):
+        try:
+            return remove_reader(self, fd)
+        except ValueError:
+            # Not a file object
+            return False
+
+    return wrapper
+
+
+def close_event_loop():
+    """Cancel the tasks left in the event loop and close it, as on a reset."""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        return
+    tasks = asyncio.all_tasks(_loop)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        _loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    _loop.close()
+    _loop = None
+
+
+class StreamReader:
+    """Awaitable reads from a stream whose reads return None when idle."""
+
+    def __init__(self, polls, ios=None):
+        self.polls = polls
+        self.ios = ios if ios is not None else polls
+
+    async def read(self, n=-1):
+        while True:
+            data = self.ios.read(n)
+            if data is not None:
+                return data
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def readline(self):
+        line = b""
+        while True:
+            data = self.ios.readline()
+            if data:
+                line += data
+                if line[-1] == 0x0A:
+                    return line
+            else:
+                await asyncio.sleep(POLL_INTERVAL)
+
+
+class StreamWriter:
+    def __init__(self, stream, extra=None):
+        self.s = stream
+
+    async def awrite(self, buf, off=0, sz=-1):
+        if sz == -1:
+            sz = len(buf) - off
+        self.s.write(buf[off : off + sz])
+        await asyncio.sleep(0)
+
+
+class Lock:
+    """asyn.Lock, which may be created before the event loop."""
+
+    def __init__(self, delay_ms=0):
+        self._locked = False
+        self.delay_ms = delay_ms
+
+    def locked(self):
+        return self._locked
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *args):
+        self.release()
+        await asyncio.sleep(0)
+
+    async def acquire(self):
+        while self._locked:
+            await sleep_ms(self.delay_ms)
+        self._locked = True
+
+    def release(self):
+        if not self._locked:
+            raise RuntimeError("Attempt to release a lock which has not been set")
+        self._locked = False
+
+
+class Gatherable:
+    def __init__(self, coro, *args, **kwargs):
+        self.arguments = coro, args, kwargs
+
+    def __call__(self):
+        return self.arguments
+
+
+class Gather:
+    """asyn.Gather: await to get the results of the gatherables, in order."""
+
+    def __init__(self, gatherables):
+        self.gatherables = gatherables
+
+    def __await__(self):
+        return self._run().__await__()
+
+    async def _run(self):
+        coros = []
+        for gatherable in self.gatherables:
+            coro, args, kwargs = gatherable()
+            kwargs = dict(kwargs)
+            timeout = kwargs.pop("timeout", None)
+            if timeout is None:
+                coros.append(coro(*args, **kwargs))
+            else:
+                coros.append(asyncio.wait_for(coro(*args, **kwargs), timeout))
+        return list(await asyncio.gather(*coros))
+
+
+def _module(name: str, **attributes):
+    module = type(sys)(name)
+    for key, value in attributes.items():
+        setattr(module, key, value)
+    return module
+
+
+def _install_ticks():
+    if hasattr(time, "ticks_ms"):
+        return
+    time.ticks_ms = lambda: int(time.monotonic() * 1000)
+    time.ticks_us = lambda: int(time.monotonic() * 1000000)
+    time.ticks_diff = lambda end, start: end - start
+    time.ticks_add = lambda ticks, delta: ticks + delta
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    time.sleep_us = lambda us: time.sleep(us / 1000000)
+
+
+def install():
+    """Provide `uasyncio`, `asyn` and the `time.ticks_*()` functions."""
+    if sys.implementation.name == "micropython":
+        return
+    _install_ticks()
+    loop_class = asyncio.selector_events.BaseSelectorEventLoop
+    if not hasattr(loop_class.remove_reader, "__wrapped__"):
+        loop_class.remove_reader = _remove_reader(loop_class.remove_reader)
+    uasyncio = _module(
+        "uasyncio",
+        **{key: value for key, value in vars(asyncio).items() if key[0] != "_"}
+    )
+    uasyncio.sleep_ms = sleep_ms
+    uasyncio.wait_for_ms = wait_for_ms
+    uasyncio.get_event_loop = get_event_loop
+    uasyncio.StreamReader = StreamReader
+    uasyncio.StreamWriter = StreamWriter
+    sys.modules["uasyncio"] = uasyncio
+    sys.modules["asyn"] = _module(
+        "asyn", Lock=Lock, Gather=Gather, Gatherable=Gatherable
+    )
+    sys.modules.setdefault("ure", re)
+    sys.modules.setdefault("utime", time)
@@ -0,0 +1,667 @@
+#!/usr/bin/env python3
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Virtual SARA-R4 modem with an in-memory MQTT broker
+
+The modem speaks the subset of the SARA-R4 AT command set used by
+drivers/modem.py, with command echo, Unsolicited Result Codes, power-on and
+network registration delays, per-command latencies and injected errors.
+Messages published over MQTT are delivered to a MqttBroker.
+
+The modem can be attached to the virtual UART and PWR_ON pin of the data
+recorder (see vmachine.py), so that the unmodified driver runs on a host:
+
+    import sara_r4
+
+    modem = sara_r4.VirtualModem()
+    sara_r4.install(modem)
+
+    from drivers.modem import Modem
+
+or served on a pseudo-terminal for use with a terminal program or other
+serial tools (CPython only):
+
+    python software/simulator/src/sara_r4.py --powered
+
+Runs under CPython and the MicroPython unix port.
+"""
+
+import time
+
+import mpcompat
+import vmachine
+
+# Data recorder connections, see drivers/modem.py
+MODEM_UART = 1
+MODEM_POWER_PIN = 4
+
+GREETING = "SARA-R410M-02B-01 Operational"
+
+# PWR_ON low times (s), from the SARA-R4 data sheet
+POWER_ON_PULSE_MIN = 0.15
+POWER_ON_PULSE_MAX = 3.2
+POWER_OFF_PULSE_MIN = 1.5
+
+# Delay between +CPWROFF returning OK and the modem switching off (s)
+POWER_OFF_DELAY = 0.15
+
+IDENTIFICATION = {
+    "+CGMI": "u-blox",
+    "+CGMM": "SARA-R410M-02B",
+    "+CGMR": "L0.0.00.00.05.08 [Apr 17 2019 19:34:02]",
+    "+CGSN": "352753090000001",
+    "+CIMI": "530050000000001",
+    "+CCID": "+CCID: 89640500000000000001",
+    "+GCAP": "+GCAP: +FCLASS, +CGSM",
+    "I": "Manufacturer: u-blox\r\nModel: SARA-R410M-02B",
+}
+
+
+class MqttBroker:
+    """
+    In-memory stand-in for the MQTT broker.
+
+    Attributes:
+        messages (list): (client id, topic, message) tuples, in the order
+            published.
+        accept_logins (bool): set to False to reject logins as not
+            authorised.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.accept_logins = True
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """
+        Args:
+            callback: called as `callback(client_id, topic, message)` for
+                each message published.
+        """
+        self._subscribers.append(callback)
+
+    def login(self, client_id: str) -> int:
+        """
+        Returns:
+            int: MQTT CONNACK return code, 0 if accepted.
+        """
+        return 0 if self.accept_logins else 5
+
+    def publish(self, client_id: str, topic: str, message: str):
+        self.messages.append((client_id, topic, message))
+        for callback in self._subscribers:
+            callback(client_id, topic, message)
+
+
+class VirtualModem:
+    """
+    A SARA-R4 modem.
+
+    Args:
+        broker (MqttBroker): the broker MQTT clients log in to. A new broker
+            is created if not given.
+        powered (bool): start powered-on, as if left on by a previous wake.
+        boot_time (float): time from the PWR_ON pulse to the greeting (s).
+        registration_time (float): time from power-on or reset to network
+            registration and an IP address (s).
+        latency (float): time taken to answer a command (s).
+        login_time (float): time taken to log in to the MQTT broker (s).
+        publish_time (float): time taken to publish an MQTT message (s).
+        http_time (float): time taken by an HTTP request (s).
+        rssi (int): signal strength reported by +CSQ, 0 to 31, or 99.
+        echo (bool): echo commands (ATE1), the power-on default.
+
+    Attributes:
+        transcript (list): (command, final result code) tuples, in the order
+            received. The final result code is None for unanswered commands.
+        stats (dict): counts of commands, errors, publishes and power-ons, the
+            bytes written to the modem's UART ("uart_bytes") and the bytes of
+            MQTT messages and HTTP requests sent to the network
+            ("sent_bytes").
+        files (dict): name -> bytes, the modem's file system.
+        http_requests (list): (profile settings, command, path, data) tuples
+            of the HTTP requests made.
+    """
+
+    def __init__(
+        self,
+        broker: MqttBroker = None,
+        powered: bool = False,
+        boot_time: float = 4.1,
+        registration_time: float = 2.0,
+        latency: float = 0.02,
+        login_time: float = 2.5,
+        publish_time: float = 0.3,
+        http_time: float = 1.0,
+        rssi: int = 18,
+        echo: bool = True,
+        baudrate: int = 115200,
+    ):
+        self.broker = broker if broker is not None else MqttBroker()
+        self.boot_time = boot_time
+        self.registration_time = registration_time
+        self.latency = latency
+        self.login_time = login_time
+        self.publish_time = publish_time
+        self.http_time = http_time
+        self.rssi = rssi
+        self.default_echo = echo
+        self.byte_time_us = 10000000 // baudrate
+        self.transcript = []
+        self.stats = {
+            "commands": 0,
+            "errors": 0,
+            "publishes": 0,
+            "power_ons": 0,
+            "uart_bytes": 0,
+            "sent_bytes": 0,
+        }
+        self.files = {}
+        self.http_requests = []
+        # Non-volatile settings
+        self.ctzu = True
+        self.mqtt_nvm = {"client_id": "data-recorder", "server": "mqtt.local"}
+        # [command prefix, final result code or None for no reply, count]
+        self._faults = []
+        # command prefix -> latency (s)
+        self._latencies = {}
+        # (time, byte) tuples not yet read by the UART, in time order
+        self._pending = []
+        self._received = bytearray()
+        self._line = b""
+        self._download = None
+        self._low_since = None
+        self._off_at = None
+        self.powered = False
+        self._reset_session()
+        if powered:
+            self.powered = True
+            self._ready_us = 0
+            self._registered_us = 0
+
+    def _reset_session(self):
+        now = vmachine.ticks_us()
+        self.echo = self.default_echo
+        self.mqtt = dict(self.mqtt_nvm)
+        self.mqtt_connected = False
+        self.cereg_urc = 0
+        self.http_profiles = {}
+        self._ready_us = now + int(self.boot_time * 1000000)
+        self._registered_us = self._ready_us + int(self.registration_time * 1000000)
+
+    def inject(self, prefix: str, result: str = "ERROR", count: int = 1):
+        """
+        Answer the next commands starting with a prefix with a given result.
+
+        Args:
+            prefix (str): command prefix without `AT`, e.g. "+UMQTTC=1".
+            result (str): final result code to return, or None to not reply.
+            count (int): number of commands affected.
+        """
+        self._faults.append([prefix, result, count])
+
+    def set_latency(self, prefix: str, latency: float):
+        """
+        Args:
+            prefix (str): command prefix without `AT`, e.g. "+CSQ".
+            latency (float): time taken to answer the command (s).
+        """
+        self._latencies[prefix] = latency
+
+    def lose_registration(self, duration: float):
+        """Drop off the network for a time, as on loss of coverage."""
+        now = vmachine.ticks_us()
+        self._registered_us = now + int(duration * 1000000)
+        self.mqtt_connected = False
+        if self.cereg_urc:
+            self._emit(now, "\r\n+CEREG: 2\r\n")
+            self._emit(self._registered_us, "\r\n+CEREG: 1\r\n")
+
+    def registered(self, now_us: int = None) -> bool:
+        if now_us is None:
+            now_us = vmachine.ticks_us()
+        return self.powered and now_us >= self._registered_us
+
+    def attach(self):
+        """Connect the modem to the modem UART and PWR_ON pin."""
+        vmachine.attach_uart(MODEM_UART, self)
+        # PWR_ON has an internal pull-up
+        vmachine.set_pin(MODEM_POWER_PIN, 1)
+        vmachine.watch_pin(MODEM_POWER_PIN, self._power_pin)
+
+    def _power_pin(self, pin_id: int, value: int):
+        now = vmachine.ticks_us()
+        if not value:
+            if self._low_since is None:
+                self._low_since = now
+            return
+        if self._low_since is None:
+            return
+        low_time = (now - self._low_since) / 1000000
+        self._low_since = None
+        if not self.powered:
+            if POWER_ON_PULSE_MIN <= low_time <= POWER_ON_PULSE_MAX:
+                self._power_on(now)
+        elif low_time >= POWER_OFF_PULSE_MIN:
+            self._power_off()
+
+    def _power_on(self, now: int):
+        self.powered = True
+        self.stats["power_ons"] += 1
+        self._off_at = None
+        self._reset_session()
+        self._emit(self._ready_us, "\r\n{0}\r\n".format(GREETING))
+
+    def _power_off(self):
+        self.powered = False
+        self.mqtt_connected = False
+        self._off_at = None
+        self._pending = []
+        self._line = b""
+        self._download = None
+
+    def _emit(self, at_us: int, text: str) -> int:
+        data = text.encode("utf-8") if isinstance(text, str) else text
+        for i, byte in enumerate(data):
+            self._pending.append((at_us + i * self.byte_time_us, byte))
+        self._pending.sort(key=lambda entry: entry[0])
+        return at_us + len(data) * self.byte_time_us
+
+    def _deliver(self):
+        now = vmachine.ticks_us()
+        due = 0
+        while due < len(self._pending) and self._pending[due][0] <= now:
+            self._received.append(self._pending[due][1])
+            due += 1
+        if due:
+            del self._pending[:due]
+        if self._off_at is not None and now >= self._off_at:
+            self._power_off()
+
+    def _latency(self, body: str) -> float:
+        for prefix, latency in self._latencies.items():
+            if body.startswith(prefix):
+                return latency
+        return self.latency
+
+    def _fault(self, body: str):
+        for fault in self._faults:
+            if body.startswith(fault[0]) and fault[2] > 0:
+                fault[2] -= 1
+                return fault
+        return None
+
+    def _command(self, line: str, now: int):
+        if self.echo:
+            now = self._emit(now, line + "\r")
+        if not line.upper().startswith("AT"):
+            return
+        body = line[2:]
+        self.stats["commands"] += 1
+
+        fault = self._fault(body)
+        if fault is not None:
+            final = fault[1]
+            lines, urcs, delay = [], [], self._latency(body)
+        else:
+            lines, final, urcs, delay = self._handle(body, now)
+            delay = max(delay, self._latency(body))
+        self.transcript.append((line, final))
+        if final is None:
+            return
+        if final != "OK":
+            self.stats["errors"] += 1
+
+        at = now + int(delay * 1000000)
+        text = "".join("\r\n{0}\r\n".format(line) for line in lines)
+        if final == ">":
+            # Prompt for data, without a line terminator
+            self._emit(at, text + "\r\n>")
+            return
+        at = self._emit(at, text + "\r\n{0}\r\n".format(final))
+        for urc_delay, urc in urcs:
+            self._emit(at + int(urc_delay * 1000000), "\r\n{0}\r\n".format(urc))
+
+    def _handle(self, body: str, now: int) -> tuple:
+        """
+        Returns:
+            tuple: (information text lines, final result code, URCs as
+            (delay, text) tuples, minimum latency)
+        """
+        if "=" in body:
+            name, args = body.split("=", 1)
+        elif body.endswith("?"):
+            name, args = body[:-1], "?"
+        else:
+            name, args = body, None
+        upper = name.upper()
+
+        if upper in ("", "&F", "Z", "+CMEE", "+UMNOPROF", "+COPS", "+CEDRXS"):
+            return [], "OK", [], 0
+        if upper.startswith("E") and upper[1:] in ("0", "1"):
+            self.echo = upper == "E1"
+            return [], "OK", [], 0
+        if upper in IDENTIFICATION:
+            return [IDENTIFICATION[upper]], "OK", [], 0
+        if upper == "+CSQ":
+            return ["+CSQ: {0},99".format(self.rssi)], "OK", [], 0
+        if upper == "+CTZU":
+            if args == "?":
+                return ["+CTZU: {0}".format(1 if self.ctzu else 0)], "OK", [], 0
+            self.ctzu = args == "1"
+            return [], "OK", [], 0
+        if upper == "+CCLK" and args == "?":
+            return [self._clock()], "OK", [], 0
+        if upper == "+CGDCONT" and args == "?":
+            address = "10.170.0.2" if self.registered(now) else "0.0.0.0"
+            return (
+                ['+CGDCONT: 1,"IP","hologram","{0}",0,0,0,0'.format(address)],
+                "OK",
+                [],
+                0,
+            )
+        if upper in ("+CEREG", "+CREG"):
+            stat = 1 if self.registered(now) else 2
+            if args == "?":
+                return ["{0}: {1},{2}".format(upper, self.cereg_urc, stat)], "OK", [], 0
+            if upper == "+CEREG":
+                self.cereg_urc = int(args)
+            return [], "OK", [], 0
+        if upper == "+CFUN":
+            if args in ("15", "16"):
+                # Reset: re-register to the network
+                self.mqtt_connected = False
+                self._registered_us = now + int(self.registration_time * 1000000)
+            return [], "OK", [], 0
+        if upper == "+IPR":
+            return [], "OK", [], 0
+        if upper == "+CPWROFF":
+            self._off_at = now + int((self.latency + POWER_OFF_DELAY) * 1000000)
+            return [], "OK", [], 0
+        if upper == "+UMQTT":
+            return self._mqtt_profile(args)
+        if upper == "+UMQTTNV":
+            if args == "0":
+                self.mqtt = {}
+            elif args == "1":
+                self.mqtt = dict(self.mqtt_nvm)
+            elif args == "2":
+                self.mqtt_nvm = dict(self.mqtt)
+            return [], "OK", [], 0
+        if upper == "+UMQTTC":
+            return self._mqtt_command(args, now)
+        if upper == "+UHTTP":
+            profile, option, value = (args.split(",", 2) + [""])[:3]
+            self.http_profiles.setdefault(profile, {})[option] = value.strip('"')
+            return [], "OK", [], 0
+        if upper == "+UHTTPC":
+            return self._http_command(args, now)
+        if upper == "+UHTTPER":
+            return ["+UHTTPER: {0},0,0".format(args)], "OK", [], 0
+        if upper in ("+UDWNFILE", "+UDELFILE", "+ULSTFILE", "+URDFILE"):
+            return self._file_command(upper, args)
+        return [], "ERROR", [], 0
+
+    def _clock(self) -> str:
+        now = time.gmtime() if hasattr(time, "gmtime") else time.localtime()
+        # Time zone in quarter hours: +48 is NZST
+        return '+CCLK: "{0:02d}/{1:02d}/{2:02d},{3:02d}:{4:02d}:{5:02d}+48"'.format(
+            now[0] % 100, now[1], now[2], now[3], now[4], now[5]
+        )
+
+    def _mqtt_profile(self, args: str) -> tuple:
+        if args == "?":
+            return (
+                ['+UMQTT: {0},"{1}"'.format(k, v) for k, v in self.mqtt.items()],
+                "OK",
+                [],
+                0,
+            )
+        op_code, value = (args.split(",", 1) + [""])[:2]
+        names = {"0": "client_id", "2": "server", "10": "keep_alive"}
+        if op_code not in names:
+            return [], "ERROR", [], 0
+        self.mqtt[names[op_code]] = value.strip('"')
+        return ["+UMQTT: {0},1".format(op_code)], "OK", [], 0
+
+    def _mqtt_command(self, args: str, now: int) -> tuple:
+        op_code = args.split(",", 1)[0]
+        if op_code == "0":
+            # Logout
+            self.mqtt_connected = False
+            return ["+UMQTTC: 0,1"], "OK", [(0.05, "+UUMQTTC: 0,0")], 0
+        if op_code == "1":
+            # Login, the broker's answer follows as a URC
+            if not self.registered(now) or not self.mqtt.get("server"):
+                return ["+UMQTTC: 1,0"], "ERROR", [], self.latency
+            result = self.broker.login(self.mqtt.get("client_id"))
+            self.mqtt_connected = result == 0
+            return (
+                ["+UMQTTC: 1,1"],
+                "OK",
+                [(0.05, "+UUMQTTC: 1,{0}".format(result))],
+                self.login_time,
+            )
+        if op_code == "2":
+            # Publish: 2,<qos>,<retain>,"<topic>","<message>"
+            if not self.mqtt_connected or not self.registered(now):
+                return ["+UMQTTC: 2,0"], "ERROR", [], self.latency
+            parts = args.split(",", 3)
+            if len(parts) < 4:
+                return [], "ERROR", [], 0
+            quoted = parts[3]
+            separator = quoted.find('","')
+            if not quoted.startswith('"') or separator < 0:
+                return [], "ERROR", [], 0
+            topic = quoted[1:separator]
+            message = quoted[separator + 3 :]
+            if message.endswith('"'):
+                message = message[:-1]
+            self.broker.publish(self.mqtt.get("client_id"), topic, message)
+            self.stats["publishes"] += 1
+            self.stats["sent_bytes"] += len(topic) + len(message)
+            return ["+UMQTTC: 2,1"], "OK", [], self.publish_time
+        return [], "ERROR", [], 0
+
+    def _http_command(self, args: str, now: int) -> tuple:
+        parts = args.split(",")
+        if len(parts) < 3 or not self.registered(now):
+            return [], "ERROR", [], 0
+        profile, command, path = parts[0], parts[1], parts[2].strip('"')
+        data = None
+        if len(parts) > 4:
+            data = self.files.get(parts[4].strip('"'))
+        self.http_requests.append(
+            (dict(self.http_profiles.get(profile, {})), int(command), path, data)
+        )
+        self.stats["sent_bytes"] += len(path) + len(data or b"")
+        return (
+            [],
+            "OK",
+            [(self.http_time, "+UUHTTPCR: {0},{1},1".format(profile, command))],
+            0,
+        )
+
+    def _file_command(self, name: str, args: str) -> tuple:
+        if name == "+ULSTFILE":
+            listing = ",".join('"{0}"'.format(f) for f in self.files)
+            return ["+ULSTFILE: {0}".format(listing)], "OK", [], 0
+        filename = (args or "").split(",")[0].strip('"')
+        if name == "+UDELFILE":
+            if self.files.pop(filename, None) is None:
+                return [], "+CME ERROR: FILE NOT FOUND", [], 0
+            return [], "OK", [], 0
+        if name == "+URDFILE":
+            if filename not in self.files:
+                return [], "+CME ERROR: FILE NOT FOUND", [], 0
+            data = self.files[filename]
+            return (
+                [
+                    '+URDFILE: "{0}",{1},"{2}"'.format(
+                        filename, len(data), data.decode("utf-8")
+                    )
+                ],
+                "OK",
+                [],
+                0,
+            )
+        # +UDWNFILE="<filename>",<size>: data follows the ">" prompt
+        size = int(args.split(",")[1])
+        self._download = [filename, size, b""]
+        return [], ">", [], 0
+
+    # UART device interface, see vmachine.attach_uart()
+
+    def uart_write(self, data: bytes):
+        self.stats["uart_bytes"] += len(data)
+        self._deliver()
+        if not self.powered:
+            return
+        now = vmachine.ticks_us()
+        if now < self._ready_us:
+            # Still booting
+            return
+        while data:
+            if self._download is not None:
+                filename, size, received = self._download
+                take = size - len(received)
+                received += data[:take]
+                data = data[take:]
+                self._download[2] = received
+                if len(received) == size:
+                    self.files[filename] = received
+                    self._download = None
+                    self._emit(now + int(self.latency * 1000000), "\r\nOK\r\n")
+                continue
+            end = data.find(b"\r")
+            if end < 0:
+                self._line += data
+                return
+            line, data = self._line + data[:end], data[end + 1 :]
+            self._line = b""
+            line = line.strip(b"\n").decode("utf-8")
+            if line:
+                self._command(line, now)
+
+    def uart_txdone(self) -> bool:
+        return True
+
+    def uart_any(self) -> int:
+        self._deliver()
+        return len(self._received)
+
+    def uart_read(self, nbytes: int = -1) -> bytes:
+        self._deliver()
+        if nbytes < 0 or nbytes > len(self._received):
+            nbytes = len(self._received)
+        data = bytes(self._received[:nbytes])
+        del self._received[:nbytes]
+        return data
+
+
+def install(modem: VirtualModem = None):
+    """
+    Install the virtual machine (and MicroPython compatibility under
+    CPython) and attach the modem to it. Must be called before the modem
+    driver is imported.
+
+    Args:
+        modem (VirtualModem, optional): the modem to attach. A modem can also
+            be attached later with VirtualModem.attach().
+    """
+    vmachine.install()
+    mpcompat.install()
+    if modem is not None:
+        modem.attach()
+
+
+def serve_pty(modem: VirtualModem, poll_interval: float = 0.002) -> str:
+    """
+    Serve the modem on a pseudo-terminal from a background thread (CPython
+    only).
+
+    Args:
+        modem (VirtualModem): the modem to serve.
+        poll_interval (float): interval at which output is sent (s).
+
+    Returns:
+        str: path of the terminal to open, e.g. "/dev/pts/3".
+    """
+    import os
+    import select
+    import threading
+    import tty
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+
+    def serve():
+        while True:
+            readable, _, _ = select.select([master], [], [], poll_interval)
+            if readable:
+                try:
+                    modem.uart_write(os.read(master, 1024))
+                except OSError:
+                    return
+            if modem.uart_any():
+                os.write(master, modem.uart_read())
+
+    threading.Thread(target=serve, daemon=True).start()
+    return path
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Virtual SARA-R4 modem on a pty")
+    parser.add_argument(
+        "--powered", action="store_true", help="start powered-on and registered"
+    )
+    parser.add_argument(
+        "--latency", default=0.02, type=float, help="command latency (s)"
+    )
+    parser.add_argument(
+        "--registration-time",
+        default=2.0,
+        type=float,
+        help="time to register to the network after power-on (s)",
+    )
+    args = parser.parse_args()
+
+    modem = VirtualModem(
+        powered=args.powered,
+        latency=args.latency,
+        registration_time=args.registration_time,
+    )
+    modem.broker.subscribe(
+        lambda client_id, topic, message: print(
+            "{0} published to {1}: {2}".format(client_id, topic, message)
+        )
+    )
+    print("Virtual SARA-R4 modem on {0}".format(serve_pty(modem)))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Exiting.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Virtual SDI-12 bus with scriptable sensors
+
+The bus attaches to the virtual UART and pins (see vmachine.py) that the
+SDI-12 driver (drivers/sdi12.py) uses on the Rev 4.0 board, so that the
+unmodified driver can be run on a host:
+
+    import sdi12bus
+
+    bus = sdi12bus.VirtualBus([sdi12bus.VirtualSensor("1", [1.5, -2.25, 12.0])])
+    sdi12bus.install(bus)
+
+    from drivers import sdi12
+    sdi = sdi12.init_sdi(0)
+
+The bus follows SDI-12 timing: a command is only heard after a break, each
+character takes 8.33 ms at 1200 baud and sensors reply after a turnaround
+delay. Sensors support the acknowledge (a!), identification (aI!), address
+query (?!), measurement (aM!, aMC!), concurrent measurement (aC!, aCC!) and
+data (aD0! to aD9!) commands.
+
+Faults are injected from a seeded pseudo-random sequence, so that a run is
+repeatable. Runs under CPython and the MicroPython unix port.
+"""
+
+import mpcompat
+import vmachine
+
+# Rev 4.0 board connections, see drivers/sdi12.py
+SDI_UART = 2
+SDI_DIR = 21
+SDI_EN = 2
+SDI_FOUT = 25
+
+BYTE_TIME_US = 8333  # one 7E1 character at 1200 baud
+TURNAROUND_US = 10000  # sensors reply 8.33 ms to 15 ms after a command
+BREAK_US = 12000  # minimum break length heard by sensors
+AWAKE_US = 100000  # sensors sleep after 100 ms of marking
+
+
+class VirtualSensor:
+    """
+    A sensor on the virtual bus.
+
+    Args:
+        address (str): SDI-12 address.
+        values: measured values, either a list of floats or a function called
+            with the number of the measurement (from 0) that returns one.
+        measure_time (int): time advertised in the measurement reply (ttt),
+            in seconds.
+        ready_after (float): time after which the measurement is actually
+            complete, in seconds. Defaults to measure_time. A sensor that is
+            ready early sends a service request in reply to aM!.
+        values_per_page (int): number of values returned by each aDn!.
+        decimals (int): decimal places of the values returned.
+        noise (float): amplitude of uniform noise added to the values.
+        drop_rate (float): probability of each character sent being lost.
+        wrong_address_rate (float): probability of a reply carrying a
+            different address.
+        identification (str): reply to aI!, without the address.
+        seed (int): seed of the pseudo-random sequence for noise and faults.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        values,
+        measure_time: int = 1,
+        ready_after: float = None,
+        values_per_page: int = 3,
+        decimals: int = 3,
+        noise: float = 0.0,
+        drop_rate: float = 0.0,
+        wrong_address_rate: float = 0.0,
+        identification: str = "13SIMULATE MODEL1001",
+        seed: int = 1,
+    ):
+        self.address = str(address)
+        self.values = values
+        self.measure_time = measure_time
+        self.ready_after = measure_time if ready_after is None else ready_after
+        self.values_per_page = values_per_page
+        self._format = "{{0:+.{0}f}}".format(decimals)
+        self.noise = noise
+        self.drop_rate = drop_rate
+        self.wrong_address_rate = wrong_address_rate
+        self.identification = identification
+        # Set to False to simulate a disconnected sensor
+        self.connected = True
+        self.measurements = 0
+        self._state = (seed & 0xFFFFFFFF) or 1
+        self._data = None
+        self._ready_us = 0
+        self._standard = False
+
+    def random(self) -> float:
+        """
+        Returns:
+            float: the next number in [0, 1) of the sensor's xorshift sequence.
+        """
+        x = self._state
+        x ^= (x << 13) & 0xFFFFFFFF
+        x ^= x >> 17
+        x ^= (x << 5) & 0xFFFFFFFF
+        self._state = x
+        return x / 4294967296
+
+    def reset(self):
+        """Lose any measurement, as on power off."""
+        self._data = None
+
+    def measuring(self, now_us: int) -> bool:
+        """
+        Returns:
+            bool: True while a measurement started with aM! is in progress.
+        """
+        return self._standard and self._data is not None and now_us < self._ready_us
+
+    def _measure(self) -> list:
+        values = self.values
+        if callable(values):
+            values = values(self.measurements)
+        self.measurements += 1
+        if self.noise:
+            values = [v + self.noise * (2 * self.random() - 1) for v in values]
+        return list(values)
+
+    def _page(self, page: int, now_us: int) -> str:
+        if self._data is None or now_us < self._ready_us:
+            # No data, or data requested before it is ready (which aborts
+            # the measurement)
+            self._data = None
+            return ""
+        start = page * self.values_per_page
+        return "".join(
+            self._format.format(value)
+            for value in self._data[start : start + self.values_per_page]
+        )
+
+    def command(self, body: str, now_us: int) -> list:
+        """
+        Handle a command addressed to this sensor.
+
+        Args:
+            body (str): the command without its address and `!`, e.g. "M".
+            now_us (int): time the command was received, in microseconds.
+
+        Returns:
+            list: (delay in microseconds, reply without address) tuples. The
+            reply to the command itself has no delay; a service request is a
+            delayed empty reply.
+        """
+        if self.measuring(now_us):
+            # Any command aborts a measurement in progress
+            self._data = None
+        if body == "":
+            return [(0, "")]
+        if body == "I":
+            return [(0, self.identification)]
+        if body in ("M", "MC", "C", "CC"):
+            self._data = self._measure()
+            self._ready_us = now_us + int(self.ready_after * 1000000)
+            self._standard = body[0] == "M"
+            if self._standard:
+                replies = [
+                    (0, "{0:03d}{1}".format(self.measure_time, len(self._data) % 10))
+                ]
+                if self.ready_after < self.measure_time:
+                    replies.append((int(self.ready_after * 1000000), ""))
+                return replies
+            return [(0, "{0:03d}{1:02d}".format(self.measure_time, len(self._data)))]
+        if len(body) == 2 and body[0] == "D" and "0" <= body[1] <= "9":
+            return [(0, self._page(int(body[1]), now_us))]
+        # Unsupported commands are not answered
+        return []
+
+    def frame(self, reply: str) -> bytes:
+        """
+        Add the address and terminator to a reply and apply the configured
+        faults.
+
+        Args:
+            reply (str): the reply without address.
+
+        Returns:
+            bytes: the characters sent on the bus.
+        """
+        address = self.address
+        if self.wrong_address_rate and self.random() < self.wrong_address_rate:
+            address = "0" if address != "0" else "1"
+        data = (address + reply + "\r\n").encode("ascii")
+        if self.drop_rate:
+            data = bytes(c for c in data if self.random() >= self.drop_rate)
+        return data
+
+
+class VirtualBus:
+    """
+    SDI-12 bus connecting the data recorder's UART and pins to virtual
+    sensors.
+
+    Args:
+        sensors (list): the VirtualSensors on the bus.
+        byte_time_us (int): time to send one character, in microseconds.
+        turnaround_us (int): delay before a sensor replies, in microseconds.
+    """
+
+    def __init__(
+        self,
+        sensors=(),
+        byte_time_us: int = BYTE_TIME_US,
+        turnaround_us: int = TURNAROUND_US,
+    ):
+        self.sensors = {}
+        for sensor in sensors:
+            self.add_sensor(sensor)
+        self.byte_time_us = byte_time_us
+        self.turnaround_us = turnaround_us
+        # (command, reply) tuples in the order sent, for inspection by tests
+        self.transcript = []
+        self.stats = {"breaks": 0, "commands": 0, "ignored": 0, "replies": 0}
+        self._powered = False
+        self._low_since = None
+        self._awake_until = 0
+        self._tx_end = 0
+        # (time, byte, owner) tuples not yet received by the UART, in time
+        # order. The owner of a service request is its sensor.
+        self._pending = []
+        self._received = bytearray()
+
+    def add_sensor(self, sensor: VirtualSensor):
+        self.sensors[sensor.address] = sensor
+
+    def attach(self):
+        """Connect the bus to the SDI-12 UART and pins of the virtual machine."""
+        vmachine.attach_uart(SDI_UART, self)
+        vmachine.watch_pin(SDI_EN, self._power)
+        vmachine.watch_pin(SDI_FOUT, self._force_out)
+
+    def _power(self, pin_id: int, value: int):
+        self._powered = bool(value)
+        if not self._powered:
+            self._pending = []
+            for sensor in self.sensors.values():
+                sensor.reset()
+
+    def _force_out(self, pin_id: int, value: int):
+        now = vmachine.ticks_us()
+        if not value:
+            self._low_since = now
+        elif self._low_since is not None:
+            if now - self._low_since >= BREAK_US:
+                self.stats["breaks"] += 1
+                self._awake_until = now + AWAKE_US
+            self._low_since = None
+
+    def _send(self, start: int, data: bytes, owner=None) -> int:
+        for i, byte in enumerate(data):
+            self._pending.append((start + (i + 1) * self.byte_time_us, byte, owner))
+        self._pending.sort(key=lambda entry: entry[0])
+        return start + len(data) * self.byte_time_us
+
+    def _command(self, command: str, now: int):
+        self.stats["commands"] += 1
+        if not self._powered or now > self._awake_until:
+            # Sensors are off or asleep
+            self.stats["ignored"] += 1
+            self.transcript.append((command, None))
+            return
+        if command == "?!":
+            sensors = list(self.sensors.values())[:1]
+            body = ""
+        else:
+            sensor = self.sensors.get(command[0])
+            sensors = [sensor] if sensor and command.endswith("!") else []
+            body = command[1:-1]
+        start = self._tx_end + self.turnaround_us
+        reply = None
+        for sensor in sensors:
+            if not sensor.connected:
+                continue
+            if sensor.measuring(now):
+                # Drop the service request of the aborted measurement
+                self._pending = [e for e in self._pending if e[2] is not sensor]
+            for delay, text in sensor.command(body, now):
+                data = sensor.frame(text)
+                if delay:
+                    self._send(start + delay, data, sensor)
+                else:
+                    reply = data
+                    end = self._send(start, data)
+                    self._awake_until = end + AWAKE_US
+                    self.stats["replies"] += 1
+        self.transcript.append((command, reply))
+
+    def _deliver(self):
+        now = vmachine.ticks_us()
+        due = 0
+        while due < len(self._pending) and self._pending[due][0] <= now:
+            self._received.append(self._pending[due][1])
+            due += 1
+        if due:
+            del self._pending[:due]
+
+    # UART device interface, see vmachine.attach_uart()
+
+    def uart_write(self, data: bytes):
+        now = vmachine.ticks_us()
+        self._tx_end = max(now, self._tx_end) + len(data) * self.byte_time_us
+        try:
+            command = data.decode("ascii")
+        except UnicodeError:
+            return
+        self._command(command, now)
+
+    def uart_txdone(self) -> bool:
+        return vmachine.ticks_us() >= self._tx_end
+
+    def uart_any(self) -> int:
+        self._deliver()
+        return len(self._received)
+
+    def uart_read(self, nbytes: int = -1) -> bytes:
+        self._deliver()
+        if nbytes < 0 or nbytes > len(self._received):
+            nbytes = len(self._received)
+        data = bytes(self._received[:nbytes])
+        del self._received[:nbytes]
+        return data
+
+
+def install(bus: VirtualBus = None):
+    """
+    Install the virtual machine (and MicroPython compatibility under
+    CPython) and attach the bus to it. Must be called before the SDI-12
+    driver is imported.
+
+    Args:
+        bus (VirtualBus, optional): the bus to attach. A bus can also be
+            attached later with VirtualBus.attach().
+    """
+    vmachine.install()
+    mpcompat.install()
+    if bus is not None:
+        bus.attach()
@@ -0,0 +1,252 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Virtual Rev 4.0 board peripherals, other than the SDI-12 bus and the modem
+
+- RainGauge: the 74HC590 tip counter read through the PCF8574A I/O
+  expander, which drivers/counter.py reads with the unmodified
+  `lib/pcf8574.py`.
+- ExternalRTC: the DS1307 real time clock read by drivers/rtc.py with the
+  unmodified `lib/ds1307.py`.
+- Stand-ins for the `esp32` and `network` modules, and a `threading` module
+  whose threads run until they first sleep.
+
+CPython only, see vdevice.py.
+"""
+
+import sys
+import time
+
+import vmachine
+
+# Rev 4.0 board connections, see drivers/counter.py and drivers/rtc.py
+RAIN_GAUGE_ADDRESS = 0x38
+RAIN_CLK = 5
+RAIN_CE = 6
+RAIN_RESET = 7
+RTC_ADDRESS = 0x68
+
+
+def _bcd(value: int) -> int:
+    return (value // 10) << 4 | (value % 10)
+
+
+def _dec(value: int) -> int:
+    return (value >> 4) * 10 + (value & 0x0F)
+
+
+class RainGauge:
+    """
+    Tipping bucket rain gauge counter.
+
+    The counter and output register clocks are connected, as on the Rev 4.0
+    board: each clock pulse, from a tip or from the RAIN_CLK pin, stores the
+    count in the output register and then increments it. The lower 6 bits of
+    the output register are read on the expander's P0 to P5.
+
+    Attributes:
+        tips (int): number of tips so far, whether counted or not.
+    """
+
+    def __init__(self):
+        self.tips = 0
+        self._count = 0
+        self._register = 0
+        self._port = 0xFF
+
+    def attach(self):
+        """Connect the counter to the I2C bus and the RAIN_CLK pin."""
+        vmachine.attach_i2c(RAIN_GAUGE_ADDRESS, self)
+        vmachine.watch_pin(RAIN_CLK, self._clock_pin)
+
+    def tip(self, count: int = 1):
+        """Tip the bucket, counted if the counter is enabled."""
+        for _ in range(count):
+            self.tips += 1
+            if not self._port & (1 << RAIN_CE):
+                self._clock()
+
+    def _clock(self):
+        self._register = self._count
+        self._count = (self._count + 1) & 0xFF
+
+    def _clock_pin(self, pin_id: int, value: int):
+        if value:
+            self._clock()
+
+    # I2C device interface, see vmachine.attach_i2c()
+
+    def i2c_write(self, data: bytes):
+        self._port = data[-1]
+        if not self._port & (1 << RAIN_RESET):
+            self._count = 0
+
+    def i2c_read(self, nbytes: int) -> bytes:
+        return bytes([(self._register & 0x3F) | (self._port & 0xC0)]) * nbytes
+
+
+class ExternalRTC:
+    """
+    DS1307 real time clock, running at the rate of the `time` module.
+
+    Args:
+        offset (int): difference of the clock from time.time() (s).
+    """
+
+    def __init__(self, offset: int = 0):
+        self.offset = offset
+        self._pointer = 0
+        self._ram = bytearray(56)
+
+    def attach(self):
+        vmachine.attach_i2c(RTC_ADDRESS, self)
+
+    def _registers(self) -> bytearray:
+        now = time.localtime(time.time() + self.offset)
+        return bytearray(
+            [
+                _bcd(now[5]),
+                _bcd(now[4]),
+                _bcd(now[3]),
+                _bcd(now[6] + 1),
+                _bcd(now[2]),
+                _bcd(now[1]),
+                _bcd(now[0] - 2000),
+                0,
+            ]
+        )
+
+    # I2C device interface, see vmachine.attach_i2c()
+
+    def i2c_write(self, data: bytes):
+        self._pointer = data[0]
+        data = data[1:]
+        if self._pointer == 0 and len(data) >= 7:
+            seconds = time.mktime(
+                (
+                    _dec(data[6]) + 2000,
+                    _dec(data[5]),
+                    _dec(data[4]),
+                    _dec(data[2]),
+                    _dec(data[1]),
+                    _dec(data[0] & 0x7F),
+                    0,
+                    0,
+                )
+            )
+            self.offset = seconds - time.time()
+        elif self._pointer >= 8:
+            start = self._pointer - 8
+            self._ram[start : start + len(data)] = data
+
+    def i2c_read(self, nbytes: int) -> bytes:
+        memory = self._registers() + self._ram
+        return bytes(memory[self._pointer : self._pointer + nbytes])
+
+
+class _Parked(BaseException):
+    """Ends a thread started with Thread.start() when it sleeps."""
+
+
+class Thread:
+    """
+    threading.Thread stand-in. start() runs the target until it first calls
+    time.sleep(), so that a run is repeatable; the thread is not resumed.
+    """
+
+    def __init__(self, group=None, target=None, name=None, args=(), kwargs=None):
+        self.target = target
+        self.args = args
+        self.kwargs = {} if kwargs is None else kwargs
+        self.daemon = False
+
+    def start(self):
+        def park(seconds):
+            raise _Parked()
+
+        sleep = time.sleep
+        time.sleep = park
+        try:
+            self.run()
+        except _Parked:
+            pass
+        finally:
+            time.sleep = sleep
+
+    def run(self):
+        self.target(*self.args, **self.kwargs)
+
+
+class WLAN:
+    """network.WLAN stand-in, for an interface that never connects."""
+
+    def __init__(self, interface_id=0):
+        self.interface_id = interface_id
+        self._active = False
+        self._config = {}
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        return None
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config.get(args[0])
+        self._config.update(kwargs)
+        return None
+
+    def connect(self, ssid=None, password=None, **kwargs):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def isconnected(self) -> bool:
+        return False
+
+    def scan(self) -> list:
+        return []
+
+    def ifconfig(self, *args):
+        return ("192.168.4.1", "255.255.255.0", "192.168.4.1", "0.0.0.0")
+
+
+def _module(name: str, **attributes):
+    module = type(sys)(name)
+    for key, value in attributes.items():
+        setattr(module, key, value)
+    return module
+
+
+# Stand-ins for modules of the ESP32 port used by the firmware
+esp32 = _module(
+    "esp32",
+    WAKEUP_ALL_LOW=False,
+    WAKEUP_ANY_HIGH=True,
+    wake_on_ext0=lambda pin, level: None,
+    wake_on_ext1=lambda pins, level: None,
+)
+network = _module("network", STA_IF=0, AP_IF=1, AUTH_OPEN=0, AUTH_WPA2_PSK=3, WLAN=WLAN)
+threading = _module("threading", Thread=Thread)
+
+
+def install():
+    """Provide the `esp32` and `network` modules."""
+    sys.modules["esp32"] = esp32
+    sys.modules["network"] = network
@@ -0,0 +1,143 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Virtual clock for running the data recorder firmware faster than real time
+
+install() replaces the functions of the `time` module with ones that read
+and advance a VirtualClock, so that sleeps, timeouts and deep sleeps take no
+host time:
+
+- time.time() returns whole seconds, as on the ESP32 port, and
+  time.localtime(), time.gmtime() and time.monotonic() follow the clock.
+- time.sleep(), time.sleep_ms() and time.sleep_us() advance the clock.
+- time.ticks_ms() and time.ticks_us() count from the last
+  VirtualClock.reset_ticks(), as they count from reset on the ESP32.
+- time.mktime() also accepts the MicroPython 8-tuple.
+- asyncio event loops created with mpcompat.get_event_loop() advance the
+  clock to the next timer when no task is ready, instead of waiting.
+
+The clock only moves when the firmware waits, so the times measured are
+those of the emulated peripherals and not of the host's processing. CPython
+only.
+"""
+
+import asyncio
+import selectors
+import time
+
+import mpcompat
+
+_real_time = time.time
+_real_localtime = time.localtime
+_real_gmtime = time.gmtime
+_real_mktime = time.mktime
+
+
+class VirtualClock:
+    """
+    Args:
+        start (float): time of the clock in seconds since the epoch.
+            Defaults to the host's time.
+    """
+
+    def __init__(self, start: float = None):
+        self._start = int(_real_time() if start is None else start)
+        self._us = 0
+        self._reset_us = 0
+
+    def ticks_us(self) -> int:
+        """
+        Returns:
+            int: microseconds since the clock was created or its ticks were
+            last reset.
+        """
+        return self._us - self._reset_us
+
+    def reset_ticks(self):
+        """Restart the ticks from 0, as on a reset of the ESP32."""
+        self._reset_us = self._us
+
+    def monotonic(self) -> float:
+        return self._us / 1000000
+
+    def time(self) -> float:
+        """
+        Returns:
+            float: the time in seconds since the epoch.
+        """
+        return self._start + self._us / 1000000
+
+    def advance(self, seconds: float):
+        if seconds > 0:
+            self._us += int(seconds * 1000000 + 0.5)
+
+
+class _Selector:
+    """
+    Selector of an event loop on a virtual clock: waits for I/O are replaced
+    by advancing the clock by the time until the next timer.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        self._clock = clock
+        self._selector = selectors.DefaultSelector()
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if not events:
+            if timeout is None:
+                # Nothing will ever become ready
+                raise RuntimeError("Event loop has no tasks or timers to wait for")
+            self._clock.advance(timeout)
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+def _mktime(timetuple) -> int:
+    timetuple = tuple(timetuple)
+    if len(timetuple) == 8:
+        timetuple += (-1,)
+    return int(_real_mktime(timetuple))
+
+
+def install(clock: VirtualClock) -> VirtualClock:
+    """
+    Run the `time` module and the event loops of mpcompat.get_event_loop()
+    on a virtual clock. Call after mpcompat.install().
+
+    Args:
+        clock (VirtualClock): the clock.
+
+    Returns:
+        VirtualClock: the clock.
+    """
+    time.time = lambda: int(clock.time())
+    time.monotonic = clock.monotonic
+    time.localtime = lambda secs=None: _real_localtime(
+        clock.time() if secs is None else secs
+    )
+    time.gmtime = lambda secs=None: _real_gmtime(clock.time() if secs is None else secs)
+    time.mktime = _mktime
+    time.sleep = clock.advance
+    time.sleep_ms = lambda ms: clock.advance(ms / 1000)
+    time.sleep_us = lambda us: clock.advance(us / 1000000)
+    time.ticks_us = clock.ticks_us
+    time.ticks_ms = lambda: clock.ticks_us() // 1000
+    mpcompat.loop_factory = lambda: asyncio.SelectorEventLoop(_Selector(clock))
+    return clock
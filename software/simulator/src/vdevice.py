@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Whole-device emulation: wake cycles of the unmodified firmware under CPython
+
+A VirtualDevice is the Rev 4.0 data recorder with its peripherals emulated
+(the SDI-12 bus, the SARA-R4 modem, the rain gauge counter and the DS1307)
+and its flash file system and SD card kept in a host directory. wake() runs
+`main.py` from a reset to its deep sleep, as on the device: the firmware's
+modules are imported afresh, RTC memory, the file systems and the
+peripherals are kept, and the virtual clock then advances by the time slept.
+
+The firmware is imported from the source tree with builtins of its own, in
+which `open()`, `print()` and the imports of `os`, `sys`, `threading` and
+the modules of `lib/` refer to the virtual device, so the host's modules
+are not affected. Time is virtual (see vclock.py), so a day of wakes takes
+seconds to run, and the times reported are those of the emulated
+peripherals and of the firmware's own waits.
+
+Each wake reports the time spent in a set of phases (see PHASES), the bytes
+written to the SD card and the bytes sent to the modem and over the
+network. Run from the repository top level:
+
+    python software/simulator/src/vdevice.py --wakes 24
+"""
+
+import __future__
+import ast
+import builtins
+import errno
+import functools
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import inspect
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+import warnings
+
+SIMULATOR_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.normpath(os.path.join(SIMULATOR_DIR, "../../device/embedded/src"))
+
+sys.path.insert(0, SIMULATOR_DIR)
+
+import mpcompat
+import sara_r4
+import sdi12bus
+import vboard
+import vclock
+import vfs
+import vmachine
+
+# Top-level packages and modules of the firmware
+FIRMWARE_PACKAGES = ("main", "drivers", "services", "util", "lib")
+# Modules of lib/ that the firmware imports by their top-level name
+LIB_MODULES = ("aswitch", "ds1307", "logging", "pcf8574", "urequests")
+
+# Phases timed in each wake: name, module and function or method. A phase
+# can be entered more than once, and phases can overlap.
+PHASES = (
+    ("sd setup", "drivers.sdcard", "setup"),
+    ("rain gauge", "drivers.counter", "Counter.get_rainfall"),
+    ("pipeline", "__main__", "pipeline"),
+    ("sensors", "drivers.sdi12", "read_sensor"),
+    ("modem up", "drivers.modem", "Modem.initialise"),
+    ("modem up", "drivers.modem", "Modem.initialise_async"),
+    ("time sync", "__main__", "sync_time"),
+    ("telemetry", "drivers.sdcard", "save_telemetry"),
+    ("transmit", "__main__", "transmit"),
+    ("drain", "__main__", "drain_backlog"),
+    ("modem off", "drivers.modem", "Modem.power_off"),
+)
+
+_import = builtins.__import__
+# MicroPython does not evaluate annotations
+_COMPILE_FLAGS = __future__.annotations.compiler_flag
+
+
+# lib/aswitch.py creates a coroutine to get its type
+warnings.filterwarnings("ignore", "coroutine '_g' was never awaited", RuntimeWarning)
+
+
+def _compile(source, path: str):
+    with warnings.catch_warnings():
+        # e.g. `is` with a literal, which MicroPython accepts silently
+        warnings.simplefilter("ignore", SyntaxWarning)
+        return compile(source, path, "exec", _COMPILE_FLAGS)
+
+
+def _module(name: str, **attributes):
+    module = type(sys)(name)
+    for key, value in attributes.items():
+        setattr(module, key, value)
+    return module
+
+
+class Profile:
+    """
+    Time spent in the phases of a wake, on the virtual clock.
+
+    Attributes:
+        start_us (int): time the wake started (us).
+        phases (dict): phase name -> [calls, time (us)].
+    """
+
+    def __init__(self, clock: vclock.VirtualClock):
+        self.clock = clock
+        self.start_us = clock.ticks_us()
+        self.phases = {}
+
+    def record(self, phase: str, start_us: int):
+        entry = self.phases.setdefault(phase, [0, 0])
+        entry[0] += 1
+        entry[1] += self.clock.ticks_us() - start_us
+
+    def timed(self, phase: str, function):
+        """
+        Returns:
+            a wrapper of a function or coroutine function that records the
+            time spent in it.
+        """
+        if getattr(function, "_phase", None):
+            return function
+        if inspect.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                start = self.clock.ticks_us()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.record(phase, start)
+
+        else:
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = self.clock.ticks_us()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(phase, start)
+
+        wrapper._phase = phase
+        return wrapper
+
+    def instrument(self, module):
+        """Wrap the functions of a module that are in PHASES."""
+        for phase, module_name, attribute in PHASES:
+            if module_name != module.__name__:
+                continue
+            owner = module
+            path = attribute.split(".")
+            for name in path[:-1]:
+                owner = getattr(owner, name)
+            if hasattr(owner, path[-1]):
+                setattr(owner, path[-1], self.timed(phase, getattr(owner, path[-1])))
+
+
+class _Loader(importlib.machinery.SourceFileLoader):
+    """Executes a firmware module with the firmware's builtins."""
+
+    def __init__(self, fullname: str, path: str, firmware):
+        super().__init__(fullname, path)
+        self.firmware = firmware
+
+    def get_code(self, fullname):
+        # Compiled afresh, as the bytecode cached by CPython evaluates
+        # annotations
+        return _compile(self.get_data(self.path), self.path)
+
+    def exec_module(self, module):
+        module.__builtins__ = self.firmware.builtins
+        super().exec_module(module)
+        if self.firmware.profile is not None:
+            self.firmware.profile.instrument(module)
+
+
+class Firmware(importlib.abc.MetaPathFinder):
+    """
+    Imports the firmware from the source tree, with builtins that refer to
+    the virtual device. Installed on `sys.meta_path` by VirtualDevice.
+
+    Args:
+        filesystem (vfs.VirtualFilesystem): the device's file systems.
+        console: stream written to by print() and the firmware's logging.
+        src_dir (str): the firmware source directory.
+    """
+
+    def __init__(self, filesystem: vfs.VirtualFilesystem, console, src_dir=SRC_DIR):
+        self.src_dir = src_dir
+        self.profile = None
+        self.aliases = {
+            # The fast_io uasyncio, as provided by mpcompat.install()
+            "asyncio": sys.modules["uasyncio"],
+            "os": filesystem.os,
+            "uos": filesystem.os,
+            "sys": _module("sys", **dict(vars(sys), stdout=console, stderr=console)),
+            "threading": vboard.threading,
+            "uerrno": errno,
+            "ujson": json,
+            "usocket": socket,
+        }
+        self.builtins = dict(vars(builtins))
+        self.builtins.update(
+            open=filesystem.open,
+            print=functools.partial(print, file=console),
+            __import__=self._import,
+        )
+        self._lib = {}
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname.split(".")[0] not in FIRMWARE_PACKAGES:
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(
+            fullname, path or [self.src_dir]
+        )
+        if spec is not None and isinstance(
+            spec.loader, importlib.machinery.SourceFileLoader
+        ):
+            spec.loader = _Loader(fullname, spec.origin, self)
+        return spec
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0:
+            if name in self.aliases:
+                return self.aliases[name]
+            if name in LIB_MODULES:
+                return self._load_lib(name)
+        return _import(name, globals, locals, fromlist, level)
+
+    def _load_lib(self, name: str):
+        module = self._lib.get(name)
+        if module is not None:
+            return module
+        path = os.path.join(self.src_dir, "lib", name + ".py")
+        search = None
+        if not os.path.exists(path):
+            search = [os.path.join(self.src_dir, "lib", name)]
+            path = os.path.join(search[0], "__init__.py")
+        spec = importlib.util.spec_from_file_location(
+            name,
+            path,
+            loader=_Loader(name, path, self),
+            submodule_search_locations=search,
+        )
+        module = importlib.util.module_from_spec(spec)
+        self._lib[name] = module
+        spec.loader.exec_module(module)
+        return module
+
+    def reset(self):
+        """Forget the imported modules, as on a reset."""
+        for name in list(sys.modules):
+            if name.split(".")[0] in FIRMWARE_PACKAGES:
+                del sys.modules[name]
+        self._lib.clear()
+
+    def run_main(self, overrides: dict = None):
+        """
+        Run `main.py` as the device does after boot.py. The time until the
+        main program (the final `if __name__ == "__main__":` block) is
+        entered is recorded as the "boot" phase.
+
+        Args:
+            overrides (dict): global variables of main.py to set before the
+                main program is entered, e.g. {"PRODUCTION": True}.
+        """
+        path = os.path.join(self.src_dir, "main.py")
+        with open(path) as f_in:
+            tree = ast.parse(f_in.read(), path)
+        body, program = tree.body, []
+        if isinstance(body[-1], ast.If) and "__main__" in ast.unparse(body[-1].test):
+            body, program = body[:-1], body[-1:]
+        module = _module("__main__", __file__=path, __builtins__=self.builtins)
+        exec(_compile(ast.Module(body, []), path), vars(module))
+        vars(module).update(overrides or {})
+        if self.profile is not None:
+            self.profile.instrument(module)
+            self.profile.record("boot", self.profile.start_us)
+        exec(_compile(ast.Module(program, []), path), vars(module))
+
+
+def default_config() -> dict:
+    """
+    Returns:
+        dict: the example device configuration, with the water sensor read
+        every 10 minutes.
+    """
+    with open(os.path.join(SRC_DIR, "services/config.example.json")) as f_in:
+        config = json.load(f_in)
+    config["device_name"] = "virtual-device"
+    config["device_id"] = "virtual-device"
+    return config
+
+
+def default_sensors() -> list:
+    """
+    Returns:
+        list: the VirtualSensors of default_config().
+    """
+    return [sdi12bus.VirtualSensor("1", [0.125, 14.37, 12.1], noise=0.01)]
+
+
+class VirtualDevice:
+    """
+    The data recorder, running the firmware on emulated hardware.
+
+    Args:
+        root (str): host directory for the flash file system and the SD card.
+            A temporary directory is used if not given.
+        config (dict): device configuration, written to the flash file system.
+            Defaults to default_config().
+        sensors (list): VirtualSensors on the SDI-12 bus. Defaults to
+            default_sensors().
+        production (bool): set `PRODUCTION` in main.py, which skips the
+            console's delays before deep sleep.
+        start (float): time of the first wake, in seconds since the epoch.
+        console: stream for the firmware's console output. Discarded if not
+            given.
+
+    Attributes:
+        clock (vclock.VirtualClock): the virtual clock.
+        fs (vfs.VirtualFilesystem): the flash file system and SD card.
+        bus (sdi12bus.VirtualBus): the SDI-12 bus.
+        modem (sara_r4.VirtualModem): the modem.
+        rain_gauge (vboard.RainGauge): the rain gauge counter.
+        rtc (vboard.ExternalRTC): the DS1307 real time clock.
+        wakes (list): the results of wake(), in order.
+    """
+
+    def __init__(
+        self,
+        root: str = None,
+        config: dict = None,
+        sensors: list = None,
+        production: bool = True,
+        start: float = None,
+        console=None,
+    ):
+        if root is None:
+            self._tempdir = tempfile.TemporaryDirectory(prefix="vdevice-")
+            root = self._tempdir.name
+        vmachine.install()
+        mpcompat.install()
+        vboard.install()
+        self.clock = vclock.install(vclock.VirtualClock(start))
+        vmachine.reset_devices()
+        self.fs = vfs.VirtualFilesystem(root)
+        vmachine.insert_sd_card(os.path.join(root, "sd"))
+        self.bus = sdi12bus.VirtualBus(
+            default_sensors() if sensors is None else sensors
+        )
+        self.modem = sara_r4.VirtualModem()
+        self.rain_gauge = vboard.RainGauge()
+        self.rtc = vboard.ExternalRTC()
+        for device in (self.bus, self.modem, self.rain_gauge, self.rtc):
+            device.attach()
+        self.production = production
+        self.firmware = Firmware(
+            self.fs, console if console is not None else io.StringIO()
+        )
+        if self.firmware not in sys.meta_path:
+            sys.meta_path.insert(0, self.firmware)
+        self.wakes = []
+        self._provision(default_config() if config is None else config)
+
+    def _provision(self, config: dict):
+        """Write the configuration and the initial device data, as provision.py does."""
+        self._write("/services/config.json", config)
+        with open(os.path.join(SRC_DIR, "services/data.example.json")) as f_in:
+            self._write("/sd/services/data.json", json.load(f_in))
+
+    def _write(self, path: str, data: dict):
+        host_path = (
+            os.path.join(vmachine.SDCard().path, path[len("/sd/") :])
+            if path.startswith("/sd/")
+            else self.fs.host_path(path)
+        )
+        os.makedirs(os.path.dirname(host_path), exist_ok=True)
+        with open(host_path, "w") as f_out:
+            json.dump(data, f_out)
+
+    def close(self):
+        if self.firmware in sys.meta_path:
+            sys.meta_path.remove(self.firmware)
+        self.firmware.reset()
+        self.fs.reset()
+
+    def wake(self) -> dict:
+        """
+        Run the firmware from a reset to its deep sleep, then advance the
+        clock by the time slept. The first wake is from power-on, the others
+        are timer wakes from deep sleep.
+
+        Returns:
+            dict: the time of the wake ("time"), the time awake ("awake") and
+            asleep ("sleep") (s), the time in each phase ("phases", phase ->
+            [calls, time (s)]), the bytes written to the SD card ("sd_bytes")
+            and to the modem ("modem_bytes"), the bytes sent over the network
+            ("sent_bytes") and the number of MQTT messages ("messages").
+        """
+        if self.wakes:
+            vmachine.set_wake(vmachine.TIMER_WAKE, vmachine.DEEPSLEEP_RESET)
+        else:
+            vmachine.set_wake(0, vmachine.PWRON_RESET)
+        self.fs.reset()
+        self.fs.reset_stats()
+        for key in self.modem.stats:
+            self.modem.stats[key] = 0
+        messages = len(self.modem.broker.messages)
+        wake_time = self.clock.time()
+        self.clock.reset_ticks()
+        profile = self.firmware.profile = Profile(self.clock)
+
+        self.firmware.reset()
+        try:
+            self.firmware.run_main({"PRODUCTION": True} if self.production else None)
+            raise RuntimeError("main.py returned without deep sleeping")
+        except vmachine.DeepSleep as sleep:
+            sleep_s = (sleep.time_ms or 0) / 1000
+        finally:
+            mpcompat.close_event_loop()
+
+        result = {
+            "time": wake_time,
+            "awake": (self.clock.ticks_us() - profile.start_us) / 1000000,
+            "sleep": sleep_s,
+            "phases": {
+                phase: [calls, us / 1000000]
+                for phase, (calls, us) in profile.phases.items()
+            },
+            "sd_bytes": sum(
+                stats["written"]
+                for volume, stats in self.fs.stats.items()
+                if volume != "/"
+            ),
+            "flash_bytes": self.fs.stats["/"]["written"],
+            "modem_bytes": self.modem.stats["uart_bytes"],
+            "sent_bytes": self.modem.stats["sent_bytes"],
+            "messages": len(self.modem.broker.messages) - messages,
+        }
+        self.wakes.append(result)
+        self.clock.advance(sleep_s)
+        return result
+
+
+def report(wakes: list, out=sys.stdout):
+    """Print the results of VirtualDevice.wake() and a summary of the phases."""
+    out.write(
+        " wake  time                 awake s   sleep s  SD bytes  modem bytes  "
+        "sent bytes  messages\n"
+    )
+    for i, wake in enumerate(wakes):
+        out.write(
+            "{0:5d}  {1:19s}  {2:7.2f}  {3:8.1f}  {4:8d}  {5:11d}  {6:10d}  "
+            "{7:8d}\n".format(
+                i + 1,
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(wake["time"])),
+                wake["awake"],
+                wake["sleep"],
+                wake["sd_bytes"],
+                wake["modem_bytes"],
+                wake["sent_bytes"],
+                wake["messages"],
+            )
+        )
+
+    phases = {}
+    for wake in wakes:
+        for phase, (calls, seconds) in wake["phases"].items():
+            entry = phases.setdefault(phase, [0, 0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += calls
+            entry[2] += seconds
+            entry[3] = max(entry[3], seconds)
+    out.write("\nphase          wakes  calls   mean s    max s\n")
+    for phase, (count, calls, total, longest) in phases.items():
+        out.write(
+            "{0:12s}  {1:6d} {2:6d} {3:8.3f} {4:8.3f}\n".format(
+                phase, count, calls, total / count, longest
+            )
+        )
+    out.write(
+        "\n{0} wakes, {1:.1f} s awake, {2} SD bytes, {3} modem bytes, "
+        "{4} bytes sent\n".format(
+            len(wakes),
+            sum(wake["awake"] for wake in wakes),
+            sum(wake["sd_bytes"] for wake in wakes),
+            sum(wake["modem_bytes"] for wake in wakes),
+            sum(wake["sent_bytes"] for wake in wakes),
+        )
+    )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Run wake cycles of the data recorder firmware on emulated hardware"
+    )
+    parser.add_argument("--wakes", default=12, type=int, help="number of wakes")
+    parser.add_argument(
+        "--rain", default=0.0, type=float, help="rain gauge tips per hour"
+    )
+    parser.add_argument(
+        "--development",
+        action="store_true",
+        help="run with PRODUCTION = False, as set in main.py",
+    )
+    parser.add_argument(
+        "--keep",
+        metavar="DIR",
+        help="keep the flash and SD card files in a directory",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="show the firmware's console output"
+    )
+    args = parser.parse_args()
+
+    device = VirtualDevice(
+        root=args.keep,
+        production=not args.development,
+        console=sys.stdout if args.verbose else None,
+    )
+    cpu_start = time.process_time()
+    tips = 0.0
+    for _ in range(args.wakes):
+        device.wake()
+        tips += args.rain * device.wakes[-1]["sleep"] / 3600
+        device.rain_gauge.tip(int(tips))
+        tips -= int(tips)
+    device.close()
+    report(device.wakes)
+    print("Host CPU time {0:.2f} s".format(time.process_time() - cpu_start))
+
+
+if __name__ == "__main__":
+    main()
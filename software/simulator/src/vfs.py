@@ -0,0 +1,232 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Virtual file system of the data recorder, kept in a host directory
+
+The firmware uses absolute paths such as `/services/config.json` and
+`/sd/datalog.csv`. A VirtualFilesystem maps them into a host directory: the
+flash file system is the `flash` subdirectory and cards are mounted with
+`os.mount()` from the card's directory (see vmachine.insert_sd_card()).
+
+The firmware is given the file system's `os` module and `open()` (see
+vdevice.py), which count the bytes read and written on each volume.
+MicroPython's `os` functions are provided: listdir(), stat(), mkdir(),
+rmdir(), remove(), rename(), chdir(), getcwd(), statvfs(), mount() and
+umount(). stat() returns the MicroPython tuple, in which the mode is
+0x4000 for a directory and 0x8000 for a file. CPython only.
+"""
+
+import builtins
+import os
+import posixpath
+import sys
+import weakref
+
+# Capacity reported by statvfs() for each volume (bytes)
+FLASH_SIZE = 2 * 1024 * 1024
+SD_CARD_SIZE = 16 * 1000**3
+BLOCK_SIZE = 4096
+
+_DIR = 0x4000
+_FILE = 0x8000
+_ENODEV = 19
+
+
+def _dir_size(path: str) -> int:
+    size = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(directory, name))
+    return size
+
+
+class _File:
+    """A file opened on the virtual file system, counting the bytes transferred."""
+
+    def __init__(self, file, stats: dict):
+        self._file = file
+        self._stats = stats
+
+    def _count(self, key: str, data):
+        if data:
+            self._stats[key] += len(
+                data.encode("utf-8") if isinstance(data, str) else data
+            )
+        return data
+
+    def read(self, *args):
+        return self._count("read", self._file.read(*args))
+
+    def readline(self, *args):
+        return self._count("read", self._file.readline(*args))
+
+    def write(self, data) -> int:
+        self._count("written", data)
+        self._stats["writes"] += 1
+        return self._file.write(data)
+
+    def __iter__(self):
+        for line in self._file:
+            yield self._count("read", line)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class VirtualFilesystem:
+    """
+    Args:
+        root (str): host directory holding the flash file system.
+
+    Attributes:
+        stats (dict): mount point ("/" for the flash file system) -> dict of
+            the bytes "read" and "written", the number of "writes" and of
+            files "opened" on the volume.
+    """
+
+    def __init__(self, root: str):
+        self.flash = os.path.join(root, "flash")
+        os.makedirs(self.flash, exist_ok=True)
+        self.mounts = {}
+        self.cwd = "/"
+        self.stats = {}
+        self._new_stats("/")
+        self._files = weakref.WeakSet()
+        self.os = type(sys)("os")
+        for name in (
+            "listdir",
+            "stat",
+            "mkdir",
+            "rmdir",
+            "remove",
+            "rename",
+            "chdir",
+            "getcwd",
+            "statvfs",
+            "mount",
+            "umount",
+        ):
+            setattr(self.os, name, getattr(self, name))
+        self.os.sep = "/"
+
+    def _new_stats(self, volume: str):
+        self.stats[volume] = {"read": 0, "written": 0, "writes": 0, "opened": 0}
+
+    def reset_stats(self):
+        for volume in self.stats:
+            self._new_stats(volume)
+
+    def _path(self, path: str) -> str:
+        path = posixpath.normpath(posixpath.join(self.cwd, path or "."))
+        return "/" + path.lstrip("/")
+
+    def _resolve(self, path: str) -> tuple:
+        path = self._path(path)
+        for point in sorted(self.mounts, key=len, reverse=True):
+            if path == point or path.startswith(point + "/"):
+                return point, self.mounts[point] + path[len(point) :]
+        return "/", self.flash + (path if path != "/" else "")
+
+    def host_path(self, path: str) -> str:
+        """
+        Returns:
+            str: the host path of a path on the device.
+        """
+        return self._resolve(path)[1]
+
+    def open(self, path, mode="r", *args, **kwargs):
+        volume, host_path = self._resolve(path)
+        self.stats[volume]["opened"] += 1
+        file = _File(
+            builtins.open(host_path, mode, *args, **kwargs), self.stats[volume]
+        )
+        self._files.add(file)
+        return file
+
+    def reset(self):
+        """Close the files left open and unmount all cards, as on a reset."""
+        for file in list(self._files):
+            file.close()
+        self._files = weakref.WeakSet()
+        self.mounts.clear()
+        self.cwd = "/"
+
+    def listdir(self, path: str = "") -> list:
+        path = self._path(path)
+        names = os.listdir(self._resolve(path)[1])
+        for point in self.mounts:
+            if posixpath.dirname(point) == path:
+                names.append(posixpath.basename(point))
+        return names
+
+    def stat(self, path: str) -> tuple:
+        if self._path(path) in self.mounts:
+            return (_DIR, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        host_path = self._resolve(path)[1]
+        st = os.stat(host_path)
+        mode = _DIR if os.path.isdir(host_path) else _FILE
+        mtime = int(st.st_mtime)
+        return (mode, 0, 0, 0, 0, 0, st.st_size, mtime, mtime, mtime)
+
+    def mkdir(self, path: str):
+        os.mkdir(self._resolve(path)[1])
+
+    def rmdir(self, path: str):
+        os.rmdir(self._resolve(path)[1])
+
+    def remove(self, path: str):
+        os.remove(self._resolve(path)[1])
+
+    def rename(self, old_path: str, new_path: str):
+        os.rename(self._resolve(old_path)[1], self._resolve(new_path)[1])
+
+    def chdir(self, path: str):
+        if not os.path.isdir(self._resolve(path)[1]):
+            raise OSError(2, "No such directory", path)
+        self.cwd = self._path(path)
+
+    def getcwd(self) -> str:
+        return self.cwd
+
+    def statvfs(self, path: str) -> tuple:
+        volume, _ = self._resolve(path)
+        host_root = self.mounts.get(volume, self.flash)
+        size = SD_CARD_SIZE if volume != "/" else FLASH_SIZE
+        blocks = size // BLOCK_SIZE
+        free = blocks - (_dir_size(host_root) + BLOCK_SIZE - 1) // BLOCK_SIZE
+        return (BLOCK_SIZE, BLOCK_SIZE, blocks, free, free, 0, 0, 0, 0, 255)
+
+    def mount(self, device, mount_point: str, readonly=False):
+        host_root = getattr(device, "path", None)
+        if host_root is None:
+            raise OSError(_ENODEV)
+        os.makedirs(host_root, exist_ok=True)
+        mount_point = self._path(mount_point)
+        self.mounts[mount_point] = host_root
+        if mount_point not in self.stats:
+            self._new_stats(mount_point)
+
+    def umount(self, mount_point: str):
+        mount_point = self._path(mount_point)
+        if self.mounts.pop(mount_point, None) is None:
+            raise OSError(22, "Not mounted", mount_point)
@@ -0,0 +1,402 @@
+"""
+Copyright (C) 2023  Benjamin Secker, Jolon Behrent, Louis Li, James Quilty
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+Virtual `machine` module for running the data recorder drivers on a host
+
+install() replaces the `machine` module, so that the drivers create virtual
+pins, UARTs and I2C buses. Peripherals emulated on the host (e.g. the SDI-12
+bus in sdi12bus.py) attach to them:
+
+- attach_uart() connects a device to the UART with a given id. The device
+  implements `uart_write(data)`, `uart_read(n)`, `uart_any()` and
+  `uart_txdone()`.
+- attach_i2c() connects a device to the I2C bus at a given address. The
+  device implements `i2c_write(data)` and `i2c_read(n)`; a memory read is a
+  write of the register address followed by a read.
+- watch_pin() registers a callback for changes of a pin's output value.
+- insert_sd_card() puts a card, a host directory, in the SD card slot. The
+  card is mounted with the `os.mount()` of the virtual file system (vfs.py).
+
+deepsleep() raises DeepSleep, which returns control to the code running the
+firmware, and set_wake() sets the wake reason and reset cause of the next
+wake.
+
+Runs under CPython and the MicroPython unix port.
+"""
+
+import io
+import sys
+import time
+
+# UART id -> attached device
+_uart_devices = {}
+# Pin id -> list of callback(pin_id, value)
+_pin_watchers = {}
+# Pin id -> current value
+_pin_values = {}
+
+# I2C address -> attached device
+_i2c_devices = {}
+# Host directory of the card in the SD card slot, or None
+_sd_card = None
+
+# Contents of RTC user memory, kept through virtual deep sleeps
+_rtc_memory = bytearray()
+
+# Reset causes
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+# Wake reasons
+SLEEP = 2
+DEEPSLEEP = 4
+PIN_WAKE = 2
+EXT0_WAKE = 2
+EXT1_WAKE = 3
+TIMER_WAKE = 4
+
+# Wake reason and reset cause
+_wake = [0, PWRON_RESET]
+
+# MicroPython stream ioctl requests and flags, for polling with uasyncio
+_MP_STREAM_POLL = 3
+_MP_STREAM_POLL_RD = 1
+_MP_STREAM_POLL_WR = 4
+
+
+def ticks_us() -> int:
+    """
+    Returns:
+        int: a monotonic time in microseconds, on both CPython and MicroPython.
+    """
+    # The ticks of a virtual device restart on each wake (see vclock.py)
+    if hasattr(time, "monotonic"):
+        return round(time.monotonic() * 1000000)
+    return time.ticks_us()
+
+
+def attach_uart(uart_id: int, device):
+    """
+    Connect a virtual device to a UART.
+
+    Args:
+        uart_id (int): id of the UART, as passed to machine.UART().
+        device: the device, see the module documentation.
+    """
+    _uart_devices[uart_id] = device
+
+
+def watch_pin(pin_id: int, callback):
+    """
+    Call a function whenever a pin's value is set.
+
+    Args:
+        pin_id (int): GPIO number of the pin.
+        callback: called as `callback(pin_id, value)`.
+    """
+    _pin_watchers.setdefault(pin_id, []).append(callback)
+
+
+def attach_i2c(address: int, device):
+    """
+    Connect a virtual device to the I2C bus.
+
+    Args:
+        address (int): 7-bit I2C address of the device.
+        device: the device, see the module documentation.
+    """
+    _i2c_devices[address] = device
+
+
+def insert_sd_card(path: str = None):
+    """
+    Insert a card in the SD card slot, or remove it.
+
+    Args:
+        path (str): host directory holding the card's files, or None to
+            remove the card.
+    """
+    global _sd_card
+    _sd_card = path
+
+
+def set_wake(reason: int, cause: int):
+    """
+    Set the values returned by wake_reason() and reset_cause().
+
+    Args:
+        reason (int): wake reason, e.g. TIMER_WAKE, or 0 for none.
+        cause (int): reset cause, e.g. DEEPSLEEP_RESET.
+    """
+    _wake[:] = [reason, cause]
+
+
+def set_pin(pin_id: int, value: int):
+    """
+    Drive the level of a pin from outside, e.g. by a pull-up resistor.
+
+    Args:
+        pin_id (int): GPIO number of the pin.
+        value (int): the level, 0 or 1.
+    """
+    Pin(pin_id).value(value)
+
+
+def reset_devices():
+    """
+    Detach all devices and watchers, remove the SD card, and clear pin values
+    and RTC memory.
+    """
+    global _sd_card
+    _uart_devices.clear()
+    _i2c_devices.clear()
+    _sd_card = None
+    _pin_watchers.clear()
+    _pin_values.clear()
+    _rtc_memory[:] = b""
+
+
+class Pin:
+    """GPIO pin. Output values are passed to the pin's watchers."""
+
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, pin_id, mode=-1, pull=-1, value=None):
+        self.id = pin_id
+        self.mode = mode
+        _pin_values.setdefault(pin_id, 0)
+        if value is not None:
+            self.value(value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return _pin_values[self.id]
+        value = 1 if value else 0
+        _pin_values[self.id] = value
+        for callback in _pin_watchers.get(self.id, ()):
+            callback(self.id, value)
+        return None
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=None):
+        return None
+
+
+class UART(io.IOBase):
+    """
+    UART connected to the device attached with attach_uart(). Reads never
+    block: they return what the device has sent so far, or None.
+    """
+
+    def __init__(self, uart_id, baudrate=9600, **kwargs):
+        self.id = uart_id
+        self.baudrate = baudrate
+        self.settings = kwargs
+
+    def init(self, baudrate=9600, **kwargs):
+        self.baudrate = baudrate
+        self.settings.update(kwargs)
+
+    def deinit(self):
+        pass
+
+    def _device(self):
+        return _uart_devices.get(self.id)
+
+    def any(self) -> int:
+        device = self._device()
+        return device.uart_any() if device else 0
+
+    def read(self, nbytes=-1):
+        device = self._device()
+        if not device or not device.uart_any():
+            return None
+        return device.uart_read(nbytes)
+
+    def readline(self, size=-1):
+        device = self._device()
+        if not device:
+            return None
+        line = b""
+        while device.uart_any():
+            char = device.uart_read(1)
+            line += char
+            if char == b"\n":
+                break
+        return line or None
+
+    def write(self, data) -> int:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        device = self._device()
+        if device:
+            device.uart_write(bytes(data))
+        return len(data)
+
+    def txdone(self) -> bool:
+        device = self._device()
+        return device.uart_txdone() if device else True
+
+    def ioctl(self, request, arg):
+        if request == _MP_STREAM_POLL:
+            flags = arg & _MP_STREAM_POLL_WR
+            if arg & _MP_STREAM_POLL_RD and self.any():
+                flags |= _MP_STREAM_POLL_RD
+            return flags
+        return 0
+
+
+class I2C:
+    """I2C bus connected to the devices attached with attach_i2c()."""
+
+    def __init__(self, i2c_id=0, scl=None, sda=None, freq=400000):
+        self.id = i2c_id
+
+    def _device(self, addr: int):
+        device = _i2c_devices.get(addr)
+        if device is None:
+            # ENODEV, as raised when a device does not acknowledge
+            raise OSError(19)
+        return device
+
+    def scan(self) -> list:
+        return sorted(_i2c_devices)
+
+    def readfrom(self, addr, nbytes, stop=True) -> bytes:
+        return self._device(addr).i2c_read(nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.readfrom(addr, len(buf))
+
+    def writeto(self, addr, buf, stop=True) -> int:
+        self._device(addr).i2c_write(bytes(buf))
+        return len(buf)
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8) -> bytes:
+        device = self._device(addr)
+        device.i2c_write(bytes([memaddr]))
+        return device.i2c_read(nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        self._device(addr).i2c_write(bytes([memaddr]) + bytes(buf))
+
+
+class SDCard:
+    """SD card slot, holding the card inserted with insert_sd_card()."""
+
+    def __init__(self, slot=1, **kwargs):
+        self.slot = slot
+
+    @property
+    def path(self) -> str:
+        """Host directory of the card, or None if there is no card."""
+        return _sd_card
+
+    def deinit(self):
+        pass
+
+
+class RTC:
+    """Real time clock. The time is that of the `time` module (see vclock.py)."""
+
+    def __init__(self, rtc_id=0):
+        pass
+
+    def memory(self, data=None):
+        if data is None:
+            return bytes(_rtc_memory)
+        _rtc_memory[:] = data
+        return None
+
+    def datetime(self, datetimetuple=None):
+        if datetimetuple is not None:
+            return None
+        now = time.localtime()
+        return (now[0], now[1], now[2], now[6], now[3], now[4], now[5], 0)
+
+
+class DeepSleep(Exception):
+    """
+    Raised by deepsleep() in place of sleeping.
+
+    Attributes:
+        time_ms (int): the time to sleep for (ms), or None for no limit.
+    """
+
+    def __init__(self, time_ms=None):
+        super().__init__(time_ms)
+        self.time_ms = time_ms
+
+
+def deepsleep(time_ms=None):
+    raise DeepSleep(time_ms)
+
+
+def wake_reason() -> int:
+    return _wake[0]
+
+
+def reset_cause() -> int:
+    return _wake[1]
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def unique_id() -> bytes:
+    return b"\x00\x00\x00\x00\x00\x00"
+
+
+def install():
+    """
+    Make this module the `machine` module, and provide the `micropython`
+    module on ports without it.
+    """
+    sys.modules["machine"] = sys.modules[__name__]
+    try:
+        import micropython  # noqa: F401
+    except ImportError:
+        micropython = type(sys)("micropython")
+        micropython.const = lambda value: value
+        micropython.alloc_emergency_exception_buf = lambda size: None
+        sys.modules["micropython"] = micropython